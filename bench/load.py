@@ -0,0 +1,86 @@
+"""Load generator for the api.
+
+Sends GET (or POST) requests to one or more urls of a running api with an
+increasing amount of concurrent clients, and prints the throughput and the
+latency percentiles at every concurrency level::
+
+    python bench/load.py -c 1,10,50,100 -n 2000 \\
+        -H "Authorization: Bearer <token>" \\
+        http://localhost:6543/0.2/events/1
+
+With several urls they are requested in turn by every client. Run it once per
+configuration that is compared, against the same data.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import gevent
+import gevent.pool
+import optparse
+import time
+import urllib2
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run(urls, concurrency, requests, headers, method, body):
+    latencies = []
+    errors = [0]
+
+    def perform(index):
+        url = urls[index % len(urls)]
+        request = urllib2.Request(url, data=body, headers=headers)
+        request.get_method = lambda: method
+        started = time.time()
+        try:
+            urllib2.urlopen(request, timeout=60).read()
+        except urllib2.HTTPError as e:
+            if e.code >= 500:
+                errors[0] += 1
+        except Exception:
+            errors[0] += 1
+        latencies.append(time.time() - started)
+
+    pool = gevent.pool.Pool(concurrency)
+    started = time.time()
+    for index in range(requests):
+        pool.spawn(perform, index)
+    pool.join()
+    elapsed = time.time() - started
+    return dict(concurrency=concurrency,
+                throughput=requests / elapsed,
+                p50=percentile(latencies, 0.5) * 1000,
+                p99=percentile(latencies, 0.99) * 1000,
+                errors=errors[0])
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] url [url ...]")
+    parser.add_option('-c', '--concurrency', default='1,10,50,100',
+                      help="comma separated concurrency levels")
+    parser.add_option('-n', '--requests', type='int', default=1000,
+                      help="requests per concurrency level")
+    parser.add_option('-H', '--header', action='append', default=[],
+                      help="header to send, as 'Name: value'")
+    parser.add_option('-X', '--method', default='GET')
+    parser.add_option('-d', '--data', default=None,
+                      help="request body")
+    options, urls = parser.parse_args()
+    if not urls:
+        parser.error("no url given")
+    headers = dict(header.split(': ', 1) for header in options.header)
+
+    print "%11s %12s %9s %9s %7s" % ('concurrency', 'requests/s', 'p50 ms',
+                                     'p99 ms', 'errors')
+    for concurrency in map(int, options.concurrency.split(',')):
+        result = run(urls, concurrency, options.requests, headers,
+                     options.method, options.data)
+        print "%(concurrency)11d %(throughput)12.1f %(p50)9.1f %(p99)9.1f " \
+              "%(errors)7d" % result
+
+
+if __name__ == '__main__':
+    main()
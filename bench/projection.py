@@ -0,0 +1,70 @@
+"""Cost of the fields of event_tickets on the api side.
+
+Measures what a worker result of synthetic tickets costs the api: loading the
+pickled result as it comes from the broker, filtering it with
+:func:`tickee_api.core.filter_dict` and rendering it, for ``fields=id``
+against the default fields. Once the workers support the ``projection``
+capability they only ship the requested fields, ``pushed down`` measures that
+case::
+
+    python bench/projection.py -n 50000
+"""
+from tickee_api.core import filter_dict, requested_fields
+import cPickle
+import json
+import optparse
+import time
+
+DEFAULT_FIELDS = ["user", "created_at", "checked_in"]
+
+
+class Request(object):
+
+    def __init__(self, params):
+        self.params = params
+
+
+def ticket(index):
+    return dict(id='%09d' % index,
+                user=dict(id=index, first_name='Jan', last_name='Peeters',
+                          email='jan.peeters%d@example.com' % index),
+                created_at='2012-05-01T10:00:00',
+                checked_in=index % 3 == 0,
+                tickettype=dict(id=1, name='Weekend', price=12000),
+                eventpart=dict(id=1, name='Day 1'),
+                order_key='%012x' % index)
+
+
+def measure(payload, fields, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.time()
+        result = cPickle.loads(payload)
+        json.dumps(map(lambda d: filter_dict(d, fields), result))
+        elapsed = time.time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('-n', '--tickets', type='int', default=50000)
+    parser.add_option('-r', '--repeat', type='int', default=5)
+    options, _ = parser.parse_args()
+
+    tickets = [ticket(index) for index in range(options.tickets)]
+    full = cPickle.dumps(tickets, cPickle.HIGHEST_PROTOCOL)
+
+    print "%-10s %-12s %12s %9s" % ('fields', 'entrypoint', 'result kB', 'ms')
+    for name, params in [('default', {}), ('id', {'fields': 'id'})]:
+        fields = requested_fields(Request(params), DEFAULT_FIELDS, ["id"])
+        projected = cPickle.dumps([dict((key, value) for key, value in t.items()
+                                        if key in fields) for t in tickets],
+                                  cPickle.HIGHEST_PROTOCOL)
+        for entrypoint, payload in [('all fields', full), ('pushed down', projected)]:
+            print "%-10s %-12s %12d %9.1f" % (name, entrypoint, len(payload) / 1024,
+                                               measure(payload, fields, options.repeat))
+
+
+if __name__ == '__main__':
+    main()
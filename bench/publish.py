@@ -0,0 +1,58 @@
+"""Latency of publishing an entrypoint call to the broker.
+
+Compares celery's send_task setting up its publisher per call, as the views
+did before, with the publishers of a warmed up
+:class:`tickee_api.core.broker.BrokerPool`. The tasks are published on a
+routing key without queue, so the broker drops them and no worker is
+needed, only the broker of the celery configuration::
+
+    python bench/publish.py -n 2000
+"""
+from gevent import monkey
+monkey.patch_all()
+
+from celery.execute import send_task
+from tickee_api.core.broker import BrokerPool
+import optparse
+import time
+
+TASK_NAME = 'tickee_api.bench.noop'
+OPTIONS = dict(routing_key='tickee_api.bench.unrouted')
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def measure(publish, count):
+    latencies = []
+    for _ in range(count):
+        started = time.time()
+        publish()
+        latencies.append(time.time() - started)
+    return percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('-n', '--count', type='int', default=1000)
+    options, _ = parser.parse_args()
+
+    def unpooled():
+        send_task(TASK_NAME, kwargs={}, **OPTIONS)
+
+    pool = BrokerPool(size=1)
+    pool.warm_up()
+
+    def pooled():
+        with pool.publisher() as publisher:
+            send_task(TASK_NAME, kwargs={}, publisher=publisher, **OPTIONS)
+
+    print "%10s %9s %9s" % ('publisher', 'p50 ms', 'p99 ms')
+    for name, publish in [('per call', unpooled), ('pooled', pooled)]:
+        print "%10s %9.2f %9.2f" % ((name,) + measure(publish, options.count))
+
+
+if __name__ == '__main__':
+    main()
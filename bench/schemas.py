@@ -0,0 +1,70 @@
+"""Cost of validating request bodies with the colander schemas.
+
+Compares the way :func:`tickee_api.core.validate_schema` used to validate a
+body, building and binding the schema for every request and dumping the
+validated body back into the request, with the schema bound once when the
+view is decorated::
+
+    python bench/schemas.py -n 2000
+"""
+from tickee_api.resources.zero_two import schema
+import json
+import optparse
+import time
+
+EVENT = dict(name='Festival',
+             url='http://example.com/festival',
+             active=True,
+             public=True,
+             email='info@example.com',
+             description=dict(language='en', text='<p>Three days of <b>music</b></p>'),
+             parts=[dict(name='Day %d' % day, starts_on=1340000000 + day * 86400,
+                         minutes=720, venue_id=1,
+                         description=dict(language='en', text='<p>Day %d</p>' % day))
+                    for day in range(10)],
+             tickettypes=[dict(name='Ticket %d' % index,
+                               description=dict(language='en', text='<p>Entry</p>'),
+                               price=2500 + index * 100, currency='EUR',
+                               units=1000, active=True, sales_end=1340000000)
+                          for index in range(20)],
+             social=dict(facebook='festival', twitter='festival'))
+
+TICKET_ORDER = dict(tickettype=1, amount=2, guest=False, paper=False)
+
+SCHEMAS = [('Event', schema.Event, EVENT, dict(required_nodes=["name"])),
+           ('TicketOrder', schema.TicketOrder, TICKET_ORDER,
+            dict(required_nodes=["tickettype", "amount"]))]
+
+
+def per_request(schema_klass, body, bindings):
+    deserialized = schema_klass().bind(**bindings).deserialize(json.loads(body))
+    json.dumps(deserialized)
+
+
+def bound_once(schema_klass, body, bindings):
+    bound = schema_klass().bind(**bindings)
+    return lambda: bound.deserialize(json.loads(body))
+
+
+def measure(validate, count):
+    started = time.time()
+    for _ in range(count):
+        validate()
+    return (time.time() - started) / count * 1000000
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('-n', '--count', type='int', default=1000)
+    options, _ = parser.parse_args()
+
+    print "%-12s %16s %16s" % ('schema', 'per request us', 'bound once us')
+    for name, schema_klass, payload, bindings in SCHEMAS:
+        body = json.dumps(payload)
+        unbound = measure(lambda: per_request(schema_klass, body, bindings), options.count)
+        bound = measure(bound_once(schema_klass, body, bindings), options.count)
+        print "%-12s %16.1f %16.1f" % (name, unbound, bound)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,9 @@ requires = [
     'velruse',
     'WebError',
     'celery',
+    'gevent',
+    'gunicorn',
+    'python-memcached',
     'colander', 'htmllaundry'
     ]
 
@@ -8,16 +8,46 @@ Python package containing API related logic and routing information for Pyramid.
 
 from pyramid.configuration import Configurator
 #from pyramid.config import Configurator
+from pyramid.settings import asbool
 from pyramid_oauth2.routing import configure_oauth2_routing
+from tickee_api.core import bundles, cache, capabilities, dispatch, journal, push
+from tickee_api.core.broker import BrokerPool
+from tickee_api.core.replies import ReplyConsumer
 from tickee_api.resources.zero_one.routes import v_0_1_routing
 from tickee_api.resources.zero_two.routes import v_0_2_routing
 
 def main( global_config, **settings ):
 	config = Configurator(settings=settings)
 	
+	# Broker connections
+	broker_pool = BrokerPool(size=int(settings.get('broker.pool_size', 10)))
+	if asbool(settings.get('broker.warm_up', False)):
+		broker_pool.warm_up()
+	broker_pool.run_health_checks(int(settings.get('broker.health_interval', 30)))
+	config.registry.broker_pool = broker_pool
+	if settings.get('dispatch.replies', 'amqp') == 'direct':
+		reply_consumer = ReplyConsumer()
+		reply_consumer.start(broker_pool)
+	else:
+		reply_consumer = None
+	dispatch.configure(broker_pool, reply_consumer)
+	capabilities.configure(settings)
+	
+	# Response cache
+	config.registry.cache = cache.configure(settings)
+	
+	# Incoming notifications
+	journal.configure(settings)
+	
+	# Scanning
+	bundles.configure(settings)
+	if asbool(settings.get('push.enabled', False)):
+		push.configure(broker_pool)
+	
 	# Maintenance
 	config.add_route('blitz-io-verification',    '/mu-1e32b3b5-6f6be39c-4bc74834-6b7586e8')
 	config.add_route('maintenance-200',          '/maintenance/200')
+	config.add_route('maintenance-broker',       '/maintenance/broker')
 	
 	# Internal
 	config.add_route('saasy-subscriptions',      '/services/saasy/subscriptions')
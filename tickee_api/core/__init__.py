@@ -1,24 +1,32 @@
+from datetime import datetime
 from functools import wraps
+from pyramid.httpexceptions import HTTPNotModified
+from pyramid.response import Response
+from tickee_api.core import cache
+from tickee_api.core import capabilities
+from tickee_api.core import paging
+from webob.datetime_utils import UTC
 import colander
+import copy
+import hashlib
 import json
+import time
 
 def validate_schema(schema_klass, **bindings):
     """Decorator that takes a colander schema definition and validates the request body with
-    said schema. If it matches, the view function may be executed."""
+    said schema. If it matches, the view function may be executed with the validated body available
+    as request.deserialized_body.
+    
+    The schema is built and bound once when the view is decorated. Bound schemas are not modified by
+    deserializing, so all requests share it."""
+    schema = schema_klass().bind(**bindings)
     
     def schema_validator(f):
         
         def wrapper(*args, **kwargs):          
-            request = kwargs.get('request')
-            schema = schema_klass().bind(**bindings)
+            request = kwargs.get('request') or args[-1]
             try:
-                deserialized_json_body = schema.deserialize(request.json_body)
-                
-                kwargs['request'].deserialized_body = deserialized_json_body
-                try:
-                    kwargs['request'].body = json.dumps(deserialized_json_body)
-                except:
-                    pass
+                request.deserialized_body = schema.deserialize(request.json_body)
             except colander.Invalid as e:
                 request.response.status_int = 400
                 return dict(error='invalid request body',
@@ -39,17 +47,13 @@ def return_fields(default_fields=['id'],
                   mandatory_fields=[]):
     """Decorator that only shows specific fields of a result. The default_fields argument specifies which 
     fields should be returned when no specific fields were requested. The mandatory_fields will always be
-    sent with the result."""
+    sent with the result. The view can pass projection(request) on to its entrypoint so only the requested
+    fields are loaded once the workers support it, the result is still filtered in case the entrypoint
+    returns more."""
     def field_returner(f):
         def wrapper(*args, **kwargs):
             request = kwargs.get('request')
-            requested_fields = request.params.get('fields')
-            if requested_fields is not None:
-                requested_fields = requested_fields.split(',')
-                requested_fields = map(lambda x: x.strip(), requested_fields)
-                fields = set(mandatory_fields + requested_fields)
-            else:
-                fields = set(mandatory_fields + default_fields)
+            fields = request.fields = requested_fields(request, default_fields, mandatory_fields)
             
             result = f(*args, **kwargs)
              
@@ -64,10 +68,259 @@ def return_fields(default_fields=['id'],
         return wraps(f)(wrapper)
     return field_returner
 
+def deadline(budget):
+    """Decorator that gives the view a latency budget in seconds. Entrypoint calls
+    made by the view expire once the budget is spent and the request is answered
+    with a 503/504 instead of waiting on a stalled worker."""
+    def deadline_setter(f):
+        def wrapper(*args, **kwargs):
+            request = kwargs.get('request')
+            request.deadline = time.time() + budget
+            return f(*args, **kwargs)
+        return wraps(f)(wrapper)
+    return deadline_setter
+
+def requested_fields(request, default_fields=['id'], mandatory_fields=[]):
+    """Returns the set of fields requested with the fields parameter, or the
+    default fields if none were requested."""
+    fields = request.params.get('fields')
+    if fields is not None:
+        fields = map(lambda x: x.strip(), fields.split(','))
+        return set(mandatory_fields + fields)
+    return set(mandatory_fields + default_fields)
+
+def projection(request, fields=None):
+    """Returns the keyword arguments limiting an entrypoint to the fields the
+    client requested with the fields parameter, or nothing when the client did
+    not ask for specific fields or the entrypoints do not accept them (see
+    :mod:`tickee_api.core.capabilities`)."""
+    if not capabilities.supports(capabilities.PROJECTION):
+        return {}
+    fields = fields or getattr(request, 'fields', None)
+    if 'fields' not in request.params or not fields or 'all' in fields:
+        return {}
+    return dict(fields=sorted(fields))
+
+def cached(ttl, params=[]):
+    """Decorator that serves successful responses of a read view from the cache
+    for ``ttl`` seconds. Responses are cached per route, matchdict, oauth client
+    and the values of the request ``params`` listed.
+    
+    Cached responses carry an ETag and Last-Modified header, a conditional
+    request matching them is answered with 304 Not Modified straight from the
+    cache."""
+    def response_cacher(f):
+        def wrapper(*args, **kwargs):
+            request = kwargs.get('request') or args[-1]
+            key = cache.response_key(request, kwargs.get('oauth2_context'), params)
+            
+            def render(request=request, args=args, kwargs=kwargs):
+                result = f(*args, **kwargs)
+                version = hashlib.md5(json.dumps(result, sort_keys=True)).hexdigest()
+                return (request.response.status_int, result, version, int(time.time()))
+            
+            def refresh():
+                # the request was answered by now, render on a copy of its own
+                copied = detached(request)
+                if 'request' in kwargs:
+                    return render(copied, args, dict(kwargs, request=copied))
+                return render(copied, args[:-1] + (copied,), kwargs)
+            
+            status, result, version, modified = cache.default.get_or_compute(
+                key, ttl, render, cacheable=lambda response: response[0] == 200,
+                refresh=refresh)
+            
+            if status == 200:
+                # the query string selects the representation (e.g. fields)
+                etag = hashlib.md5(version + request.query_string).hexdigest()
+                last_modified = datetime.fromtimestamp(modified, UTC)
+                if not_modified(request, etag, last_modified):
+                    return HTTPNotModified(headers=[('ETag', '"%s"' % etag)])
+                request.response.etag = etag
+                request.response.last_modified = last_modified
+            request.response.status_int = status
+            # views and decorators modify their results, keep the cached one intact
+            return copy.deepcopy(result)
+        return wraps(f)(wrapper)
+    return response_cacher
+
+
+def detached(request):
+    """Returns a copy of the request with a response of its own, for rendering
+    a view again after the request itself was answered."""
+    copied = copy.copy(request)
+    copied.__dict__.pop('response', None)
+    copied.__dict__.pop('deadline', None)
+    return copied
+
+
+def validated(max_age=60):
+    """Decorator answering conditional requests of a read view that is not
+    cached without calling the view. The ETag of a response is the md5 of its
+    result, and is remembered for ``max_age`` seconds per generation of the
+    resource (see :func:`tickee_api.core.cache.response_key`), query string
+    and accepted type. A request for the remembered ETag is answered with 304
+    Not Modified before the view runs. After a write the api sees (declare the
+    writes in :mod:`tickee_api.resources.invalidation`), or ``max_age``
+    seconds for the writes it does not see, the view runs again and the
+    client keeps its copy when the result did not change (see
+    :mod:`tickee_api.resources.conditional`).
+
+    Streamed collections are sent before their result is known in full, they
+    get an ETag of their own every time they are sent instead, and are sent
+    in full again once it is no longer remembered."""
+    def validator(f):
+        def wrapper(*args, **kwargs):
+            request = kwargs.get('request') or args[-1]
+            key = 'validated:' + repr((cache.response_key(request, kwargs.get('oauth2_context'), []),
+                                       request.query_string,
+                                       request.headers.get('Accept')))
+            entry = cache.default.get(key)
+            if entry is not None and request.if_none_match \
+                    and entry[0] in request.if_none_match:
+                return HTTPNotModified(headers=[('ETag', '"%s"' % entry[0])])
+            result = f(*args, **kwargs)
+            if request.response.status_int == 200:
+                if isinstance(result, Response):
+                    etag = hashlib.md5('%s:%f' % (key, time.time())).hexdigest()
+                else:
+                    etag = hashlib.md5(json.dumps(result, sort_keys=True)).hexdigest()
+                cache.default.set(key, etag, max_age)
+                request.response.etag = etag
+            return result
+        return wraps(f)(wrapper)
+    return validator
+
+
+def not_modified(request, etag, last_modified):
+    """Checks whether the client already has the current representation."""
+    if request.if_none_match:
+        return etag in request.if_none_match
+    if request.if_modified_since:
+        return last_modified <= request.if_modified_since
+    return False
+
+def paginated(key='id'):
+    """Decorator paginating the collection returned by the view on ``key`` when
+    the client asks for a page (see :mod:`tickee_api.core.paging`). The view
+    passes ``paging.bounds(request)`` on to its entrypoint."""
+    def paginator(f):
+        def wrapper(*args, **kwargs):
+            request = kwargs.get('request')
+            request.page = paging.parse(request)
+            result = f(*args, **kwargs)
+            if request.page is None or not isinstance(result, list):
+                return result
+            return paging.apply(request, result, key)
+        wrapper = wraps(f)(wrapper)
+        # streamed collections are fetched a page at a time on the key
+        wrapper.paging_key = key
+        return wrapper
+    return paginator
+
+STREAM_THRESHOLD = 500
+"""Collections of more items than this are streamed instead of rendered."""
+
+STREAM_PAGE_SIZE = paging.MAX_LIMIT
+"""Items fetched at a time for a streamed collection of a paginated view."""
+
+def streamed(f):
+    """Decorator that streams large collections to the client instead of
+    rendering them in one go. Items are serialised one chunk at a time while
+    the body is written, as a JSON array or as newline delimited JSON when the
+    client accepts application/x-ndjson. Small collections and errors are left
+    to the json renderer.
+    
+    The rendered body never exists in full and items are released once
+    written. Views that are @paginated fetch the collection from their
+    entrypoint a page of :data:`STREAM_PAGE_SIZE` items at a time once the
+    workers support paging, the next page is fetched when the previous one
+    has been written, so the memory of a request no longer grows with the
+    collection. Until then the collection arrives from the entrypoint in one
+    piece."""
+    key = getattr(f, 'paging_key', None)
+    
+    def wrapper(*args, **kwargs):
+        request = kwargs.get('request')
+        paged = key is not None and paging.streams(request)
+        if paged:
+            request.stream_page = (STREAM_PAGE_SIZE, None)
+        result = f(*args, **kwargs)
+        ndjson = request.accept.best_match(['application/json',
+                                            'application/x-ndjson']) \
+                 == 'application/x-ndjson'
+        if not isinstance(result, list):
+            return result
+        if paged:
+            items, after = _page(result, key, None)
+            if after is not None:
+                return _stream(request, _pages(f, args, kwargs, request, key,
+                                               items, after), ndjson)
+            result = items
+        if len(result) <= STREAM_THRESHOLD and not ndjson:
+            return result
+        return _stream(request, [result], ndjson)
+    return wraps(f)(wrapper)
+
+def _stream(request, pages, ndjson):
+    response = request.response
+    if ndjson:
+        response.content_type = 'application/x-ndjson'
+        response.app_iter = _ndjson_chunks(pages)
+    else:
+        response.content_type = 'application/json'
+        response.app_iter = _json_array_chunks(pages)
+    # the length is unknown until the last chunk is written
+    response.content_length = None
+    return response
+
+def _page(items, key, after):
+    """Returns the items of a page fetched after ``after`` and the key to fetch
+    the next page after, None when it is the last page."""
+    items = sorted(items, key=lambda item: item.get(key))
+    if after is not None:
+        # entrypoints ignoring the bounds must not repeat items
+        items = [item for item in items if item.get(key) > after]
+    if len(items) <= STREAM_PAGE_SIZE:
+        return items, None
+    items = items[:STREAM_PAGE_SIZE]
+    return items, items[-1].get(key)
+
+def _pages(f, args, kwargs, request, key, items, after):
+    """Yields the fetched page, then fetches and yields the next ones."""
+    yield items
+    while after is not None:
+        request.stream_page = (STREAM_PAGE_SIZE, after)
+        result = f(*args, **kwargs)
+        if not isinstance(result, list):
+            # the status is sent already, end the body unfinished
+            raise ValueError("could not fetch the page after %r: %r" % (after, result))
+        items, after = _page(result, key, after)
+        yield items
+
+def _serialized_items(pages, chunk_size=100):
+    """Serialises the items of the pages in chunks, releasing every item once
+    it's written."""
+    for items in pages:
+        items.reverse()
+        while items:
+            yield [json.dumps(items.pop()) for _ in range(min(chunk_size, len(items)))]
+
+def _ndjson_chunks(pages):
+    for chunk in _serialized_items(pages):
+        yield '\n'.join(chunk) + '\n'
+
+def _json_array_chunks(pages):
+    separator = '['
+    for chunk in _serialized_items(pages):
+        yield separator + ','.join(chunk)
+        separator = ','
+    yield ']' if separator == ',' else '[]'
+
 def filter_dict(dictionary, fields):
     """Removes all unnecessary keys from a dictionary"""
-    # return everything
-    if "all" in fields:
+    # return everything, or nothing to remove
+    if "all" in fields or fields.issuperset(dictionary):
         return dictionary
     
     # filter it
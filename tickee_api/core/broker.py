@@ -0,0 +1,110 @@
+"""Pool of broker connections shared by all requests of an api process.
+
+Every pooled connection keeps a task publisher with an open channel, so
+publishing an entrypoint call no longer sets up a connection and channel to
+the broker per request. The pool is created and warmed up by
+:func:`tickee_api.main` and checked periodically for dead connections.
+"""
+from celery.app import default_app
+from contextlib import contextmanager
+import gevent
+import gevent.queue
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class BrokerPool(object):
+    """Fixed size pool of task publishers, each holding its own broker
+    connection."""
+
+    def __init__(self, size=10, app=None):
+        self.app = app or default_app
+        self.size = size
+        self.idle = gevent.queue.Queue()
+        self.created = 0
+
+    def _create(self):
+        connection = self.app.broker_connection()
+        self.created += 1
+        return self.app.amqp.TaskPublisher(connection=connection)
+
+    def _discard(self, publisher):
+        self.created -= 1
+        try:
+            publisher.close()
+            publisher.connection.close()
+        except Exception:
+            pass
+
+    def acquire(self, timeout=None):
+        """Returns an idle publisher, a new one while the pool is not full or
+        waits for one to be released."""
+        try:
+            return self.idle.get_nowait()
+        except gevent.queue.Empty:
+            if self.created < self.size:
+                return self._create()
+            return self.idle.get(timeout=timeout)
+
+    def release(self, publisher):
+        self.idle.put(publisher)
+
+    @contextmanager
+    def publisher(self, timeout=None):
+        """Context manager lending a publisher of the pool. A publisher that
+        failed is dropped instead of returned to the pool."""
+        publisher = self.acquire(timeout)
+        try:
+            yield publisher
+        except Exception:
+            self._discard(publisher)
+            raise
+        else:
+            self.release(publisher)
+
+    def warm_up(self):
+        """Opens all connections of the pool up front so the first requests
+        do not pay for the connection setup."""
+        while self.created < self.size:
+            publisher = self._create()
+            try:
+                publisher.connection.connect()
+            except Exception:
+                log.exception("could not warm up broker connection")
+                self._discard(publisher)
+                break
+            self.release(publisher)
+
+    def health_check(self):
+        """Verifies the idle connections of the pool and drops dead ones, they
+        are reopened when needed. Returns the amount of healthy idle
+        connections."""
+        healthy = 0
+        for _ in range(self.idle.qsize()):
+            try:
+                publisher = self.idle.get_nowait()
+            except gevent.queue.Empty:
+                break
+            try:
+                publisher.connection.ensure_connection(max_retries=1)
+            except Exception:
+                log.warning("dropping dead broker connection")
+                self._discard(publisher)
+            else:
+                healthy += 1
+                self.release(publisher)
+        return healthy
+
+    def run_health_checks(self, interval):
+        """Spawns a greenlet checking the pool every ``interval`` seconds."""
+        def loop():
+            while True:
+                gevent.sleep(interval)
+                self.health_check()
+        return gevent.spawn(loop)
+
+    def status(self):
+        return dict(size=self.size,
+                    connections=self.created,
+                    idle=self.idle.qsize())
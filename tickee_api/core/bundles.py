@@ -0,0 +1,66 @@
+"""Signed bundles of ticket codes for scanning without a connection.
+
+A bundle holds a hash of every valid ticket code of an event as a sorted
+array, so a scanner validates a code locally with a binary search on
+``hash_code(salt, code)``. Bundles are versioned with the cursors of
+:mod:`tickee_api.core.sync`: a scanner passing the version of the bundle it
+has only receives the hashes added and removed since, built from the deltas
+kept for every version. The tickets are only fetched from the workers again
+after a write changing the valid codes (orders, deleted tickets), scans do
+not change a bundle.
+
+The bundle is written as a JSON object whose last member is the signature::
+
+    {"event_id": 1, "version": "...", ..., "added": [...], "removed": [...],
+     "signature": "..."}
+
+The signature is the HMAC-SHA256 (hex) keyed with the ``scanning.bundle_key``
+setting over all bytes preceding ``,"signature"``. It is computed while the
+body is streamed, so the bundle never has to be rendered in one piece.
+"""
+import hashlib
+import hmac
+import json
+
+HASH_LENGTH = 16
+"""Hex characters kept of every hashed code."""
+
+key = None
+"""Key signing the bundles, set by :func:`configure`."""
+
+
+def configure(settings):
+    global key
+    key = settings.get('scanning.bundle_key') or None
+
+
+def salt(event_id):
+    """Returns the salt of the hashed codes of an event, it does not change
+    between versions so incremental bundles can be merged."""
+    return hashlib.sha1('tickee-bundle:%s' % event_id).hexdigest()[:8]
+
+
+def hash_code(salt, code):
+    return hashlib.sha1(salt + str(code)).hexdigest()[:HASH_LENGTH]
+
+
+def stream(header, added, removed, chunk_size=1000):
+    """Yields the signed bundle in chunks. ``header`` holds the members
+    preceding the hashes, ``added`` and ``removed`` are sorted lists of
+    hashes."""
+    signature = hmac.new(key, digestmod=hashlib.sha256)
+
+    def chunks():
+        yield json.dumps(header)[:-1]
+        for name, hashes in [('added', added), ('removed', removed)]:
+            yield ',"%s":[' % name
+            for start in range(0, len(hashes), chunk_size):
+                separator = ',' if start else ''
+                yield separator + ','.join('"%s"' % h for h in
+                                           hashes[start:start + chunk_size])
+            yield ']'
+
+    for chunk in chunks():
+        signature.update(chunk)
+        yield chunk
+    yield ',"signature":"%s"}' % signature.hexdigest()
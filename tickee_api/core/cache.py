@@ -0,0 +1,267 @@
+"""Read-through cache for responses of read heavy api resources.
+
+The cache has an in-process LRU tier and a shared tier (memcached) so
+processes can reuse each other's work. Generations live in the shared tier,
+without it (when ``cache.memcached_servers`` is not set, e.g. in development)
+a write only invalidates the responses cached by the process that served it,
+so deployments running several processes need it. Responses are keyed on generations
+of their route and matchdict values, a write bumps the generations of the
+resources it changes (see :func:`invalidate`) so later reads miss the stale
+entries. Entries are refreshed by a single
+greenlet shortly before they expire while the other requests keep getting the
+current value, so an expiring entry never sends a stampede to the workers.
+
+:func:`configure` is called by :func:`tickee_api.main`, views use the
+:func:`tickee_api.core.cached` decorator.
+"""
+from collections import OrderedDict
+from tickee_api import oauth_scopes
+import cPickle
+import gevent
+import gevent.event
+import hashlib
+import logging
+import time
+import uuid
+
+log = logging.getLogger(__name__)
+
+EARLY_REFRESH = 0.1
+"""Fraction of the ttl before expiry in which an entry gets refreshed."""
+
+GENERATION_TTL = 7 * 24 * 3600
+"""Seconds a generation is kept, a forgotten one is replaced by a new one."""
+
+
+class LocalCache(object):
+    """In-process cache tier evicting the least recently used entries once it
+    holds ``size`` entries or ``max_bytes`` bytes. Entries are measured by
+    their pickled size, as the shared tier stores them."""
+
+    def __init__(self, size=1000, max_bytes=64 * 1024 * 1024):
+        self.size = size
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        stored = self.entries.get(key)
+        if stored is None:
+            return None
+        if stored[0][1] < time.time():
+            self.delete(key)
+            return None
+        self.entries[key] = self.entries.pop(key)
+        return stored[0]
+
+    def set(self, key, entry):
+        self.delete(key)
+        size = len(cPickle.dumps(entry, cPickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            log.warning("not caching %r locally, %d bytes exceed the cache", key, size)
+            return
+        self.entries[key] = (entry, size)
+        self.bytes += size
+        while len(self.entries) > self.size or self.bytes > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.bytes -= evicted
+
+    def add(self, key, entry):
+        if self.get(key) is not None:
+            return False
+        self.set(key, entry)
+        return True
+
+    def delete(self, key):
+        stored = self.entries.pop(key, None)
+        if stored is not None:
+            self.bytes -= stored[1]
+
+
+class MemcachedCache(object):
+    """Cache tier shared by all api processes."""
+
+    def __init__(self, servers):
+        import memcache
+        self.client = memcache.Client(servers)
+
+    @staticmethod
+    def _key(key):
+        # memcached keys are limited in length and characters
+        return 'tickee_api:' + hashlib.sha1(key).hexdigest()
+
+    def get(self, key):
+        return self.client.get(self._key(key))
+
+    def set(self, key, entry):
+        # memcached refuses items over its item size (1MB by default)
+        if not self.client.set(self._key(key), entry,
+                               time=max(int(entry[1] - time.time()), 1)):
+            log.warning("could not store %r in memcached", key)
+
+    def add(self, key, entry):
+        return bool(self.client.add(self._key(key), entry,
+                                    time=max(int(entry[1] - time.time()), 1)))
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+
+class TieredCache(object):
+    """Combines a local and an optional shared tier. Entries are stored as
+    ``(value, expires_at)`` tuples."""
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+        self.inflight = {}
+
+    def get(self, key):
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            entry = self.shared.get(key)
+            if entry is not None:
+                self.local.set(key, entry)
+        return entry
+
+    def set(self, key, value, ttl):
+        entry = (value, time.time() + ttl)
+        self.local.set(key, entry)
+        if self.shared is not None:
+            self.shared.set(key, entry)
+
+    def add(self, key, value, ttl):
+        """Stores the entry unless the key already holds one, atomically across
+        processes when there is a shared tier. Returns whether it was stored."""
+        entry = (value, time.time() + ttl)
+        if self.shared is None:
+            return self.local.add(key, entry)
+        return self.shared.add(key, entry)
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    @property
+    def authority(self):
+        """The tier all processes agree on: the shared tier, or the local one
+        when there is none (before :func:`configure`, in tests)."""
+        return self.shared or self.local
+
+    def generations(self, scopes):
+        """Returns the current generation of each scope. Generations live in the
+        shared tier, so an invalidation reaches all processes at once."""
+        tier = self.authority
+        generations = []
+        for scope in scopes:
+            entry = tier.get('generation:' + scope)
+            if entry is None:
+                # never reuse an old generation, its entries might be stale
+                entry = self.invalidate(scope)
+            generations.append(entry[0])
+        return generations
+
+    def invalidate(self, scope):
+        """Starts a new generation for the scope, making its entries unreachable."""
+        tier = self.authority
+        entry = (uuid.uuid4().hex, time.time() + GENERATION_TTL)
+        tier.set('generation:' + scope, entry)
+        return entry
+
+    def _compute(self, key, ttl, compute, cacheable):
+        """Computes the value of an entry, only once per key at a time."""
+        computing = self.inflight.get(key)
+        if computing is not None:
+            return computing.get()
+        computing = self.inflight[key] = gevent.event.AsyncResult()
+        try:
+            value = compute()
+            if cacheable(value):
+                self.set(key, value, ttl)
+            computing.set(value)
+        except Exception as e:
+            computing.set_exception(e)
+        finally:
+            del self.inflight[key]
+        return computing.get()
+
+    def get_or_compute(self, key, ttl, compute, cacheable=lambda value: True,
+                       refresh=None):
+        """Returns the cached value of ``key``. On a miss the value is computed,
+        and stored when it is ``cacheable``. Entries about to expire are
+        refreshed in the background with ``refresh`` (``compute`` when not
+        given) while the current value is returned, ``refresh`` must not
+        depend on the request being answered."""
+        entry = self.get(key)
+        if entry is None:
+            return self._compute(key, ttl, compute, cacheable)
+        value, expires_at = entry
+        if expires_at - time.time() < ttl * EARLY_REFRESH and key not in self.inflight:
+            gevent.spawn(self._compute, key, ttl, refresh or compute, cacheable)
+        return value
+
+
+default = TieredCache(LocalCache())
+"""Cache used by the api, replaced by :func:`configure`."""
+
+
+def configure(settings):
+    """Sets up the default cache from the ``cache.*`` settings. Without
+    ``cache.memcached_servers`` only the local tier is used."""
+    global default
+    servers = settings.get('cache.memcached_servers', '').split()
+    local = LocalCache(int(settings.get('cache.local_size', 1000)),
+                       int(settings.get('cache.local_max_bytes', 64 * 1024 * 1024)))
+    if not servers:
+        log.warning("no cache.memcached_servers, invalidations only reach "
+                    "the process making them")
+        default = TieredCache(local)
+    else:
+        default = TieredCache(local, MemcachedCache(servers))
+    return default
+
+
+def resource_scopes(route_name, matchdict):
+    """Returns the invalidation scopes of a resource: its route as a whole and
+    the route limited to each of its matchdict values."""
+    return [route_name] + ['%s:%s=%s' % (route_name, name, value)
+                           for name, value in sorted(matchdict.items())]
+
+
+def invalidate(route_name, matchdict=None):
+    """Invalidates the cached responses of a read route. Limited to the responses
+    for the given matchdict values, or all of them when no matchdict is given."""
+    if matchdict:
+        for scope in resource_scopes(route_name, matchdict)[1:]:
+            default.invalidate(scope)
+    else:
+        default.invalidate(route_name)
+
+
+def request_generations(request):
+    """Returns the generations of the resource the request reads, looked up
+    once per request. None outside of a routed request."""
+    generations = getattr(request, 'generations', None)
+    if generations is None:
+        route = getattr(request, 'matched_route', None)
+        if route is None:
+            return None
+        generations = request.generations = default.generations(
+            resource_scopes(route.name, request.matchdict or {}))
+    return generations
+
+
+def response_key(request, oauth2_context, params):
+    """Builds the cache key of a response out of the route, its matchdict, the
+    relevant request parameters, the oauth client asking and the current
+    generations of the resource."""
+    if oauth2_context is None or oauth_scopes.INTERNAL in (oauth2_context.scopes or []):
+        client_id = None
+    else:
+        client_id = oauth2_context.client_id
+    return repr((request.matched_route.name,
+                 sorted(request.matchdict.items()),
+                 [request.params.get(param) for param in params],
+                 client_id,
+                 request_generations(request)))
@@ -0,0 +1,29 @@
+"""Optional arguments the entrypoints of the workers understand.
+
+Some optimisations of the api need the entrypoints to accept arguments they
+did not always accept, like the bounds of a page. An entrypoint receiving an
+argument it does not know fails, so the api only passes them on once the
+workers it talks to announce the capability in the ``backend.capabilities``
+setting (space separated). Until then the api does the work itself, e.g. it
+cuts the page out of the full collection.
+"""
+
+PAGING = 'paging'
+"""Collection entrypoints accept ``limit`` and ``after`` (see
+:mod:`tickee_api.core.paging`)."""
+
+PROJECTION = 'projection'
+"""Ticket and tickettype entrypoints accept ``fields`` (see
+:func:`tickee_api.core.projection`)."""
+
+enabled = set()
+"""Capabilities of the workers, set by :func:`configure`."""
+
+
+def configure(settings):
+    global enabled
+    enabled = set(settings.get('backend.capabilities', '').split())
+
+
+def supports(capability):
+    return capability in enabled
@@ -0,0 +1,208 @@
+"""Central dispatching of entrypoint calls to the tickee workers.
+
+Views never talk to celery directly, they go through :func:`call` (or
+:func:`call_many` when several entrypoints are needed at once). The api is
+served by gevent workers, so waiting for the broker round trip only suspends
+the greenlet of the request instead of the whole worker process. One worker
+can therefore keep hundreds of entrypoint calls in flight.
+
+Tasks are published over the connections of the :class:`BrokerPool` that
+:func:`tickee_api.main` hands to :func:`configure`. When a
+:class:`ReplyConsumer` is configured as well, results come back on the single
+reply queue of the process instead of a result queue per task.
+
+Every call is bounded by the deadline of the current request (see
+:func:`tickee_api.core.deadline`), or by :data:`DEFAULT_BUDGET` seconds when
+the view did not set one.
+
+Identical concurrent calls of the read entrypoints in :data:`COALESCED_TASKS`
+share one broker round trip, every caller receives its own copy of the result.
+A call only joins calls made for the same generations of the resource being
+read (see :func:`~tickee_api.core.cache.request_generations`), a read
+following a write to that resource never gets the result of a call that
+started before it.
+"""
+from celery.exceptions import TimeoutError
+from celery.execute import send_task
+from celery.utils import uuid
+from datetime import datetime, timedelta
+from pyramid.threadlocal import get_current_request, manager
+from tickee_api.core import cache
+import copy
+import gevent
+import gevent.event
+import gevent.queue
+import time
+
+DEFAULT_BUDGET = 20
+"""Latency budget in seconds of requests whose route did not set one."""
+
+pool = None
+"""Broker pool used for publishing, set by :func:`configure`."""
+
+replies = None
+"""Consumer of the reply queue, set by :func:`configure`."""
+
+COALESCED_TASKS = [
+    "accounts.details",
+    "eventparts.details",
+    "eventparts.from_event",
+    "tickee.events.entrypoints.event_details",
+    "tickee.events.entrypoints.event_list",
+    "tickettypes.details",
+    "tickettypes.from_event",
+    "tickettypes.from_eventpart",
+    "venues.details",
+    "venues.from_event",
+]
+"""Idempotent read entrypoints whose identical in-flight calls are coalesced."""
+
+inflight = {}
+
+
+class DeadlineExceeded(Exception):
+    """Raised when an entrypoint call can not complete within the latency budget
+    of the request. ``published`` tells whether the task was sent at all."""
+    
+    def __init__(self, task_name, published):
+        Exception.__init__(self, task_name)
+        self.task_name = task_name
+        self.published = published
+
+
+def configure(broker_pool, reply_consumer=None):
+    """Makes the dispatcher publish over the connections of ``broker_pool`` and
+    receive results through ``reply_consumer`` if given."""
+    global pool, replies
+    pool = broker_pool
+    replies = reply_consumer
+
+
+def current_deadline():
+    """Returns the deadline (as a timestamp) of the request being handled."""
+    request = get_current_request()
+    deadline = getattr(request, 'deadline', None)
+    if deadline is None:
+        deadline = time.time() + DEFAULT_BUDGET
+        if request is not None:
+            request.deadline = deadline
+    return deadline
+
+
+def send(task_name, kwargs=None, deadline=None, **options):
+    """Publishes an entrypoint call without waiting for its result. The task
+    expires when the deadline passes so stale work is dropped by the workers.
+    Returns the pending result of the task."""
+    deadline = deadline or current_deadline()
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise DeadlineExceeded(task_name, published=False)
+    options.setdefault('expires', datetime.now() + timedelta(seconds=remaining))
+    if pool is None:
+        return send_task(task_name, kwargs=kwargs or {}, **options)
+    try:
+        with pool.publisher(timeout=remaining) as publisher:
+            if replies is None:
+                return send_task(task_name, kwargs=kwargs or {}, 
+                                 publisher=publisher, **options)
+            task_id = options.setdefault('task_id', uuid())
+            pending = replies.expect(task_id, publisher.channel)
+            try:
+                send_task(task_name, kwargs=kwargs or {}, 
+                          publisher=publisher, **options)
+            except Exception:
+                replies.forget(task_id)
+                raise
+            return pending
+    except gevent.queue.Empty:
+        # no connection of the pool became available in time
+        raise DeadlineExceeded(task_name, published=False)
+
+
+def call(task_name, kwargs=None, deadline=None, **options):
+    """Publishes an entrypoint call and waits for its result, at most until the
+    deadline. Only the greenlet handling the current request is blocked while
+    waiting."""
+    deadline = deadline or current_deadline()
+    if task_name in COALESCED_TASKS and not options:
+        return _call_coalesced(task_name, kwargs, deadline)
+    return _call(task_name, kwargs, deadline, **options)
+
+
+def _call(task_name, kwargs, deadline, **options):
+    pending = send(task_name, kwargs, deadline, **options)
+    try:
+        return pending.get(timeout=max(deadline - time.time(), 0.001))
+    except TimeoutError:
+        if replies is not None:
+            replies.forget(pending.task_id)
+        raise DeadlineExceeded(task_name, published=True)
+
+
+class Flight(object):
+    """An entrypoint call in flight that identical calls joined."""
+    
+    def __init__(self):
+        self.result = gevent.event.AsyncResult()
+        self.joined = 0
+        self.copies = []
+
+
+def _call_coalesced(task_name, kwargs, deadline):
+    """Performs the call unless an identical one is already in flight, in which
+    case its result is awaited instead. The caller performing the call gets
+    its result, the callers that joined it get a copy each, made before the
+    result is handed out. A call nobody joined is not copied at all."""
+    generations = cache.request_generations(get_current_request())
+    key = (task_name, repr(sorted((kwargs or {}).items())), repr(generations))
+    flight = inflight.get(key)
+    if flight is None:
+        flight = inflight[key] = Flight()
+        try:
+            result = _call(task_name, kwargs, deadline)
+        except Exception as e:
+            del inflight[key]
+            flight.result.set_exception(e)
+            raise
+        # nobody joins any more, copy for the callers that did
+        del inflight[key]
+        flight.copies = [copy.deepcopy(result) for _ in range(flight.joined)]
+        flight.result.set(True)
+        return result
+    
+    flight.joined += 1
+    try:
+        flight.result.get(timeout=max(deadline - time.time(), 0.001))
+    except gevent.Timeout:
+        flight.joined -= 1
+        raise DeadlineExceeded(task_name, published=True)
+    return flight.copies.pop()
+
+
+def call_many(calls, return_exceptions=False):
+    """Performs several entrypoint calls concurrently. Expects a list of
+    ``(task_name, kwargs)`` tuples and returns their results in the same order,
+    the total wait is that of the slowest call. The first failed call is
+    raised, unless ``return_exceptions`` is set: the exception of every
+    failed call is returned in place of its result then."""
+    deadline = current_deadline()
+    greenlets = [spawn(call, task_name, kwargs, deadline)
+                 for task_name, kwargs in calls]
+    gevent.joinall(greenlets, raise_error=not return_exceptions)
+    return [greenlet.value if greenlet.successful() else greenlet.exception
+            for greenlet in greenlets]
+
+
+def spawn(function, *args, **kwargs):
+    """Spawns a greenlet working for the request being handled. Its entrypoint
+    calls see the request as the current one, so they keep its deadline and
+    are coalesced with the calls made for the same generations of its
+    resource."""
+    current = manager.get()
+    def run():
+        manager.push(current)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            manager.pop()
+    return gevent.spawn(run)
@@ -0,0 +1,156 @@
+"""Entrypoint calls that run longer than a request should wait for.
+
+Instead of blocking the request, a view submits the call as a job and answers
+with 202 Accepted and the location of the job resource (``/0.2/jobs/{id}``).
+A greenlet of the api process follows the task and keeps the job record up
+to date in the shared tier of the cache, so a client can poll the job on any
+process. Records are not kept in the local tiers, a process would serve its
+own outdated copy. Tasks may report progress by updating their
+state to ``PROGRESS`` with the progress as meta data, it is shown on the job
+while the task runs. It is read from the reply queue of the process when
+there is one, from the result backend otherwise.
+
+The greenlet following a job dies with its process. A pending job nobody
+followed for :data:`ABANDONED_AFTER` seconds, or that outlived
+:data:`JOB_TIMEOUT`, is reported failed when it is polled.
+"""
+from celery.exceptions import TimeoutError
+from tickee_api.core import cache, dispatch
+import gevent
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+JOB_TIMEOUT = 3600
+"""Seconds a job may run before it is considered failed."""
+
+JOB_TTL = 24 * 3600
+"""Seconds a job record is kept."""
+
+PROGRESS_INTERVAL = 1
+"""Seconds between updates of the progress of a running job."""
+
+HEARTBEAT_INTERVAL = 30
+"""Seconds after which the record of a running job is stored again, even
+though its progress did not change."""
+
+ABANDONED_AFTER = 3 * HEARTBEAT_INTERVAL
+"""Seconds after which a pending job whose record was not stored again is
+considered abandoned by its process."""
+
+
+def _key(job_id):
+    return 'job:%s' % job_id
+
+
+def store(job, client_id):
+    cache.default.authority.set(_key(job['id']),
+                                ((job, client_id, time.time()),
+                                 time.time() + JOB_TTL))
+
+
+def get(job_id, client_id=None):
+    """Returns the job, or None when it does not exist or was submitted by
+    another client. A ``client_id`` of None is allowed to see all jobs. A
+    pending job that timed out or was abandoned is marked failed."""
+    entry = cache.default.authority.get(_key(job_id))
+    if entry is None:
+        return None
+    job, owner, stored_at = entry[0]
+    if client_id is not None and owner != client_id:
+        return None
+    if job['status'] == 'pending':
+        now = time.time()
+        if now > job['created_at'] + JOB_TIMEOUT:
+            error = 'job timed out'
+        elif now > stored_at + ABANDONED_AFTER:
+            error = 'job was abandoned, its outcome is unknown'
+        else:
+            return job
+        log.warning("job %s failed: %s", job_id, error)
+        job.update(status='failed', result=dict(error=error),
+                   finished_at=int(now))
+        store(job, owner)
+    return job
+
+
+def submit(task_name, kwargs, client_id=None, on_done=None):
+    """Publishes the entrypoint call as a job and returns the job record.
+    ``on_done`` is called with the result once the task succeeded."""
+    deadline = time.time() + JOB_TIMEOUT
+    pending = dispatch.send(task_name, kwargs, deadline)
+    job = dict(id=pending.task_id,
+               task=task_name,
+               status='pending',
+               progress=None,
+               result=None,
+               created_at=int(time.time()),
+               finished_at=None)
+    store(job, client_id)
+    gevent.spawn(_follow, job, client_id, pending, deadline, on_done)
+    return job
+
+
+def _follow(job, client_id, pending, deadline, on_done):
+    """Waits for the task of the job and records its progress and outcome."""
+    stored_at = time.time()
+    while True:
+        try:
+            result = pending.get(timeout=max(min(PROGRESS_INTERVAL,
+                                                 deadline - time.time()), 0.001))
+        except TimeoutError:
+            if time.time() < deadline:
+                progress = _progress(pending, job['progress'])
+                if progress != job['progress'] or \
+                        time.time() - stored_at >= HEARTBEAT_INTERVAL:
+                    job['progress'] = progress
+                    store(job, client_id)
+                    stored_at = time.time()
+                continue
+            if dispatch.replies is not None:
+                dispatch.replies.forget(job['id'])
+            job.update(status='failed', result=dict(error='job timed out'))
+        except Exception as e:
+            log.exception("job %s failed", job['id'])
+            job.update(status='failed', result=dict(error=str(e)))
+        else:
+            failed = isinstance(result, dict) and "error" in result
+            job.update(status='failed' if failed else 'done', result=result)
+        break
+    job['finished_at'] = int(time.time())
+    store(job, client_id)
+    if job['status'] == 'done' and on_done is not None:
+        try:
+            on_done(job['result'])
+        except Exception:
+            log.exception("completion of job %s failed", job['id'])
+
+
+def _progress(pending, current):
+    """Returns the progress the task reported last. Results of the reply queue
+    carry it (see :mod:`tickee_api.core.replies`), the meta data of the
+    ``PROGRESS`` state is read from the result backend for celery's own."""
+    if hasattr(pending, 'progress'):
+        return pending.progress
+    try:
+        meta = pending.backend.get_task_meta(pending.task_id)
+    except Exception as e:
+        log.warning("could not read the progress of job %s: %r", pending.task_id, e)
+        return current
+    if meta.get('status') == 'PROGRESS':
+        return meta.get('result')
+    return current
+
+
+def accepted(request, job):
+    """Answers the request with 202 Accepted and the location of the job."""
+    request.response.status_int = 202
+    request.response.location = request.route_url('02-job-resource',
+                                                  job_id=job['id'])
+    return job
+
+
+def requested(request):
+    """Whether the client asked to run the call as a job."""
+    return request.params.get('async') in ['true', 't', '1']
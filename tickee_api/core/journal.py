@@ -0,0 +1,238 @@
+"""Durable journal of incoming notifications.
+
+Notifications of payment service providers (and other webhooks) must not get
+lost when the broker or the workers are slow. They are written to a SQLite
+journal before anything else is done with them, deduplicated on a key the
+sender provides, and drained to their entrypoint by a greenlet of every api
+process. Failed deliveries are retried with an exponential backoff. The
+journal is shared by the api processes of a host, a notification is claimed
+by one process at a time. The sqlite calls block, they are made in a thread of
+the journal so the other greenlets of the process keep running.
+
+:func:`configure` is called by :func:`tickee_api.main`, the journal is
+opened and drained from the first notification on (see :func:`current`).
+"""
+from gevent.threadpool import ThreadPool
+from tickee_api.core import dispatch
+import gevent
+import json
+import logging
+import os
+import sqlite3
+import time
+
+log = logging.getLogger(__name__)
+
+CLAIM_TIMEOUT = 60
+"""Seconds a process may take delivering a notification it claimed."""
+
+MAX_BACKOFF = 300
+"""Maximum seconds between two delivery attempts."""
+
+RETENTION = 7 * 24 * 3600
+"""Seconds delivered notifications are kept for deduplication."""
+
+PRUNE_INTERVAL = 3600
+"""Seconds between two prunes of the journal, by any of the processes."""
+
+journal = None
+"""Journal of the api process, opened by :func:`current`."""
+
+settings = {}
+
+
+class BacklogFull(Exception):
+    """Raised when too many notifications are waiting to be delivered."""
+
+
+class Journal(object):
+
+    def __init__(self, path, max_backlog=1000):
+        self.max_backlog = max_backlog
+        self.pruned_at = time.time()
+        self.pool = ThreadPool(1)
+        self.db = sqlite3.connect(path, timeout=10, isolation_level=None,
+                                  check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT NOT NULL,
+                key TEXT NOT NULL,
+                task TEXT NOT NULL,
+                kwargs TEXT NOT NULL,
+                received_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL,
+                claimed_until REAL,
+                delivered_at REAL,
+                result TEXT,
+                last_error TEXT,
+                UNIQUE (source, key)
+            )""")
+        self.execute("""
+            CREATE INDEX IF NOT EXISTS undelivered
+            ON notifications (delivered_at, next_attempt)""")
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS maintenance (
+                name TEXT PRIMARY KEY,
+                last_run REAL NOT NULL
+            )""")
+        self.execute("INSERT OR IGNORE INTO maintenance (name, last_run) "
+                     "VALUES ('prune', 0)")
+
+    def execute(self, sql, parameters=()):
+        """Executes a statement in the thread of the journal. Returns the
+        number of rows it changed."""
+        return self.pool.apply(lambda: self.db.execute(sql, parameters).rowcount)
+
+    def fetchone(self, sql, parameters=()):
+        return self.pool.apply(lambda: self.db.execute(sql, parameters).fetchone())
+
+    def fetchall(self, sql, parameters=()):
+        return self.pool.apply(lambda: self.db.execute(sql, parameters).fetchall())
+
+    def backlog(self):
+        return self.fetchone("SELECT COUNT(*) FROM notifications "
+                             "WHERE delivered_at IS NULL")[0]
+
+    def append(self, source, key, task, kwargs):
+        """Journals a notification. Returns the row of the notification and
+        whether it is new. A notification with the same source and key as one
+        journaled before is a duplicate, senders notifying several times
+        about the same thing give each notification a key of its own. The
+        journal keeps one notification per source and key, a notification
+        appended by two processes at once is new to one of them only. Raises
+        :exc:`BacklogFull` instead of journaling when the backlog is full."""
+        if self.backlog() >= self.max_backlog:
+            raise BacklogFull()
+        now = time.time()
+        new = self.execute("INSERT OR IGNORE INTO notifications "
+                           "(source, key, task, kwargs, received_at, next_attempt) "
+                           "VALUES (?, ?, ?, ?, ?, ?)",
+                           (source, key, task, json.dumps(kwargs), now, now)) == 1
+        return self.find(source, key), new
+
+    def get(self, row_id):
+        return self.fetchone("SELECT * FROM notifications WHERE id = ?", (row_id,))
+
+    def find(self, source, key):
+        """Returns the notification with the source and key."""
+        return self.fetchone("SELECT * FROM notifications "
+                             "WHERE source = ? AND key = ?", (source, key))
+
+    def claim(self, row_id):
+        """Claims a notification for delivery by this process."""
+        now = time.time()
+        return self.execute("UPDATE notifications SET claimed_until = ? "
+                            "WHERE id = ? AND delivered_at IS NULL "
+                            "AND (claimed_until IS NULL OR claimed_until < ?)",
+                            (now + CLAIM_TIMEOUT, row_id, now)) == 1
+
+    def deliver(self, row, timeout=CLAIM_TIMEOUT):
+        """Calls the entrypoint of a claimed notification. Returns its result,
+        or raises the error after scheduling a new attempt."""
+        started = time.time()
+        try:
+            result = dispatch.call(row['task'], json.loads(row['kwargs']),
+                                   deadline=started + timeout)
+        except Exception as e:
+            backoff = min(2 ** row['attempts'], MAX_BACKOFF)
+            self.execute("UPDATE notifications SET attempts = attempts + 1, "
+                         "next_attempt = ?, claimed_until = NULL, "
+                         "last_error = ? WHERE id = ?",
+                         (time.time() + backoff, repr(e), row['id']))
+            log.warning("delivery of %s notification %s failed, retrying in %ss",
+                        row['source'], row['key'], backoff)
+            raise
+        try:
+            serialized = json.dumps(result)
+        except (TypeError, ValueError):
+            # delivered all the same, a repeated notification is answered
+            # without a result instead of being delivered again
+            log.warning("result of %s notification %s can not be journaled: %r",
+                        row['source'], row['key'], result)
+            serialized = json.dumps(None)
+        self.execute("UPDATE notifications SET attempts = attempts + 1, "
+                     "delivered_at = ?, claimed_until = NULL, result = ? "
+                     "WHERE id = ?",
+                     (time.time(), serialized, row['id']))
+        log.info("delivered %s notification %s in %.3fs, %.3fs after receipt",
+                 row['source'], row['key'], time.time() - started,
+                 time.time() - row['received_at'])
+        return result
+
+    def deliver_later(self, row):
+        """Delivers a claimed notification in a greenlet of its own, a failed
+        delivery is retried by the drain."""
+        def attempt():
+            try:
+                self.deliver(row)
+            except Exception:
+                pass
+        return gevent.spawn(attempt)
+
+    def due(self, limit=100):
+        return self.fetchall("SELECT * FROM notifications "
+                             "WHERE delivered_at IS NULL AND next_attempt <= ? "
+                             "ORDER BY id LIMIT ?", (time.time(), limit))
+
+    def drain(self):
+        """Delivers the notifications that are due, one at a time."""
+        for row in self.due():
+            if self.claim(row['id']):
+                try:
+                    self.deliver(row)
+                except Exception:
+                    pass
+
+    def prune(self):
+        """Deletes the notifications delivered longer than :data:`RETENTION`
+        ago. Every process tries once per :data:`PRUNE_INTERVAL`, only the
+        first one of an interval prunes. Returns whether it pruned."""
+        now = time.time()
+        if now - self.pruned_at < PRUNE_INTERVAL:
+            return False
+        self.pruned_at = now
+        if not self.execute("UPDATE maintenance SET last_run = ? "
+                            "WHERE name = 'prune' AND last_run < ?",
+                            (now, now - PRUNE_INTERVAL)):
+            return False
+        self.execute("DELETE FROM notifications WHERE delivered_at < ?",
+                     (now - RETENTION,))
+        return True
+
+    def run(self, interval=1):
+        """Spawns the greenlet draining the journal."""
+        def loop():
+            while True:
+                try:
+                    self.drain()
+                    self.prune()
+                except Exception:
+                    log.exception("could not drain the notification journal")
+                gevent.sleep(interval)
+        return gevent.spawn(loop)
+
+
+def configure(app_settings):
+    """Keeps the ``journal.*`` settings for opening the journal."""
+    global settings
+    settings = app_settings
+
+
+def current():
+    """Returns the journal of the api process. It is opened at the
+    ``journal.path`` setting and starts draining when first used."""
+    global journal
+    if journal is None:
+        path = settings.get('journal.path') or os.path.join(os.getcwd(),
+                                                            'notifications.db')
+        journal = Journal(path, int(settings.get('journal.max_backlog', 1000)))
+        journal.run()
+    return journal
+
+
+def result(row):
+    """Returns the result of a delivered notification."""
+    return json.loads(row['result'])
@@ -0,0 +1,171 @@
+"""Ledger of the tickets scanned at the gates.
+
+At gate opening every scan used to reach the database just to find out
+whether the ticket was used before. A scan now first claims its ticket in the
+ledger, an atomic add in the shared tier of the cache. A ticket that was
+already claimed is refused right away with the same 701 error the scanning
+entrypoint returns, only the first scan of a ticket is sent to the workers.
+Claims of scans the workers refused for another reason are released again.
+
+Claims are kept per oauth client, so a scanner of another account scanning a
+code still reaches the workers and learns the ticket is not found. They are
+kept per event the scanner passes (``event_id``), a reset of the scans of an
+event starts a new generation of its claims only. A claim is held for
+:data:`CLAIM_TTL` while the workers handle the scan. Once accepted it is kept
+until the part of the event being scanned for ends, so the ticket can be
+scanned again for a later part (see :func:`remember`). The parts are read from
+the cache, a scan does not wait for them: while they are not cached the
+claim is kept for :data:`DEFAULT_TTL` and one lookup per event fetches them
+for the scans that follow.
+
+The database remains the authority: a claim that got evicted or expired only
+means the next scan of that ticket is checked by the workers again.
+"""
+from tickee_api.core import cache, dispatch
+import calendar
+import gevent
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+CLAIM_TTL = 60
+"""Seconds a claim is held while the workers handle the scan."""
+
+DEFAULT_TTL = 2 * 3600
+"""Seconds a scanned ticket is remembered when the parts of its event are
+unknown."""
+
+MAX_TTL = 7 * 24 * 3600
+"""Most seconds a scanned ticket is remembered."""
+
+WINDOW_TTL = 300
+"""Seconds the parts of an event are kept to derive the ttl of its claims."""
+
+WINDOWS = 'scan-windows:%s'
+
+LOOKUP = 'scan-windows-lookup:%s'
+
+WINDOW_BUDGET = 5
+"""Seconds the eventparts entrypoint may take."""
+
+SCOPE = 'scan-ledger'
+
+ALREADY_SCANNED = 701
+"""Error number of the scanning entrypoint for tickets scanned before."""
+
+
+def _scope(event_id):
+    return '%s:event=%s' % (SCOPE, event_id or '?')
+
+
+def _key(client_id, event_id, ticket_code):
+    generation = cache.default.generations([_scope(event_id)])[0]
+    return 'scanned:%s:%s:%s' % (generation, client_id, ticket_code.lower())
+
+
+def claim(client_id, event_id, ticket_code, timestamp=None):
+    """Claims the ticket for a scan. Returns the claim, or None if it was
+    scanned before."""
+    key = _key(client_id, event_id, ticket_code)
+    if not cache.default.add(key, dict(scanned_at=timestamp or int(time.time())),
+                             CLAIM_TTL):
+        return None
+    return key
+
+
+def settle(claim, result, client_id=None, event_id=None):
+    """Remembers the claim of a scan the workers accepted or refused as a
+    repeated scan (see :func:`remember`), releases it otherwise."""
+    if isinstance(result, dict) and "error" in result \
+            and result.get('error_number') != ALREADY_SCANNED:
+        release(claim)
+    else:
+        remember(claim, client_id, event_id)
+
+
+def remember(claim, client_id=None, event_id=None):
+    """Keeps the claim until the part of the event being scanned for ends, as
+    far as the cached parts of the event tell (see :func:`window_end`). The
+    ttl is set once, when the scan is settled."""
+    ends_at = window_end(client_id, event_id)
+    if ends_at is None:
+        ttl = DEFAULT_TTL
+    else:
+        ttl = min(max(ends_at - time.time(), CLAIM_TTL), MAX_TTL)
+    tier = cache.default.authority
+    entry = tier.get(claim)
+    if entry is not None:
+        tier.set(claim, (entry[0], time.time() + ttl))
+
+
+def window_end(client_id, event_id):
+    """Returns when the part of the event that is going on, or the next one,
+    ends. None when it is not known, the parts of an event that are not
+    cached yet are looked up in the background (see :func:`lookup`)."""
+    if event_id is None:
+        return None
+    entry = cache.default.get(WINDOWS % event_id)
+    if entry is None:
+        lookup(client_id, event_id)
+        return None
+    now = time.time()
+    ends = [end for start, end in entry[0] if end > now]
+    return min(ends) if ends else None
+
+
+def lookup(client_id, event_id):
+    """Caches the parts of the event in a greenlet of its own. One lookup per
+    event is made every :data:`WINDOW_BUDGET` seconds at most, across the
+    processes. Returns the greenlet, or None when a lookup was made already."""
+    if not cache.default.add(LOOKUP % event_id, True, WINDOW_BUDGET):
+        return None
+    return gevent.spawn(_lookup, client_id, event_id)
+
+
+def _lookup(client_id, event_id):
+    try:
+        parts = dispatch.call("eventparts.from_event",
+                              dict(client_id=client_id, event_id=event_id),
+                              deadline=time.time() + WINDOW_BUDGET)
+    except Exception as e:
+        log.warning("could not look up the parts of event %s: %r", event_id, e)
+        return
+    cache.default.set(WINDOWS % event_id, _windows(parts), WINDOW_TTL)
+
+
+def _windows(parts):
+    """Returns the ``(start, end)`` timestamps of the eventparts."""
+    windows = []
+    if not isinstance(parts, list):
+        return windows
+    for part in parts:
+        starts_on, minutes = part.get('starts_on'), part.get('minutes')
+        if starts_on is None or minutes is None:
+            continue
+        if not isinstance(starts_on, (int, long, float)):
+            try:
+                starts_on = calendar.timegm(time.strptime(str(starts_on)[:19],
+                                                          '%Y-%m-%dT%H:%M:%S'))
+            except ValueError:
+                continue
+        windows.append((starts_on, starts_on + int(minutes) * 60))
+    return windows
+
+
+def release(claim):
+    cache.default.delete(claim)
+
+
+def duplicate(ticket_code):
+    """Returns the result of a scan refused by the ledger."""
+    return dict(error="ticket has already been scanned",
+                error_number=ALREADY_SCANNED,
+                ticket_code=ticket_code)
+
+
+def reset(event_id):
+    """Forgets the scanned tickets of the event, after its scans have been
+    reset. Claims made without an event are forgotten as well."""
+    cache.default.invalidate(_scope(event_id))
+    cache.default.invalidate(_scope(None))
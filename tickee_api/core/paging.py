@@ -0,0 +1,93 @@
+"""Keyset pagination of collection resources.
+
+A client pages through a collection by passing ``limit``, and the opaque
+``cursor`` of the previous page. The cursor holds the key of the last item
+that was returned, so the entrypoint can continue with a bounded query on
+``key > after`` instead of skipping rows, which keeps every page equally fast.
+The cursor of the next page is returned in a ``Link`` header (and in
+``X-Next-Cursor``), the body remains the list of items.
+
+Collections are only paginated when the client asks for it, views use the
+:func:`tickee_api.core.paginated` decorator and pass :func:`bounds` on to the
+entrypoint. Until the workers announce the
+:data:`~tickee_api.core.capabilities.PAGING` capability the bounds are not
+passed on, the entrypoint returns the full collection and the page is cut out
+of it by the api. Once they do, collections streamed to clients that did not
+ask for a page are fetched a page at a time as well (see
+:func:`tickee_api.core.streamed`).
+"""
+from pyramid.httpexceptions import HTTPBadRequest
+from tickee_api.core import capabilities
+import base64
+import json
+import urllib
+
+MAX_LIMIT = 1000
+"""Maximum amount of items a page may hold."""
+
+
+def encode_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value)).rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(str(cursor) +
+                                                   '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError):
+        raise HTTPBadRequest()
+
+
+def parse(request):
+    """Returns the ``(limit, after)`` requested by the client, or ``None`` when
+    the collection is not paginated."""
+    limit = request.params.get('limit')
+    cursor = request.params.get('cursor')
+    if limit is None and cursor is None:
+        return None
+    try:
+        limit = int(limit or MAX_LIMIT)
+    except ValueError:
+        raise HTTPBadRequest()
+    if not 0 < limit <= MAX_LIMIT:
+        raise HTTPBadRequest()
+    after = decode_cursor(cursor) if cursor else None
+    return limit, after
+
+
+def streams(request):
+    """Whether a collection streamed to the client is fetched a page at a
+    time: the entrypoints page and the client did not ask for a page."""
+    return capabilities.supports(capabilities.PAGING) and parse(request) is None
+
+
+def bounds(request):
+    """Returns the keyword arguments bounding the entrypoint query to the
+    requested page, or to the page being streamed. One item more than the
+    limit is asked for to find out whether there is a next page. Empty when
+    the entrypoints do not page."""
+    page = getattr(request, 'stream_page', None) or getattr(request, 'page', None)
+    if page is None or not capabilities.supports(capabilities.PAGING):
+        return {}
+    limit, after = page
+    return dict(limit=limit + 1, after=after)
+
+
+def apply(request, items, key='id'):
+    """Cuts the page out of the items and links to the next one. Entrypoints
+    that do not bound their query return too much, so the items are filtered
+    here as well."""
+    limit, after = request.page
+    items = sorted(items, key=lambda item: item.get(key))
+    if after is not None:
+        items = [item for item in items if item.get(key) > after]
+    if len(items) > limit:
+        items = items[:limit]
+        cursor = encode_cursor(items[-1].get(key))
+        params = dict((name, value.encode('utf-8'))
+                      for name, value in request.GET.items())
+        params.update(limit=limit, cursor=cursor)
+        url = request.path_url + '?' + urllib.urlencode(params)
+        request.response.headers['Link'] = '<%s>; rel="next"' % url
+        request.response.headers['X-Next-Cursor'] = cursor
+    return items
@@ -0,0 +1,179 @@
+"""Push of scan activity to the scanners of an event.
+
+Scanners used to learn about the scans of other gates by polling the tickets
+of the event. Instead they can keep a Server-Sent Events stream open (see
+:func:`stream`), on which every scan and reset of the event is pushed.
+
+Api processes broadcast the scans they handle on a fanout exchange of the
+broker, every process consumes them on a queue of its own and hands them to
+the streams it serves. The last messages of each event are kept, so a scanner
+reconnecting with ``Last-Event-ID`` receives what it missed. When it missed
+more than is kept it receives a ``resync`` message and should synchronise
+its tickets (``/events/{id}/tickets/sync``) instead.
+
+The hub is started by :func:`tickee_api.main` when the ``push.enabled``
+setting is set, scan streams are not available otherwise.
+"""
+from celery.app import default_app
+from collections import deque
+from kombu import Consumer, Exchange, Producer, Queue
+import gevent
+import gevent.queue
+import json
+import logging
+import os
+import socket
+import time
+
+log = logging.getLogger(__name__)
+
+HISTORY_SIZE = 1000
+"""Amount of messages kept per event for reconnecting scanners."""
+
+KEEPALIVE = 15
+"""Seconds after which an idle stream receives a comment, keeping proxies from
+closing it."""
+
+hub = None
+"""Hub of the api process, set by :func:`configure`."""
+
+
+class Hub(object):
+    """Broadcasts messages between the api processes and delivers them to the
+    local subscribers of an event."""
+
+    def __init__(self, app=None):
+        self.app = app or default_app
+        self.exchange = Exchange('tickee_api.scans',
+                                 type='fanout',
+                                 durable=False)
+        self.queue = Queue('tickee_api.scans.%s.%s' % (socket.gethostname(),
+                                                       os.getpid()),
+                           exchange=self.exchange,
+                           durable=False,
+                           auto_delete=True)
+        self.broker_pool = None
+        self.subscribers = {}
+        self.history = {}
+        self.started = int(time.time() * 1000000)
+
+    def subscribe(self, event_id):
+        subscriber = gevent.queue.Queue()
+        self.subscribers.setdefault(event_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, event_id, subscriber):
+        subscribers = self.subscribers.get(event_id, set())
+        subscribers.discard(subscriber)
+        if not subscribers:
+            self.subscribers.pop(event_id, None)
+
+    def missed(self, event_id, last_id):
+        """Returns the messages of the event after ``last_id``, or None when
+        messages after it are no longer kept."""
+        history = self.history.get(event_id) or []
+        if last_id < self.started:
+            # sent by another process or before this one started
+            return None
+        if len(history) == HISTORY_SIZE and history[0]['id'] > last_id:
+            return None
+        return [message for message in history if message['id'] > last_id]
+
+    def publish(self, event_id, kind, data):
+        """Broadcasts a message to the scanners of the event, in a greenlet of
+        its own so the request does not wait for it."""
+        message = dict(id=int(time.time() * 1000000),
+                       event_id=unicode(event_id),
+                       kind=kind,
+                       data=data)
+        return gevent.spawn(self._publish, message)
+
+    def _publish(self, message):
+        try:
+            with self.broker_pool.publisher() as publisher:
+                producer = Producer(publisher.channel, exchange=self.exchange,
+                                    serializer='json')
+                producer.publish(message)
+        except Exception:
+            log.exception("could not broadcast scan, delivering locally")
+            self.deliver(message)
+
+    def deliver(self, message):
+        event_id = message['event_id']
+        history = self.history.get(event_id)
+        if history is None:
+            history = self.history[event_id] = deque(maxlen=HISTORY_SIZE)
+        history.append(message)
+        for subscriber in self.subscribers.get(event_id, []):
+            subscriber.put(message)
+
+    def on_message(self, body, message):
+        message.ack()
+        self.deliver(body)
+
+    def _consume(self):
+        while True:
+            try:
+                connection = self.app.broker_connection()
+                consumer = Consumer(connection.channel(), [self.queue],
+                                    callbacks=[self.on_message])
+                consumer.consume()
+                while True:
+                    connection.drain_events()
+            except Exception:
+                log.exception("scan hub lost its connection")
+                gevent.sleep(1)
+
+    def start(self, broker_pool):
+        """Declares the queue of the process and spawns its consumer."""
+        self.broker_pool = broker_pool
+        with broker_pool.publisher() as publisher:
+            self.queue(publisher.channel).declare()
+        return gevent.spawn(self._consume)
+
+
+def configure(broker_pool):
+    """Sets up and starts the hub of the api process."""
+    global hub
+    hub = Hub()
+    hub.start(broker_pool)
+    return hub
+
+
+def publish(event_id, kind, data):
+    if hub is not None and event_id is not None:
+        hub.publish(event_id, kind, data)
+
+
+def _format(message):
+    return 'id: %s\nevent: %s\ndata: %s\n\n' % (message['id'], message['kind'],
+                                                 json.dumps(message['data']))
+
+
+def stream(event_id, last_id=None):
+    """Yields the Server-Sent Events stream of an event, starting with the
+    messages missed since ``last_id``."""
+    event_id = unicode(event_id)
+    subscriber = hub.subscribe(event_id)
+    try:
+        yield 'retry: 2000\n\n'
+        if last_id is not None:
+            missed = hub.missed(event_id, last_id)
+            if missed is None:
+                yield 'event: resync\ndata: {}\n\n'
+            else:
+                for message in missed:
+                    last_id = message['id']
+                    yield _format(message)
+        while True:
+            try:
+                message = subscriber.get(timeout=KEEPALIVE)
+            except gevent.queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            # already sent from the history
+            if last_id is not None and message['id'] <= last_id:
+                continue
+            yield _format(message)
+    finally:
+        hub.unsubscribe(event_id, subscriber)
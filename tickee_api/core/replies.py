@@ -0,0 +1,141 @@
+"""Direct reply path for the results of entrypoint calls.
+
+With the amqp result backend every task gets a result queue of its own that
+has to be declared, consumed and expired by the broker. Instead, an api
+process declares a single reply queue and binds it to the result exchange for
+the tasks it publishes. One consumer greenlet receives all results on that
+queue and hands them to the waiting requests, correlated by task id.
+
+The workers still declare the result queue of every task, so the broker gets
+the bindings on top of it. The path is therefore only used when the
+``dispatch.replies`` setting is ``direct``, and needs the gevent workers of
+gunicorn for its consumer greenlet.
+"""
+from celery import states
+from celery.app import default_app
+from celery.exceptions import TaskRevokedError, TimeoutError
+from kombu import Consumer, Exchange, Queue
+import gevent
+import gevent.event
+import logging
+import os
+import socket
+
+log = logging.getLogger(__name__)
+
+
+class PendingReply(object):
+    """Result of an entrypoint call that is delivered on the reply queue."""
+
+    def __init__(self, task_id):
+        self.task_id = task_id
+        self.event = gevent.event.AsyncResult()
+        self.progress = None
+
+    def get(self, timeout=None):
+        """Waits for the result, raising :exc:`TimeoutError` like celery's own
+        results when it does not arrive within ``timeout`` seconds."""
+        try:
+            meta = self.event.get(timeout=timeout)
+        except gevent.Timeout:
+            raise TimeoutError(self.task_id)
+        if meta['status'] in states.PROPAGATE_STATES:
+            if isinstance(meta['result'], Exception):
+                raise meta['result']
+            raise TaskRevokedError(self.task_id)
+        return meta['result']
+
+    def ready(self):
+        return self.event.ready()
+
+
+class ReplyConsumer(object):
+    """Consumes the single reply queue of the api process."""
+
+    def __init__(self, app=None):
+        self.app = app or default_app
+        # declared the same way as by the amqp result backend of the workers
+        self.exchange = Exchange(self.app.conf.CELERY_RESULT_EXCHANGE,
+                                 type='direct',
+                                 durable=self.app.conf.CELERY_RESULT_PERSISTENT,
+                                 auto_delete=True)
+        self.queue = Queue('tickee_api.replies.%s.%s' % (socket.gethostname(),
+                                                         os.getpid()),
+                           exchange=self.exchange,
+                           durable=False,
+                           auto_delete=True)
+        self.pending = {}
+        self.finished = []
+        self.connection = None
+
+    @staticmethod
+    def routing_key(task_id):
+        # the amqp result backend of the workers publishes on this key
+        return task_id.replace('-', '')
+
+    def expect(self, task_id, channel):
+        """Registers a task whose result has to be delivered on the reply queue.
+        Must be called before the task is published, ``channel`` is used to
+        bind the reply queue for the task."""
+        # the binding precedes the task on the channel, no need to wait for it
+        channel.queue_bind(queue=self.queue.name,
+                           exchange=self.exchange.name,
+                           routing_key=self.routing_key(task_id),
+                           nowait=True)
+        pending = self.pending[task_id] = PendingReply(task_id)
+        return pending
+
+    def forget(self, task_id):
+        """Stops waiting for a task, its binding is cleaned up later."""
+        if self.pending.pop(task_id, None) is not None:
+            self.finished.append(task_id)
+
+    def on_reply(self, body, message):
+        message.ack()
+        if body.get('status') not in states.READY_STATES:
+            # tasks reporting progress, see tickee_api.core.jobs
+            pending = self.pending.get(body.get('task_id'))
+            if pending is not None and body.get('status') == 'PROGRESS':
+                pending.progress = body.get('result')
+            return
+        pending = self.pending.pop(body.get('task_id'), None)
+        if pending is not None:
+            pending.event.set(body)
+            self.finished.append(pending.task_id)
+
+    def unbind_finished(self, channel):
+        """Removes the bindings of tasks whose result was received."""
+        finished, self.finished = self.finished, []
+        for task_id in finished:
+            channel.queue_unbind(queue=self.queue.name,
+                                 exchange=self.exchange.name,
+                                 routing_key=self.routing_key(task_id))
+
+    def _consume(self):
+        while True:
+            try:
+                self.connection = self.app.broker_connection()
+                channel = self.connection.channel()
+                consumer = Consumer(channel, [self.queue],
+                                    callbacks=[self.on_reply])
+                consumer.consume()
+                while True:
+                    self.connection.drain_events()
+            except Exception:
+                log.exception("reply consumer lost its connection")
+                gevent.sleep(1)
+
+    def start(self, broker_pool, cleanup_interval=5):
+        """Declares the reply queue and spawns the consumer greenlet and a
+        greenlet unbinding finished tasks through ``broker_pool``."""
+        with broker_pool.publisher() as publisher:
+            self.queue(publisher.channel).declare()
+
+        def cleanup():
+            while True:
+                gevent.sleep(cleanup_interval)
+                if self.finished:
+                    with broker_pool.publisher() as publisher:
+                        self.unbind_finished(publisher.channel)
+
+        return [gevent.spawn(self._consume), gevent.spawn(cleanup)]
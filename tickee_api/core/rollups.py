@@ -0,0 +1,191 @@
+"""Precomputed statistics of accounts and events.
+
+Statistics are aggregated by the workers over all orders and tickets, which
+is too expensive to do for every poll of a dashboard. The result of a
+statistics entrypoint is kept as a rollup in the cache (the shared tier when
+there is one, so all api processes serve the same rollup) and served as is.
+
+Every rollup remembers the generations of the data it was computed from
+(orders, scans, events), kept per account or event. Write routes start a new
+generation of the data they change for the account or event they know, or of
+that data of all accounts and events when they do not know it (see
+:func:`touch` and :mod:`tickee_api.resources.invalidation`). A rollup
+computed from an older generation is recomputed in the background by one
+greenlet of one process while the current rollup keeps being served. Writes
+the api does not see (workers, the admin) are picked up after
+:data:`MAX_AGE` seconds. Only the first request for a rollup waits for the
+entrypoint, and no longer than its deadline.
+"""
+from datetime import datetime
+from pyramid.httpexceptions import HTTPNotModified
+from tickee_api.core import cache, dispatch, not_modified
+from webob.datetime_utils import UTC
+import copy
+import gevent
+import gevent.event
+import hashlib
+import json
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+ROLLUPS = {
+    'account': ("statistics.account", [('orders', 'account_id')]),
+    'account-monthly': ("statistics.account.detailed", [('orders', 'account_id')]),
+    'event': ("tickee.statistics.entrypoints.event_statistics",
+              [('orders', 'event_id'), ('scans', 'event_id'), ('events', 'event_id')]),
+}
+"""Maps a rollup on its statistics entrypoint and the data it is computed
+from, with the kwarg of the entrypoint the data is kept per."""
+
+ROLLUP_TTL = 7 * 24 * 3600
+"""Seconds a rollup is kept."""
+
+MAX_AGE = 300
+"""Seconds after which a rollup is recomputed even if no change was seen."""
+
+MIN_INTERVAL = 5
+"""Minimum seconds between two computations of a rollup, so a busy gate or
+shop does not keep the workers recomputing it."""
+
+REFRESH_BUDGET = 60
+"""Seconds a computation of a rollup may take."""
+
+ERROR_TTL = 30
+"""Seconds an error of a statistics entrypoint (e.g. an unknown event) is
+kept, so polling it does not reach the workers either."""
+
+inflight = {}
+
+
+def _tier():
+    # rollups are refreshed by any process, keep them out of the local tiers
+    return cache.default.authority
+
+
+def _key(name, kwargs):
+    return 'rollup:%s:%r' % (name, sorted(kwargs.items()))
+
+
+def _scope(data, id_name=None, value=None):
+    if id_name is None:
+        return 'rollup:%s' % data
+    return 'rollup:%s:%s=%s' % (data, id_name, value)
+
+
+def _scopes(name, kwargs):
+    scopes = []
+    for data, id_name in ROLLUPS[name][1]:
+        scopes.append(_scope(data))
+        scopes.append(_scope(data, id_name, kwargs.get(id_name)))
+    return scopes
+
+
+def touch(data, **ids):
+    """Marks the rollups computed from ``data`` as outdated: those of the
+    given ids, e.g. ``touch('scans', event_id=5)``, or those of all accounts
+    and events when no id is known."""
+    ids = dict((id_name, value) for id_name, value in ids.items()
+               if value is not None)
+    if not ids:
+        cache.default.invalidate(_scope(data))
+    for id_name, value in ids.items():
+        cache.default.invalidate(_scope(data, id_name, value))
+
+
+def stale(name, kwargs, rollup):
+    """Whether the rollup should be recomputed."""
+    age = time.time() - rollup['computed_at']
+    if age >= MAX_AGE:
+        return True
+    return age >= MIN_INTERVAL and \
+        rollup['generations'] != cache.default.generations(_scopes(name, kwargs))
+
+
+def compute(name, kwargs):
+    """Starts computing the rollup in a greenlet of its own, unless this
+    process computes it already. Returns the pending rollup, ``statistics``
+    holds the result of the entrypoint. The computation is bounded by
+    :data:`REFRESH_BUDGET` instead of the deadline of a request, so a request
+    giving up on it still leaves the rollup for the next one."""
+    key = _key(name, kwargs)
+    computing = inflight.get(key)
+    if computing is None:
+        computing = inflight[key] = gevent.event.AsyncResult()
+        gevent.spawn(_compute, name, kwargs, key, computing)
+    return computing
+
+
+def _compute(name, kwargs, key, computing):
+    try:
+        # generations before the call, changes during it leave the rollup stale
+        generations = cache.default.generations(_scopes(name, kwargs))
+        statistics = dispatch.call(ROLLUPS[name][0], kwargs,
+                                   deadline=time.time() + REFRESH_BUDGET)
+        rollup = dict(statistics=statistics,
+                      computed_at=time.time(),
+                      generations=generations,
+                      version=hashlib.md5(json.dumps(statistics, sort_keys=True)).hexdigest())
+        if isinstance(statistics, dict) and "error" in statistics:
+            ttl = ERROR_TTL
+        else:
+            ttl = ROLLUP_TTL
+        _tier().set(key, (rollup, time.time() + ttl))
+        computing.set(rollup)
+    except Exception as e:
+        log.warning("could not compute the %s rollup %r: %r", name, kwargs, e)
+        computing.set_exception(e)
+    finally:
+        del inflight[key]
+
+
+def refresh(name, kwargs):
+    """Recomputes the rollup in the background, unless another greenlet of any
+    process already does."""
+    key = _key(name, kwargs)
+    lock = 'rollup-lock:%s' % key
+    if key in inflight or not _tier().add(lock, (True, time.time() + REFRESH_BUDGET)):
+        return None
+    computing = compute(name, kwargs)
+    computing.rawlink(lambda computed: _tier().delete(lock))
+    return computing
+
+
+def get(name, kwargs):
+    """Returns the rollup ``name`` of the statistics for the kwargs. A stale
+    rollup is served while it is refreshed. A missing rollup is waited for
+    until the deadline of the request, raising
+    :exc:`~tickee_api.core.dispatch.DeadlineExceeded` when it is not computed
+    by then."""
+    entry = _tier().get(_key(name, kwargs))
+    if entry is not None:
+        rollup = entry[0]
+        if stale(name, kwargs, rollup):
+            refresh(name, kwargs)
+        return rollup
+    computing = compute(name, kwargs)
+    try:
+        return computing.get(timeout=max(dispatch.current_deadline() - time.time(), 0.001))
+    except gevent.Timeout:
+        raise dispatch.DeadlineExceeded(ROLLUPS[name][0], published=True)
+
+
+def respond(request, rollup):
+    """Answers the request with the statistics of the rollup, its freshness in
+    the Last-Modified and Age headers. A poll for the statistics the client
+    already has is answered with 304 Not Modified. Errors of the entrypoint
+    are answered with 404."""
+    statistics = rollup['statistics']
+    if isinstance(statistics, dict) and "error" in statistics:
+        request.response.status_int = 404
+        return copy.deepcopy(statistics)
+    last_modified = datetime.fromtimestamp(int(rollup['computed_at']), UTC)
+    if not_modified(request, rollup['version'], last_modified):
+        return HTTPNotModified(headers=[('ETag', '"%s"' % rollup['version'])])
+    request.response.status_int = 200
+    request.response.etag = rollup['version']
+    request.response.last_modified = last_modified
+    request.response.headers['Age'] = str(max(int(time.time() - rollup['computed_at']), 0))
+    # rollups of the local tier are shared, keep them intact
+    return copy.deepcopy(statistics)
@@ -0,0 +1,205 @@
+"""Incremental synchronisation of collections.
+
+The current state of a collection is kept as its head: the version handed
+out to clients as an opaque cursor, and the state itself, mapping item ids on
+a digest of the item. When the collection changes, the head moves to a new
+version and the changes from the previous version are kept as a delta. A
+client passing back a cursor receives the added, changed and removed items of
+the deltas from its version up to the head. When a delta on the way is gone,
+or the cursor is unknown, the client receives the full collection again.
+
+Heads, states and deltas live in the shared tier of the cache, one state per
+collection (in chunks, a big event does not fit a memcached item) and one
+delta per version. The collection is only fetched from the workers when a
+write changed the generations of its ``scopes`` (see
+:mod:`tickee_api.core.cache`), at most once per :data:`MIN_INTERVAL` by
+any process, or when a client needs the full collection. Writes the api does
+not see are picked up after :data:`MAX_AGE` seconds.
+"""
+from tickee_api.core import cache
+import hashlib
+import json
+import time
+import zlib
+
+SNAPSHOT_TTL = 6 * 3600
+"""Seconds a cursor remains usable."""
+
+MAX_AGE = 300
+"""Seconds after which the collection is fetched again even if no change was
+seen."""
+
+MIN_INTERVAL = 5
+"""Minimum seconds between two fetches of a collection, so a busy gate does
+not have every sync fetch it."""
+
+MAX_CHAIN = 200
+"""Most deltas applied for one cursor, older cursors receive the full
+collection."""
+
+CHUNK_SIZE = 512 * 1024
+"""Bytes of a state stored per cache item."""
+
+
+def _digest(item):
+    return hashlib.md5(json.dumps(item, sort_keys=True)).hexdigest()[:8]
+
+
+def _version(state):
+    return hashlib.md5(json.dumps(sorted(state.items()))).hexdigest()
+
+
+def _head_key(scope):
+    return 'sync-head:%s' % scope
+
+
+def _state_key(scope, chunk):
+    return 'sync-state:%s:%d' % (scope, chunk)
+
+
+def _delta_key(scope, version):
+    return 'sync-delta:%s:%s' % (scope, version)
+
+
+def _lock_key(scope):
+    return 'sync-lock:%s' % scope
+
+
+def _get(key):
+    entry = cache.default.authority.get(key)
+    return entry[0] if entry is not None else None
+
+
+def _set(key, value, ttl=SNAPSHOT_TTL):
+    cache.default.authority.set(key, (value, time.time() + ttl))
+
+
+def load_state(scope, head):
+    """Returns the state of the head, or None when (a chunk of) it is gone or
+    belongs to another version."""
+    chunks = []
+    for chunk in range(head['chunks']):
+        data = _get(_state_key(scope, chunk))
+        if data is None:
+            return None
+        chunks.append(data)
+    try:
+        version, state = json.loads(zlib.decompress(''.join(chunks)))
+    except (zlib.error, ValueError):
+        # chunks of two versions, the head moved while reading
+        return None
+    if version != head['version']:
+        return None
+    return state
+
+
+def store_state(scope, version, state):
+    """Stores the state, returns the number of chunks it takes."""
+    data = zlib.compress(json.dumps([version, state]))
+    chunks = range(0, len(data), CHUNK_SIZE) or [0]
+    for chunk, start in enumerate(chunks):
+        _set(_state_key(scope, chunk), data[start:start + CHUNK_SIZE])
+    return len(chunks)
+
+
+def advance(scope, head, items, generations, key='id'):
+    """Moves the head to the state of ``items``, keeping the changes since the
+    previous head as a delta. Returns the new head."""
+    state = dict((unicode(item[key]), _digest(item)) for item in items)
+    version = _version(state)
+    if head is not None and head['version'] == version:
+        head = dict(head, generations=generations, fetched_at=time.time())
+        _set(_head_key(scope), head)
+        return head
+
+    previous = load_state(scope, head) if head is not None else None
+    if previous is not None:
+        added, changed = [], []
+        for item in items:
+            item_id = unicode(item[key])
+            if item_id not in previous:
+                added.append(item)
+            elif previous[item_id] != state[item_id]:
+                changed.append(item)
+        removed = [item_id for item_id in previous if item_id not in state]
+        # a delta about as big as the collection is no better than a full sync
+        if len(added) + len(changed) + len(removed) <= len(items) // 2:
+            _set(_delta_key(scope, head['version']),
+                 zlib.compress(json.dumps(dict(version=version, added=added,
+                                               changed=changed, removed=removed))))
+
+    head = dict(version=version, generations=generations, fetched_at=time.time(),
+                chunks=store_state(scope, version, state))
+    _set(_head_key(scope), head)
+    return head
+
+
+def collect(scope, cursor, version, key='id'):
+    """Combines the deltas from the cursor up to the version into one. Returns
+    None when they do not reach it."""
+    items, removed = {}, set()
+    added = set()
+    for _ in range(MAX_CHAIN):
+        if cursor == version:
+            return dict(added=[items[i] for i in sorted(added)],
+                        changed=[items[i] for i in sorted(items) if i not in added],
+                        removed=sorted(removed))
+        data = _get(_delta_key(scope, cursor))
+        if data is None:
+            return None
+        delta = json.loads(zlib.decompress(data))
+        for item in delta['added']:
+            item_id = unicode(item[key])
+            if item_id in removed:
+                # the client still has the item, it changed
+                removed.discard(item_id)
+            else:
+                added.add(item_id)
+            items[item_id] = item
+        for item in delta['changed']:
+            items[unicode(item[key])] = item
+        for item_id in delta['removed']:
+            items.pop(item_id, None)
+            if item_id in added:
+                added.discard(item_id)
+            else:
+                removed.add(item_id)
+        cursor = delta['version']
+    return None
+
+
+def changes(scope, cursor, fetch, scopes=[], key='id'):
+    """Returns a dict with the cursor of the current state of the collection
+    and the items added, changed or removed since the state the ``cursor``
+    refers to. When the cursor is unknown or expired all items are returned as
+    added and ``full`` is set.
+
+    ``fetch`` returns the items of the collection, it is called when the
+    generations of ``scopes`` changed or a full collection is returned. An
+    error dict it returns is returned as is."""
+    head = _get(_head_key(scope))
+    items = None
+    generations = cache.default.generations(scopes)
+    if head is None or (head['generations'] != generations and
+                        time.time() - head['fetched_at'] >= MIN_INTERVAL) \
+                    or time.time() - head['fetched_at'] >= MAX_AGE:
+        if head is None or cache.default.authority.add(
+                _lock_key(scope), (True, time.time() + MIN_INTERVAL)):
+            items = fetch()
+            if isinstance(items, dict) and "error" in items:
+                return items
+            head = advance(scope, head, items, generations, key)
+
+    if cursor == head['version']:
+        return dict(cursor=cursor, full=False, added=[], changed=[], removed=[])
+    if cursor:
+        delta = collect(scope, cursor, head['version'], key)
+        if delta is not None:
+            return dict(cursor=head['version'], full=False, **delta)
+
+    if items is None:
+        items = fetch()
+        if isinstance(items, dict) and "error" in items:
+            return items
+        head = advance(scope, head, items, generations, key)
+    return dict(cursor=head['version'], full=True, added=items, changed=[], removed=[])
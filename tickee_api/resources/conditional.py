@@ -0,0 +1,19 @@
+'''
+Makes rendered GET responses conditional. Responses that do not carry an ETag
+yet get one computed from their body, and webob answers requests whose
+If-None-Match matches it with an empty 304 Not Modified. That still calls the
+view and its entrypoints, views polled often are @cached or @validated so
+their ETag is known before the view runs.
+'''
+from pyramid.events import NewResponse, subscriber
+
+
+@subscriber(NewResponse)
+def add_etag(event):
+    request, response = event.request, event.response
+    if request.method != 'GET' or response.status_int != 200:
+        return
+    # streamed responses have no body to hash
+    if response.etag is None and response.content_length is not None:
+        response.md5_etag()
+    response.conditional_response = True
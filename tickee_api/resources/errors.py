@@ -0,0 +1,21 @@
+'''
+Views rendering errors raised while handling api requests.
+'''
+from pyramid.view import view_config
+from tickee_api.core.dispatch import DeadlineExceeded
+import logging
+
+
+@view_config(context=DeadlineExceeded, renderer='json')
+def deadline_exceeded(exc, request):
+    """The latency budget of the request ran out. When the task was never sent
+    the api is overloaded (503), otherwise the workers did not answer in time 
+    (504)."""
+    logging.warning("deadline exceeded for %s (published: %s)", 
+                    exc.task_name, exc.published)
+    if exc.published:
+        request.response.status_int = 504
+    else:
+        request.response.status_int = 503
+        request.response.headers['Retry-After'] = '1'
+    return dict(error='service unavailable')
@@ -3,25 +3,51 @@ Created on 9 jan. 2012
 
 @author: kevin
 '''
-from celery.execute import send_task
-from pyramid.httpexceptions import HTTPForbidden
+from pyramid.httpexceptions import HTTPBadRequest, HTTPForbidden
 from pyramid.view import view_config
+from tickee_api.core import journal
 import hashlib
+import logging
+import time
+
+log = logging.getLogger(__name__)
 
 
 
 @view_config(route_name='saasy-subscriptions',
              request_method='POST', renderer='json')
 def saasy_sub_activated(request):
+    """Handles the subscription notifications of SaaSy. The notification is
+    journaled and answered right away, the journal delivers it to the workers
+    and retries failed deliveries. SaaSy sends every notification about a
+    subscription with the same SubscriptionReference, notifications are
+    deduplicated on their own signed security_hash so only a retry of the
+    same notification is dropped."""
+    received_at = time.time()
     privatekey = "591bfff6c852de664c78be0f267d52a9"
     value = request.params.get('security_data','') + privatekey
     # perform security check   
-    if hashlib.md5(value).hexdigest().strip() != request.params.get('security_hash').strip():      
+    security_hash = request.params.get('security_hash', '').strip()
+    if hashlib.md5(value).hexdigest().strip() != security_hash:      
         raise HTTPForbidden()
     
     subscription_ref = request.params.get('SubscriptionReference')
+    if not subscription_ref:
+        raise HTTPBadRequest()
+    
+    notifications = journal.current()
+    try:
+        row, new = notifications.append('saasy',
+                                        '%s:%s' % (subscription_ref, security_hash),
+                                        "subscriptions.notification",
+                                        dict(subscription_ref=subscription_ref))
+    except journal.BacklogFull:
+        request.response.status_int = 503
+        request.response.headers['Retry-After'] = '60'
+        return None
     
-    result = send_task("subscriptions.notification",
-                       kwargs=dict(subscription_ref=subscription_ref)).get()
+    if new and notifications.claim(row['id']):
+        notifications.deliver_later(row)
     
-    print result
\ No newline at end of file
+    log.info("saasy notification %s %s in %.3fs", subscription_ref,
+             "journaled" if new else "was a duplicate", time.time() - received_at)
\ No newline at end of file
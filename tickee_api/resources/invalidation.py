@@ -0,0 +1,242 @@
+'''
+Declares which cached read resources are changed by each write route. After a
+write succeeded, the responses cached for those resources are invalidated
+before the response of the write is sent, so a read after a write never
+returns stale data. Statistics rollups computed from the data changed by the
+write are marked outdated as well.
+'''
+from pyramid.events import NewResponse, subscriber
+from tickee_api.core import cache
+from tickee_api.core import rollups
+
+DEPENDENCIES = {
+    # Accounts
+    ('02-account-resource', 'PUT'):         ['02-account-resource',
+                                             '02-account-events',
+                                             '02-event-list',
+                                             '02-event-page'],
+    ('02-account-resource', 'DELETE'):      ['02-account-resource',
+                                             '02-account-events',
+                                             '02-event-list',
+                                             '02-event-page'],
+    # Events
+    ('02-account-events', 'POST'):          [('02-account-events', 'account_id'),
+                                             '02-event-list'],
+    ('02-event-resource', 'PUT'):           [('02-event-resource', 'event_id'),
+                                             '02-account-events',
+                                             '02-event-list',
+                                             ('02-event-page', 'event_id')],
+    ('02-event-resource', 'DELETE'):        [('02-event-resource', 'event_id'),
+                                             ('02-event-tickettypes', 'event_id'),
+                                             ('02-event-parts', 'event_id'),
+                                             '02-account-events',
+                                             '02-event-list',
+                                             ('02-event-page', 'event_id')],
+    ('01-event-create', 'POST'):            ['02-account-events',
+                                             '02-event-list'],
+    ('01-event-resource', 'POST'):          [('02-event-resource', 'event_id'),
+                                             '02-account-events',
+                                             '02-event-list',
+                                             ('02-event-page', 'event_id')],
+    # Eventparts
+    ('02-event-parts', 'POST'):             [('02-event-resource', 'event_id'),
+                                             ('02-event-parts', 'event_id'),
+                                             ('02-event-page', 'event_id')],
+    ('02-parts-resource', 'PUT'):           [('02-parts-resource', 'eventpart_id'),
+                                             '02-event-resource',
+                                             '02-event-parts',
+                                             '02-event-page'],
+    ('02-parts-resource', 'DELETE'):        [('02-parts-resource', 'eventpart_id'),
+                                             ('02-parts-tickettypes', 'eventpart_id'),
+                                             '02-event-resource',
+                                             '02-event-parts',
+                                             '02-event-tickettypes',
+                                             '02-event-page'],
+    ('01-event-addpart', 'POST'):           [('02-event-resource', 'event_id'),
+                                             ('02-event-parts', 'event_id'),
+                                             ('02-event-page', 'event_id')],
+    # Tickettypes
+    ('02-event-tickettypes', 'POST'):       [('02-event-tickettypes', 'event_id'),
+                                             ('02-event-resource', 'event_id'),
+                                             '02-parts-tickettypes',
+                                             ('02-event-page', 'event_id')],
+    ('02-parts-tickettypes', 'POST'):       [('02-parts-tickettypes', 'eventpart_id'),
+                                             '02-event-tickettypes',
+                                             '02-event-resource',
+                                             '02-event-page'],
+    ('02-tickettype-resource', 'PUT'):      [('02-tickettype-resource', 'tickettype_id'),
+                                             '02-event-tickettypes',
+                                             '02-parts-tickettypes',
+                                             '02-event-resource',
+                                             '02-event-page'],
+    ('02-tickettype-resource', 'DELETE'):   [('02-tickettype-resource', 'tickettype_id'),
+                                             '02-event-tickettypes',
+                                             '02-parts-tickettypes',
+                                             '02-event-resource',
+                                             '02-event-page'],
+    ('01-tickettype-create', 'POST'):       ['02-event-tickettypes',
+                                             '02-parts-tickettypes',
+                                             '02-event-resource',
+                                             '02-event-page'],
+    ('01-tickettype-resource', 'POST'):     ['02-event-tickettypes',
+                                             '02-parts-tickettypes',
+                                             '02-event-resource',
+                                             '02-event-page'],
+    # Locations
+    ('02-account-locations', 'POST'):       [('02-account-locations', 'account_id')],
+    ('02-location-details', 'PUT'):         [('02-location-details', 'location_id'),
+                                             '02-account-locations',
+                                             '02-event-locations',
+                                             '02-event-resource',
+                                             '02-account-events',
+                                             '02-event-page'],
+    ('02-location-details', 'DELETE'):      [('02-location-details', 'location_id'),
+                                             '02-account-locations',
+                                             '02-event-locations',
+                                             '02-event-resource',
+                                             '02-account-events',
+                                             '02-event-page'],
+    # Orders
+    ('02-account-orders-collection', 'POST'): [('02-account-orders-collection', 'account_id'),
+                                              ('02-account-visitors', 'account_id'),
+                                              '02-event-tickets',
+                                              '02-event-orders',
+                                              '02-event-tickets-bundle'],
+    ('02-orders-detail', 'POST'):           ['02-event-tickets',
+                                             '02-event-orders',
+                                             '02-account-orders-collection',
+                                             '02-account-visitors',
+                                             '02-event-tickets-bundle'],
+    ('02-orders-detail', 'PUT'):            ['02-event-tickets',
+                                             '02-event-orders',
+                                             '02-account-orders-collection',
+                                             '02-account-visitors',
+                                             '02-event-tickets-bundle'],
+    ('02-orders-detail', 'DELETE'):         ['02-event-tickets',
+                                             '02-event-orders',
+                                             '02-account-orders-collection',
+                                             '02-account-visitors',
+                                             '02-event-tickets-bundle'],
+    ('01-order-new', 'POST'):               ['02-event-tickets',
+                                             '02-event-orders',
+                                             '02-account-orders-collection',
+                                             '02-account-visitors',
+                                             '02-event-tickets-bundle'],
+    ('01-order-add', 'POST'):               ['02-event-tickets',
+                                             '02-event-orders',
+                                             '02-account-orders-collection',
+                                             '02-account-visitors',
+                                             '02-event-tickets-bundle'],
+    ('01-order-checkout', 'POST'):          ['02-event-tickets',
+                                             '02-event-orders',
+                                             '02-account-orders-collection',
+                                             '02-account-visitors',
+                                             '02-event-tickets-bundle'],
+    ('01-psp-notify', 'GET'):               ['02-event-tickets',
+                                             '02-event-orders',
+                                             '02-account-orders-collection',
+                                             '02-account-visitors',
+                                             '02-event-tickets-bundle'],
+    ('01-psp-notify', 'POST'):              ['02-event-tickets',
+                                             '02-event-orders',
+                                             '02-account-orders-collection',
+                                             '02-account-visitors',
+                                             '02-event-tickets-bundle'],
+    ('02-psp-notify', 'GET'):               ['02-event-tickets',
+                                             '02-event-orders',
+                                             '02-account-orders-collection',
+                                             '02-account-visitors',
+                                             '02-event-tickets-bundle'],
+    ('02-psp-notify', 'POST'):              ['02-event-tickets',
+                                             '02-event-orders',
+                                             '02-account-orders-collection',
+                                             '02-account-visitors',
+                                             '02-event-tickets-bundle'],
+    # Tickets and scans
+    ('02-ticket-details', 'PUT'):           ['02-event-tickets'],
+    ('02-ticket-details', 'DELETE'):        ['02-event-tickets',
+                                             '02-event-tickets-bundle'],
+    ('02-ticket-scans', 'POST'):            [('02-event-tickets', 'event_id')],
+    ('02-ticket-batch-scans', 'POST'):      [('02-event-tickets', 'event_id')],
+    ('02-ticket-reset-scans', 'POST'):      [('02-event-tickets', 'event_id')],
+    ('01-ticket-scan', 'POST'):             [('02-event-tickets', 'event_id', 'list_event_id')],
+    ('01-ticket-reset-scans', 'POST'):      [('02-event-tickets', 'event_id')],
+    # Users, as part of the tickets, orders and visitors
+    ('02-user-details', 'PUT'):             ['02-event-tickets',
+                                             '02-event-orders',
+                                             '02-account-orders-collection',
+                                             '02-account-visitors'],
+    ('02-user-details', 'DELETE'):          ['02-event-tickets',
+                                             '02-event-orders',
+                                             '02-account-orders-collection',
+                                             '02-account-visitors'],
+}
+"""Maps a write route and method on the read resources it invalidates. A read
+resource is either a route name, invalidating all its responses, or a tuple of
+a route name and the matchdict key the write route shares with it,
+invalidating only the responses for that value. The write route may pass the
+value as a parameter, named as the third item of the tuple when it is named
+differently. A write without the value invalidates all responses."""
+
+ROLLUP_DEPENDENCIES = {
+    # Events
+    ('02-event-resource', 'DELETE'):        [('events', 'event_id')],
+    # Orders
+    ('02-orders-detail', 'POST'):           ['orders'],
+    ('02-orders-detail', 'PUT'):            ['orders'],
+    ('02-orders-detail', 'DELETE'):         ['orders'],
+    ('01-order-checkout', 'POST'):          ['orders'],
+    ('01-psp-notify', 'GET'):               ['orders'],
+    ('01-psp-notify', 'POST'):              ['orders'],
+    ('02-psp-notify', 'GET'):               ['orders'],
+    ('02-psp-notify', 'POST'):              ['orders'],
+    # Scans
+    ('02-ticket-scans', 'POST'):            [('scans', 'event_id')],
+    ('02-ticket-batch-scans', 'POST'):      [('scans', 'event_id')],
+    ('02-ticket-reset-scans', 'POST'):      [('scans', 'event_id')],
+    ('01-ticket-scan', 'POST'):             [('scans', 'event_id', 'list_event_id')],
+    ('01-ticket-reset-scans', 'POST'):      [('scans', 'event_id')],
+}
+"""Maps a write route and method on the data of statistics rollups it changes
+(see :mod:`tickee_api.core.rollups`). The data is either a name, outdating
+the rollups of all accounts and events (the order routes do not know whose
+orders they change), or a tuple of the name and the id it is kept per, found
+like the values of :data:`DEPENDENCIES`. A write without the id outdates the
+rollups of all of them."""
+
+
+def invalidate(route_name, method, matchdict, params=None):
+    """Invalidates the read resources changed by a write to the route."""
+    dependencies = DEPENDENCIES.get((route_name, method))
+    for dependency in dependencies or []:
+        if isinstance(dependency, tuple):
+            dependency_name, key = dependency[:2]
+            value = _value(dependency, matchdict, params)
+            if value is None:
+                cache.invalidate(dependency_name)
+            else:
+                cache.invalidate(dependency_name, {key: value})
+        else:
+            cache.invalidate(dependency)
+    for dependency in ROLLUP_DEPENDENCIES.get((route_name, method), []):
+        if isinstance(dependency, tuple):
+            rollups.touch(dependency[0],
+                          **{dependency[1]: _value(dependency, matchdict, params)})
+        else:
+            rollups.touch(dependency)
+
+
+def _value(dependency, matchdict, params):
+    """Returns the value a scoped dependency is invalidated for, None when the
+    write does not know it."""
+    key = dependency[2] if len(dependency) > 2 else dependency[1]
+    return matchdict.get(key) or (params or {}).get(key)
+
+
+@subscriber(NewResponse)
+def invalidate_dependencies(event):
+    request = event.request
+    route = getattr(request, 'matched_route', None)
+    if route is None or event.response.status_int >= 400:
+        return
+    invalidate(route.name, request.method, request.matchdict, request.params)
@@ -16,4 +16,14 @@ def blitzio(request):
 def always_good(request):
     logging.debug(request.params.get('serial-number'))
     return """<notification-acknowledgment xmlns="http://checkout.google.com/schema/2" 
-    serial-number="%s" />""" % request.params.get('serial-number')
\ No newline at end of file
+    serial-number="%s" />""" % request.params.get('serial-number')
+
+@view_config(route_name='maintenance-broker', renderer="json")
+def broker_health(request):
+    """Reports the state of the broker connection pool of this process."""
+    broker_pool = request.registry.broker_pool
+    status = broker_pool.status()
+    status['healthy'] = broker_pool.health_check()
+    if not status['healthy'] and not status['connections']:
+        request.response.status_int = 503
+    return status
\ No newline at end of file
@@ -0,0 +1,90 @@
+'''
+Ingestion of payment service provider notifications, shared by the psp_notify
+views of all api versions. Notifications are journaled before they are
+forwarded to the workers (see tickee_api.core.journal), so a slow broker or
+worker no longer makes the provider time out and retry.
+'''
+from tickee_api.core import journal
+from tickee_api.resources import invalidation
+import hashlib
+
+NOTIFICATION_TASK = "tickee.paymentproviders.entrypoints.notification"
+
+DELIVERY_TIMEOUT = 5
+"""Seconds a provider waiting for the response of the workers is given."""
+
+GOOGLE_ACKNOWLEDGMENT = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                         '<notification-acknowledgment '
+                         'xmlns="http://checkout.google.com/schema/2" '
+                         'serial-number="%s" />')
+
+
+def notification_key(request):
+    """Returns the key deduplicating the notification. A retry of a
+    notification gets the key of the notification it repeats."""
+    if 'serial-number' in request.params:
+        # googlecheckout, unique per notification
+        return 'serial-number:%s' % request.params['serial-number']
+    if 'transactionid' in request.params:
+        # mspfastcheckout, notifies every status change of the transaction.
+        # Notifications reporting the status are journaled once per status,
+        # the others once per distinct notification.
+        status = request.params.get('status') or _digest(request)
+        return 'transactionid:%s:%s' % (request.params['transactionid'], status)
+    return 'md5:%s' % _digest(request)
+
+
+def _digest(request):
+    digest = hashlib.md5(request.body)
+    digest.update(repr(sorted(request.params.items())))
+    return digest.hexdigest()
+
+
+def unavailable(request):
+    request.response.status_int = 503
+    request.response.headers['Retry-After'] = '30'
+    return ''
+
+
+def ingest(request, psp_id):
+    """Journals the notification and answers the provider.
+
+    Google Checkout notifications are acknowledged right away, its
+    acknowledgment does not depend on the workers. Other providers expect a
+    response made by the workers: it is waited for a few seconds, after that
+    the provider is asked to retry, the retry is answered from the journal
+    once the notification was delivered. Repeated notifications are answered
+    with the result of the first one.
+    """
+    key = notification_key(request)
+    context = dict(message = request.body,
+                   params = request.params.dict_of_lists())
+    notifications = journal.current()
+    try:
+        row, new = notifications.append('psp:%s' % psp_id, key,
+                                        NOTIFICATION_TASK,
+                                        dict(psp_id=psp_id, context=context))
+    except journal.BacklogFull:
+        return unavailable(request)
+
+    if 'serial-number' in request.params:
+        if new and notifications.claim(row['id']):
+            # the order changes once the workers handled the notification,
+            # after the response invalidated its dependencies
+            route_name, method = request.matched_route.name, request.method
+            notifications.deliver_later(row).link(
+                lambda greenlet: invalidation.invalidate(route_name, method, {}))
+        request.response.content_type = 'application/xml'
+        return GOOGLE_ACKNOWLEDGMENT % request.params['serial-number']
+
+    if row['delivered_at'] is not None:
+        return journal.result(row)
+
+    if not notifications.claim(row['id']):
+        # being delivered by another request, or waiting for a new attempt
+        return unavailable(request)
+    try:
+        return notifications.deliver(row, timeout=DELIVERY_TIMEOUT)
+    except Exception:
+        # the journal retries the delivery
+        return unavailable(request)
@@ -1,8 +1,8 @@
-from celery.execute import send_task
 from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.view import view_config
 from pyramid_oauth2.decorator import oauth2
 from tickee_api import oauth_scopes
+from tickee_api.core.dispatch import call
 
 @view_config(route_name='01-account-collection', 
              request_method='GET', renderer='json')
@@ -74,24 +74,24 @@ def account_events_list(request, oauth2_context):
     
     if oauth2_context is not None:
         if oauth_scopes.INTERNAL in oauth2_context.scopes:
-            result = send_task("tickee.events.entrypoints.event_list", 
-                               kwargs=dict(client_id=None,
-                                           account_id=account_id,
-                                           active_only=False))
+            result = call("tickee.events.entrypoints.event_list", 
+                          kwargs=dict(client_id=None,
+                                      account_id=account_id,
+                                      active_only=False))
         elif oauth_scopes.ACCOUNT_MGMT in oauth2_context.scopes:
-            result = send_task("tickee.events.entrypoints.event_list", 
-                               kwargs=dict(client_id=oauth2_context.client_id,
-                                           account_id=account_id))
+            result = call("tickee.events.entrypoints.event_list", 
+                          kwargs=dict(client_id=oauth2_context.client_id,
+                                      account_id=account_id))
     else:
-        result = send_task("tickee.events.entrypoints.event_list", 
-                           kwargs=dict(client_id=None,
-                                       account_id=account_id,
-                                       active_only=True))
+        result = call("tickee.events.entrypoints.event_list", 
+                      kwargs=dict(client_id=None,
+                                  account_id=account_id,
+                                  active_only=True))
         
     
     # call entrypoint
 
-    return result.get()
+    return result
 
 
 
@@ -134,11 +134,11 @@ def account_create(request, oauth2_context):
     email = request.params.get('email')
     user_id = request.params.get('user_id')
     
-    result = send_task("accounts.create", 
-                       kwargs=dict(account_name=account_name, 
-                                   email=email, 
-                                   user_id=user_id))
-    return result.get()
+    result = call("accounts.create", 
+                  kwargs=dict(account_name=account_name, 
+                              email=email, 
+                              user_id=user_id))
+    return result
 
 
 
@@ -167,10 +167,10 @@ def account_details(request):
     # URL Parameters
     account_id = request.matchdict.get('account_id')
     
-    result = send_task("accounts.details", 
-                       kwargs=dict(oauth_client_id=None, 
-                                   account_id=account_id))
-    return result.get()
+    result = call("accounts.details", 
+                  kwargs=dict(oauth_client_id=None, 
+                              account_id=account_id))
+    return result
 
 
 
@@ -198,7 +198,7 @@ def account_own_details(request, oauth2_context):
         
     """
     
-    result = send_task("accounts.details", 
-                       kwargs=dict(oauth_client_id=oauth2_context.client_id, 
-                                   account_id=None))
-    return result.get()
\ No newline at end of file
+    result = call("accounts.details", 
+                  kwargs=dict(oauth_client_id=oauth2_context.client_id, 
+                              account_id=None))
+    return result
\ No newline at end of file
@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
-from celery.execute import send_task
 from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.view import view_config
 from pyramid_oauth2.decorator import oauth2
 from tickee_api import oauth_scopes
+from tickee_api.core.dispatch import call
 
 #    config.add_route('01-event-access',            '/0.1/event/{event_id:\d+}/access')
 
@@ -92,19 +92,19 @@ def event_create(request, oauth2_context):
         
     # create event linked to account_id
     if oauth_scopes.INTERNAL in oauth2_context.scopes:
-        result = send_task("tickee.events.entrypoints.event_create", 
-                           kwargs=dict(client_id=None, 
-                                       event_name=event_name, 
-                                       venue_id=venue_id,
-                                       account_id=account_id))
+        result = call("tickee.events.entrypoints.event_create", 
+                      kwargs=dict(client_id=None, 
+                                  event_name=event_name, 
+                                  venue_id=venue_id,
+                                  account_id=account_id))
     # create event linked to own account
     elif oauth_scopes.ACCOUNT_MGMT in oauth2_context.scopes:
-        result = send_task("tickee.events.entrypoints.event_create", 
-                           kwargs=dict(client_id=oauth2_context.client_id, 
-                                       event_name=event_name,
-                                       venue_id=venue_id, 
-                                       account_id=None))
-    return result.get()
+        result = call("tickee.events.entrypoints.event_create", 
+                      kwargs=dict(client_id=oauth2_context.client_id, 
+                                  event_name=event_name,
+                                  venue_id=venue_id, 
+                                  account_id=None))
+    return result
 
 
 
@@ -165,12 +165,12 @@ def event_details(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
     
-    result = send_task("tickee.events.entrypoints.event_details", 
-                       kwargs=dict(client_id=client_id, 
-                                   event_id=event_id,
-                                   include_visitors=include_visitors,
-                                   include_eventparts=include_eventparts))
-    return result.get()
+    result = call("tickee.events.entrypoints.event_details", 
+                  kwargs=dict(client_id=client_id, 
+                              event_id=event_id,
+                              include_visitors=include_visitors,
+                              include_eventparts=include_eventparts))
+    return result
 
 
 
@@ -220,13 +220,13 @@ def event_update(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
     
-    result = send_task("tickee.events.entrypoints.event_update", 
-                       kwargs=dict(client_id=client_id, 
-                                   event_id=event_id,
-                                   values_dict=dict(event_name=event_name,
-                                                    venue_id=venue_id,
-                                                    activate=activate)))
-    return result.get()
+    result = call("tickee.events.entrypoints.event_update", 
+                  kwargs=dict(client_id=client_id, 
+                              event_id=event_id,
+                              values_dict=dict(event_name=event_name,
+                                               venue_id=venue_id,
+                                               activate=activate)))
+    return result
 
 
 
@@ -288,15 +288,15 @@ def event_tickets(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
     
-    result = send_task("tickee.events.entrypoints.event_tickets", 
-                       kwargs=dict(client_id=client_id, 
-                                   event_id=event_id,
-                                   tickettype_id=tickettype_id,
-                                   eventpart_id=eventpart_id,
-                                   location_id=location_id,
-                                   include_scan_state=include_scan_state,
-                                   include_user=include_user))
-    return result.get()
+    result = call("tickee.events.entrypoints.event_tickets", 
+                  kwargs=dict(client_id=client_id, 
+                              event_id=event_id,
+                              tickettype_id=tickettype_id,
+                              eventpart_id=eventpart_id,
+                              location_id=location_id,
+                              include_scan_state=include_scan_state,
+                              include_user=include_user))
+    return result
 
 
 
@@ -360,13 +360,13 @@ def event_access(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
     
-    result = send_task("tickee.scanning.entrypoints.access_code", 
-                       kwargs=dict(client_id=client_id, 
-                                   event_id=event_id,
-                                   tickettype_id=tickettype_id,
-                                   eventpart_id=eventpart_id,
-                                   location_id=location_id))
-    return result.get()
+    result = call("tickee.scanning.entrypoints.access_code", 
+                  kwargs=dict(client_id=client_id, 
+                              event_id=event_id,
+                              tickettype_id=tickettype_id,
+                              eventpart_id=eventpart_id,
+                              location_id=location_id))
+    return result
     
     
 @view_config(route_name='01-event-addpart', 
@@ -429,12 +429,12 @@ def event_addpart(request, oauth2_context):
     except:
         raise HTTPBadRequest
     
-    result = send_task("tickee.events.eventparts.entrypoints.eventpart_create", 
-                       kwargs=dict(client_id=oauth2_context.client_id,
-                                   event_id=event_id,
-                                   venue_id=venue_id,
-                                   name=name,
-                                   description=description,
-                                   starts_on=starts_on,
-                                   ends_on=ends_on))
-    return result.get()    
\ No newline at end of file
+    result = call("tickee.events.eventparts.entrypoints.eventpart_create", 
+                  kwargs=dict(client_id=oauth2_context.client_id,
+                              event_id=event_id,
+                              venue_id=venue_id,
+                              name=name,
+                              description=description,
+                              starts_on=starts_on,
+                              ends_on=ends_on))
+    return result    
\ No newline at end of file
@@ -1,8 +1,8 @@
-from celery.execute import send_task
 from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.view import view_config
 from pyramid_oauth2.decorator import oauth2
 from tickee_api import oauth_scopes
+from tickee_api.core.dispatch import call
 
     
 @view_config(route_name='01-location-list', 
@@ -65,10 +65,10 @@ def location_search(request):
     except Exception:
         raise HTTPBadRequest
     
-    result = send_task("tickee.venues.entrypoints.location_search", 
-                       kwargs=dict(name_filter=name_filter,
-                                   limit=limit))
-    return result.get()
+    result = call("tickee.venues.entrypoints.location_search", 
+                  kwargs=dict(name_filter=name_filter,
+                              limit=limit))
+    return result
 
 
 
@@ -107,10 +107,10 @@ def location_details(request, oauth2_context):
     # Parameters
     include_address = request.params.get('include_address') in ['true', 't', '1']
 
-    result = send_task("tickee.venues.entrypoints.location_details", 
-                       kwargs=dict(location_id=location_id,
-                                   include_address=include_address))
-    return result.get()
+    result = call("tickee.venues.entrypoints.location_details", 
+                  kwargs=dict(location_id=location_id,
+                              include_address=include_address))
+    return result
 
 
 
@@ -180,26 +180,26 @@ def location_create(request, oauth2_context):
     
     # create location linked to account_id
     if oauth_scopes.INTERNAL in oauth2_context.scopes:
-        result = send_task("tickee.venues.entrypoints.location_create", 
-                           kwargs=dict(client_id=None,
-                                       location_name=location_name,
-                                       latlng=latlng,
-                                       address_dict=dict(street_line1=street_line1,
-                                                        street_line2=street_line2,
-                                                        postal_code=postal_code,
-                                                        city=city,
-                                                        country_code=country_code),
-                                       account_id=account_id))
+        result = call("tickee.venues.entrypoints.location_create", 
+                      kwargs=dict(client_id=None,
+                                  location_name=location_name,
+                                  latlng=latlng,
+                                  address_dict=dict(street_line1=street_line1,
+                                                   street_line2=street_line2,
+                                                   postal_code=postal_code,
+                                                   city=city,
+                                                   country_code=country_code),
+                                  account_id=account_id))
     # create location linked to own account
     elif oauth_scopes.ACCOUNT_MGMT in oauth2_context.scopes:
-        result = send_task("tickee.venues.entrypoints.location_create", 
-                           kwargs=dict(client_id=oauth2_context.client_id,
-                                       location_name=location_name,
-                                       latlng=latlng,
-                                       address_dict=dict(street_line1=street_line1,
-                                                        street_line2=street_line2,
-                                                        postal_code=postal_code,
-                                                        city=city,
-                                                        country_code=country_code),
-                                       account_id=None))
-    return result.get()    
+        result = call("tickee.venues.entrypoints.location_create", 
+                      kwargs=dict(client_id=oauth2_context.client_id,
+                                  location_name=location_name,
+                                  latlng=latlng,
+                                  address_dict=dict(street_line1=street_line1,
+                                                   street_line2=street_line2,
+                                                   postal_code=postal_code,
+                                                   city=city,
+                                                   country_code=country_code),
+                                  account_id=None))
+    return result    
@@ -1,8 +1,10 @@
-from celery.execute import send_task
-from pyramid.httpexceptions import HTTPBadRequest, HTTPAccepted
+from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.view import view_config
 from pyramid_oauth2.decorator import oauth2
 from tickee_api import oauth_scopes
+from tickee_api.core import deadline
+from tickee_api.core import jobs
+from tickee_api.core.dispatch import call
 
 
 @view_config(route_name='01-order-mail', 
@@ -22,14 +24,17 @@ def order_mail(request, oauth2_context):
     Returns::
         
         202 ACCEPTED
+        
+        The job sending the mail, its status is available on /0.2/jobs/{id}.
     """
     # URL Parameters
     order_key = request.matchdict.get('order_key')
     
-    result = send_task("orders.resend", 
-                       kwargs=dict(client_id=oauth2_context.client_id,
-                                   order_key=order_key)).get()
-    return result
+    job = jobs.submit("orders.resend", 
+                      dict(client_id=oauth2_context.client_id,
+                           order_key=order_key),
+                      oauth2_context.client_id)
+    return jobs.accepted(request, job)
 
 
 
@@ -37,6 +42,7 @@ def order_mail(request, oauth2_context):
              request_method='GET', renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
                         oauth_scopes.INTERNAL])
+@deadline(5)
 def order_details(request, oauth2_context):
     """Returns all information about an order.
     
@@ -70,10 +76,10 @@ def order_details(request, oauth2_context):
     # URL Parameters
     order_key = request.matchdict.get('order_key')
     
-    result = send_task("tickee.orders.entrypoints.order_details", 
-                       kwargs=dict(client_id=oauth2_context.client_id, 
-                                   order_key=order_key))
-    return result.get()
+    result = call("tickee.orders.entrypoints.order_details", 
+                  kwargs=dict(client_id=oauth2_context.client_id, 
+                              order_key=order_key))
+    return result
     
 
 
@@ -82,6 +88,7 @@ def order_details(request, oauth2_context):
              request_method='POST', renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
                         oauth_scopes.INTERNAL])
+@deadline(15)
 def order_checkout(request, oauth2_context):
     """Will start the checkout procedure with the paymentprovider and returns the
     information necessary to complete the transaction.
@@ -133,15 +140,15 @@ def order_checkout(request, oauth2_context):
         is_gift = False
     
     if is_gift:
-        result = send_task('orders.gift',
-                           kwargs=dict(client_id=oauth2_context.client_id,
-                                       order_key=order_key))
+        result = call('orders.gift',
+                      kwargs=dict(client_id=oauth2_context.client_id,
+                                  order_key=order_key))
     else:
-        result = send_task("tickee.paymentproviders.entrypoints.checkout_order", 
-                           kwargs=dict(client_id=oauth2_context.client_id,
-                                       order_key=order_key,
-                                       redirect_url=redirect_url))
-    return result.get()
+        result = call("tickee.paymentproviders.entrypoints.checkout_order", 
+                      kwargs=dict(client_id=oauth2_context.client_id,
+                                  order_key=order_key,
+                                  redirect_url=redirect_url))
+    return result
 
 
 
@@ -149,6 +156,7 @@ def order_checkout(request, oauth2_context):
              request_method='POST', renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
                         oauth_scopes.INTERNAL])
+@deadline(8)
 def order_add(request, oauth2_context):
     """Creates an event and returns its id.
     
@@ -180,18 +188,19 @@ def order_add(request, oauth2_context):
     except ValueError:
         raise HTTPBadRequest()
         
-    result = send_task("tickee.orders.entrypoints.order_add", 
-                       kwargs=dict(client_id=oauth2_context.client_id,
-                                   order_key=order_key,
-                                   tickettype_id=tickettype_id,
-                                   amount=amount))
-    return result.get()
+    result = call("tickee.orders.entrypoints.order_add", 
+                  kwargs=dict(client_id=oauth2_context.client_id,
+                              order_key=order_key,
+                              tickettype_id=tickettype_id,
+                              amount=amount))
+    return result
 
 
 
 @view_config(route_name='01-order-new', 
              request_method='POST', renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT])
+@deadline(8)
 def order_new(request, oauth2_context):
     """Starts a new order that can be purchased using the client's paymentprovider.
     If the user already had an started order for that account, it will be 
@@ -228,9 +237,9 @@ def order_new(request, oauth2_context):
     except ValueError:
         raise HTTPBadRequest()
         
-    result = send_task("tickee.orders.entrypoints.order_new", 
-                       kwargs=dict(client_id=oauth2_context.client_id, 
-                                   user_id=user_id,
-                                   tickettype_id=tickettype_id,
-                                   amount=amount))
-    return result.get()
\ No newline at end of file
+    result = call("tickee.orders.entrypoints.order_new", 
+                  kwargs=dict(client_id=oauth2_context.client_id, 
+                              user_id=user_id,
+                              tickettype_id=tickettype_id,
+                              amount=amount))
+    return result
\ No newline at end of file
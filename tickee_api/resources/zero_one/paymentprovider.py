@@ -1,5 +1,5 @@
-from celery.execute import send_task
 from pyramid.view import view_config
+from tickee_api.resources import psp
 
 
 #config.add_route('01-paymentprovider-notify',  '/0.1/payments/{psp_id:\d+}')
@@ -20,16 +20,11 @@ def psp_notify(request):
     Returns:
         Each payment service provider requires a different response.
         The creation of the response information is handled by the provider class 
-        of the payment service provider. 
+        of the payment service provider. Notifications are journaled first, 
+        see tickee_api.resources.psp.
         
     """
     # URL Parameters
     psp_id = int(request.matchdict.get('psp_id'))
     
-    context = dict(message = request.body,
-                   params = request.params.dict_of_lists())
-    
-    result = send_task("tickee.paymentproviders.entrypoints.notification", 
-                       kwargs=dict(psp_id=psp_id,
-                                   context=context))
-    return result.get()
\ No newline at end of file
+    return psp.ingest(request, psp_id)
\ No newline at end of file
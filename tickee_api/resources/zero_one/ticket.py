@@ -1,8 +1,12 @@
-from celery.execute import send_task
-from pyramid.httpexceptions import HTTPBadRequest, HTTPAccepted
+from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.view import view_config
 from pyramid_oauth2.decorator import oauth2
 from tickee_api import oauth_scopes
+from tickee_api.core import deadline
+from tickee_api.core import jobs
+from tickee_api.core import ledger
+from tickee_api.core import push
+from tickee_api.core.dispatch import call
 
 
 @view_config(route_name='01-ticket-mail', 
@@ -21,24 +25,27 @@ def ticket_mail(request, oauth2_context):
         
     Returns::
         
-        200 OK
+        202 ACCEPTED
         
-        true or false depending on whether the mail was sent correctly.
+        The job sending the mail, its result on /0.2/jobs/{id} is true or 
+        false depending on whether the mail was sent correctly.
         
     """
     # URL Parameters
     ticket_code = request.matchdict.get('ticket_code')
     
-    result = send_task("tickets.resend", 
-                       kwargs=dict(client_id=oauth2_context.client_id,
-                                   ticket_code=ticket_code)).get()
-    return result
+    job = jobs.submit("tickets.resend", 
+                      dict(client_id=oauth2_context.client_id,
+                           ticket_code=ticket_code),
+                      oauth2_context.client_id)
+    return jobs.accepted(request, job)
 
 
 
 @view_config(route_name='01-ticket-details', 
              request_method='GET', renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.INTERNAL])
+@deadline(2)
 def ticket_details(request, oauth2_context):
     """Creates an event and returns its id.
     
@@ -86,16 +93,17 @@ def ticket_details(request, oauth2_context):
     # URL Parameters
     ticket_code = request.matchdict.get('ticket_code')
     
-    result = send_task("tickee.tickets.entrypoints.ticket_details", 
-                       kwargs=dict(client_id=None,
-                                   ticket_code=ticket_code))
-    return result.get()
+    result = call("tickee.tickets.entrypoints.ticket_details", 
+                  kwargs=dict(client_id=None,
+                              ticket_code=ticket_code))
+    return result
 
 
 @view_config(route_name='01-ticket-scan', 
              request_method='POST', renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
                         oauth_scopes.INTERNAL])
+@deadline(2)
 def ticket_scan(request, oauth2_context):
     """Scans in a ticket and receives diff updates from the server
     based on the list_* parameters it received.
@@ -154,16 +162,29 @@ def ticket_scan(request, oauth2_context):
     except:
         raise HTTPBadRequest()
     
-    result = send_task("tickee.scanning.entrypoints.ticket_scan", 
-                       kwargs=dict(client_id=oauth2_context.client_id,
-                                   ticket_code=ticket_code,
-                                   scan_datetime=scanned_at,
-                                   list_timestamp=list_timestamp, 
-                                   list_eventpart_id=list_eventpart_id, 
-                                   list_event_id=list_event_id,
-                                   list_tickettype_id=list_tickettype_id,
-                                   extra_info=request.POST.dict_of_lists()))
-    return result.get()
+    # the response carries the updates of the scanner's lists, repeated scans
+    # still reach the workers but are recorded for the scanners of 0.2
+    claim = ledger.claim(oauth2_context.client_id, list_event_id, ticket_code)
+    try:
+        result = call("tickee.scanning.entrypoints.ticket_scan", 
+                      kwargs=dict(client_id=oauth2_context.client_id,
+                                  ticket_code=ticket_code,
+                                  scan_datetime=scanned_at,
+                                  list_timestamp=list_timestamp, 
+                                  list_eventpart_id=list_eventpart_id, 
+                                  list_event_id=list_event_id,
+                                  list_tickettype_id=list_tickettype_id,
+                                  extra_info=request.POST.dict_of_lists()))
+    except Exception:
+        if claim is not None:
+            ledger.release(claim)
+        raise
+    if claim is not None:
+        if isinstance(result, dict) and result.get('scanned'):
+            ledger.remember(claim, oauth2_context.client_id, list_event_id)
+        else:
+            ledger.release(claim)
+    return result
     
 
 
@@ -217,9 +238,15 @@ def ticket_reset_scans(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
         
-    result = send_task("scanning.reset", 
-                       kwargs=dict(client_id=client_id,
-                                   event_id=event_id, 
-                                   eventpart_id=eventpart_id, 
-                                   tickettype_id=tickettype_id))
-    return result.get()
\ No newline at end of file
+    result = call("scanning.reset", 
+                  kwargs=dict(client_id=client_id,
+                              event_id=event_id, 
+                              eventpart_id=eventpart_id, 
+                              tickettype_id=tickettype_id))
+    
+    if not (type(result) is dict and "error" in result):
+        ledger.reset(event_id)
+        push.publish(event_id, 'reset', 
+                     dict(eventpart_id=eventpart_id,
+                          tickettype_id=tickettype_id))
+    return result
\ No newline at end of file
@@ -1,8 +1,8 @@
-from celery.execute import send_task
 from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.view import view_config
 from pyramid_oauth2.decorator import oauth2
 from tickee_api import oauth_scopes
+from tickee_api.core.dispatch import call
 import datetime
 import time
 
@@ -33,9 +33,9 @@ def tickettype_details(request, oauth2_context):
     kwargs['tickettype_id'] = tickettype_id
     kwargs['client_id'] = oauth2_context.client_id
 
-    result = send_task("tickettypes.details", 
-                       kwargs=kwargs)
-    return result.get()
+    result = call("tickettypes.details", 
+                  kwargs=kwargs)
+    return result
 
 
 @view_config(route_name='01-tickettype-resource', 
@@ -80,9 +80,9 @@ def tickettype_update(request, oauth2_context):
     kwargs['tickettype_id'] = tickettype_id
     kwargs['client_id'] = oauth2_context.client_id
 
-    result = send_task("tickettypes.update", 
-                       kwargs=kwargs)
-    return result.get()
+    result = call("tickettypes.update", 
+                  kwargs=kwargs)
+    return result
 
 
 
@@ -154,6 +154,6 @@ def tickettype_create(request, oauth2_context):
     kwargs['client_id'] = oauth2_context.client_id
 
     
-    result = send_task("tickettypes.create", 
-                       kwargs=kwargs)
-    return result.get()
\ No newline at end of file
+    result = call("tickettypes.create", 
+                  kwargs=kwargs)
+    return result
\ No newline at end of file
@@ -1,8 +1,8 @@
-from celery.execute import send_task
 from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.view import view_config
 from pyramid_oauth2.decorator import oauth2
 from tickee_api import oauth_scopes
+from tickee_api.core.dispatch import call
 
 #    config.add_route('01-user-collection',              '/0.1/users')
 #    config.add_route('01-user-tickets',                 '/0.1/users/{user_id:\d+}/tickets')
@@ -93,9 +93,9 @@ def user_authenticate(request, oauth2_context):
     email = request.params.get('email')
     password = request.params.get('password')  
      
-    result = send_task("users.validate_password", 
-                       kwargs=dict(email=email, 
-                                   password=password)).get()
+    result = call("users.validate_password", 
+                  kwargs=dict(email=email, 
+                              password=password))
     return result
 
 
@@ -137,9 +137,9 @@ def user_tickets(request, oauth2_context):
         oauth2_context.client_id = None 
     
     # call entrypoint
-    result = send_task("tickets.from_user", 
-                       kwargs=dict(client_id=oauth2_context.client_id,
-                                   user_id=user_id)).get()
+    result = call("tickets.from_user", 
+                  kwargs=dict(client_id=oauth2_context.client_id,
+                              user_id=user_id))
     return result
 
 
@@ -180,9 +180,9 @@ def user_orders(request, oauth2_context):
         oauth2_context.client_id = None 
     
     # call entrypoint
-    result = send_task("orders.from_user", 
-                       kwargs=dict(client_id=oauth2_context.client_id,
-                                   user_id=user_id)).get()
+    result = call("orders.from_user", 
+                  kwargs=dict(client_id=oauth2_context.client_id,
+                              user_id=user_id))
     return result
 
 
@@ -216,8 +216,8 @@ def user_exists(request, oauth2_context):
     # Parameters
     email = request.params.get('email')
     
-    result = send_task("tickee.users.entrypoints.user_exists", 
-                       kwargs=dict(email=email)).get()
+    result = call("tickee.users.entrypoints.user_exists", 
+                  kwargs=dict(email=email))
     return result
 
 
@@ -253,10 +253,10 @@ def user_create(request, oauth2_context):
     email = request.params.get('email')
     password = request.params.get('password')  
      
-    result = send_task("tickee.users.entrypoints.user_create", 
-                       kwargs=dict(client_id=oauth2_context.client_id,
-                                   email=email, 
-                                   password=password)).get()
+    result = call("tickee.users.entrypoints.user_create", 
+                  kwargs=dict(client_id=oauth2_context.client_id,
+                              email=email, 
+                              password=password))
     return result
 
 
@@ -305,7 +305,7 @@ def user_details(request, oauth2_context):
     # Parameters
     include_orders = request.params.get('include_orders') in ['true', 't', '1']
     
-    result = send_task("tickee.users.entrypoints.user_details", 
-                       kwargs=dict(user_id=user_id,
-                                   include_orders=include_orders)).get()
+    result = call("tickee.users.entrypoints.user_details", 
+                  kwargs=dict(user_id=user_id,
+                              include_orders=include_orders))
     return result
\ No newline at end of file
@@ -1,8 +1,11 @@
-from celery.execute import send_task
 from pyramid.view import view_config
 from pyramid_oauth2.decorator import oauth2
 from tickee_api import oauth_scopes
-from tickee_api.core import validate_schema
+from tickee_api.core import cached, validate_schema
+from tickee_api.core import jobs
+from tickee_api.core import rollups
+from tickee_api.core.dispatch import call
+from tickee_api.resources import invalidation
 from tickee_api.resources.zero_two import schema
 
 
@@ -31,9 +34,9 @@ def account_list(request, oauth2_context):
         include_inactive = False
     
     if short_name is not None:
-        account = send_task("accounts.exists", 
-                         kwargs=dict(account_name=short_name,
-                                     include_inactive=include_inactive)).get()
+        account = call("accounts.exists", 
+                    kwargs=dict(account_name=short_name,
+                                include_inactive=include_inactive))
         if account is not False:
             return [account]
         
@@ -48,12 +51,20 @@ def account_list(request, oauth2_context):
              request_method='DELETE', renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.INTERNAL])
 def account_delete(request, oauth2_context):
-    """ Deactivates the account """
+    """ Deactivates the account, as a job when the async parameter is given """
     # URL Parameters
     account_identifier = request.matchdict.get('account_id')
     
-    result = send_task("accounts.deactivate", 
-                       kwargs=dict(account_name=account_identifier)).get()
+    if jobs.requested(request):
+        matchdict = dict(request.matchdict)
+        job = jobs.submit("accounts.deactivate", 
+                          dict(account_name=account_identifier),
+                          on_done=lambda result: invalidation.invalidate(
+                              '02-account-resource', 'DELETE', matchdict))
+        return jobs.accepted(request, job)
+    
+    result = call("accounts.deactivate", 
+                  kwargs=dict(account_name=account_identifier))
 
 
     if type(result) is dict and "error" in result:
@@ -64,21 +75,19 @@ def account_delete(request, oauth2_context):
 
 @view_config(route_name='02-account-resource', 
              request_method='GET', renderer='json')
-def account_details(request):
+@cached(60)
+def account_details(context, request):
     """ Retrieves detailed information about an organizer """
     # URL Parameters
     account_identifier = request.matchdict.get('account_id')
     
     try:
-        account_id = int(account_identifier)
-        result = send_task("accounts.details", 
-                       kwargs=dict(oauth_client_id=None, 
-                                   account_id=account_id))
-    except:
-        result = send_task("accounts.details", 
-                       kwargs=dict(oauth_client_id=None, 
-                                   account_shortname=account_identifier))
-    result = result.get()
+        kwargs = dict(oauth_client_id=None, 
+                      account_id=int(account_identifier))
+    except ValueError:
+        kwargs = dict(oauth_client_id=None, 
+                      account_shortname=account_identifier)
+    result = call("accounts.details", kwargs=kwargs)
     if "error" in result:
         request.response.status_int = 404
         
@@ -94,9 +103,9 @@ def account_update(request, oauth2_context):
     """ Updates account details """
     account_id = request.matchdict.get('account_id')
     account_info = request.deserialized_body
-    result = send_task("accounts.update", 
-                       kwargs=dict(account_identifier=account_id,
-                                   account_info=account_info)).get()
+    result = call("accounts.update", 
+                  kwargs=dict(account_identifier=account_id,
+                              account_info=account_info))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -115,9 +124,9 @@ def account_update(request, oauth2_context):
 def account_own_details(request, oauth2_context):
     """Retrieves detailed information about an organizer"""
     
-    result = send_task("accounts.details", 
-                       kwargs=dict(oauth_client_id=oauth2_context.client_id, 
-                                   account_id=None)).get()
+    result = call("accounts.details", 
+                  kwargs=dict(oauth_client_id=oauth2_context.client_id, 
+                              account_id=None))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -136,7 +145,9 @@ def account_own_details(request, oauth2_context):
 @oauth2(allowed_scopes=[oauth_scopes.INTERNAL,
                         oauth_scopes.ACCOUNT_MGMT])
 def account_statistics(request, oauth2_context):
-    """Returns statistical information about the account."""
+    """Returns statistical information about the account. The statistics are
+    precomputed (see :mod:`tickee_api.core.rollups`), the Last-Modified header
+    tells when."""
     account_id = request.matchdict.get('account_id')
     
     if oauth_scopes.INTERNAL in oauth2_context.scopes:
@@ -144,13 +155,10 @@ def account_statistics(request, oauth2_context):
     else:
         client_id =  oauth2_context.client_id
     
-    result = send_task("statistics.account", 
-                       kwargs=dict(client_id=client_id,
-                                   account_id=account_id)).get()
-    if "error" in result:
-        request.response.status_int = 404                        
-        
-    return result
+    rollup = rollups.get('account', 
+                         dict(client_id=client_id,
+                              account_id=account_id))
+    return rollups.respond(request, rollup)
 
 
 ###############################################################################
@@ -162,7 +170,9 @@ def account_statistics(request, oauth2_context):
 @oauth2(allowed_scopes=[oauth_scopes.INTERNAL,
                         oauth_scopes.ACCOUNT_MGMT])
 def account_statistics_monthly(request, oauth2_context):
-    """Returns monthly statistical information about the account."""
+    """Returns monthly statistical information about the account. The
+    statistics are precomputed (see :mod:`tickee_api.core.rollups`), the
+    Last-Modified header tells when."""
     account_id = request.matchdict.get('account_id')
     
     if oauth_scopes.INTERNAL in oauth2_context.scopes:
@@ -170,14 +180,11 @@ def account_statistics_monthly(request, oauth2_context):
     else:
         client_id =  oauth2_context.client_id
     
-    result = send_task("statistics.account.detailed", 
-                       kwargs=dict(client_id=client_id,
-                                   account_id=account_id,
-                                   max_months_ago=12)).get()
-    if "error" in result:
-        request.response.status_int = 404                             
-        
-    return result
+    rollup = rollups.get('account-monthly', 
+                         dict(client_id=client_id,
+                              account_id=account_id,
+                              max_months_ago=12))
+    return rollups.respond(request, rollup)
 
 ###############################################################################
 # /accounts/:shortname/keys
@@ -195,9 +202,9 @@ def account_keys(request, oauth2_context):
     else:
         client_id =  oauth2_context.client_id
     
-    result = send_task("accounts.keys", 
-                       kwargs=dict(client_id=client_id,
-                                   account_short=account_id)).get()
+    result = call("accounts.keys", 
+                  kwargs=dict(client_id=client_id,
+                              account_short=account_id))
                                    
     if "error" in result:
         request.response.status_int = 404                             
@@ -218,9 +225,9 @@ def user_account_list(request, oauth2_context):
     user_id = request.matchdict.get('user_id')
     include_inactive = request.params.get('include_inactive') in ['t', '1', 'true']
     
-    result = send_task("accounts.list_accounts", 
-                       kwargs=dict(user_id=user_id,
-                                   include_inactive=include_inactive)).get()
+    result = call("accounts.list_accounts", 
+                  kwargs=dict(user_id=user_id,
+                              include_inactive=include_inactive))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -241,9 +248,9 @@ def user_account_create(request, oauth2_context):
     user_id = request.matchdict.get('user_id')
     account_info = request.deserialized_body
     
-    result = send_task("accounts.create", 
-                       kwargs=dict(account_info=account_info,
-                                   user_id=user_id)).get()
+    result = call("accounts.create", 
+                  kwargs=dict(account_info=account_info,
+                              user_id=user_id))
                                    
     if type(result) is dict and "error" not in result:
         request.response.status_int = 201
@@ -0,0 +1,98 @@
+from pyramid.request import Request
+from pyramid.router import Router
+from pyramid.view import view_config
+from tickee_api.core import validate_schema
+from tickee_api.resources.zero_two import schema
+import gevent
+import json
+
+###############################################################################
+# /batch
+###############################################################################
+
+@view_config(route_name='02-batch', request_method='POST', renderer='json')
+@validate_schema(schema.Batch)
+def batch(context, request):
+    """Performs several api requests in one round trip. Every request is
+    routed to its view as if it was made on its own, with the Authorization
+    header of the batch. Consecutive GET requests are performed concurrently,
+    other requests one at a time in the order given, after the requests
+    preceding them.
+
+    Request::
+
+        POST /batch
+
+        {
+            "requests": [
+                {"method": "GET", "path": "/0.2/accounts/tickee"},
+                {"method": "GET", "path": "/0.2/accounts/tickee/statistics"},
+                {"method": "PUT", "path": "/0.2/events/1",
+                 "body": {"name": "Tickee Festival"}},
+                ...
+            ]
+        }
+
+    Returns::
+
+        A list with the response of every request, in the order of the request.
+
+        [
+            {
+                "status": 200,
+                "headers": {"ETag": "..."},
+                "body": {...}
+            },
+            ...
+        ]
+
+    """
+    subrequests = request.deserialized_body['requests']
+    router = Router(request.registry)
+
+    # groups of requests that may run concurrently
+    groups = []
+    for index, subrequest in enumerate(subrequests):
+        if subrequest['method'] == 'GET' and groups and groups[-1][0] == 'GET':
+            groups[-1][1].append(index)
+        else:
+            groups.append((subrequest['method'], [index]))
+
+    responses = [None] * len(subrequests)
+    for method, indices in groups:
+        greenlets = [gevent.spawn(perform, request, router, subrequests[index])
+                     for index in indices]
+        gevent.joinall(greenlets)
+        for index, greenlet in zip(indices, greenlets):
+            if greenlet.successful():
+                responses[index] = greenlet.value
+            else:
+                responses[index] = dict(status=500, headers={},
+                                        body=dict(error='internal error'))
+
+    request.response.status_int = 200
+    return responses
+
+
+def perform(request, router, subrequest):
+    """Routes a request of the batch to its view and returns its response."""
+    headers = {}
+    if 'Authorization' in request.headers:
+        headers['Authorization'] = request.headers['Authorization']
+    blank = Request.blank(subrequest['path'],
+                          base_url=request.application_url,
+                          headers=headers)
+    blank.method = subrequest['method']
+    if subrequest['body'] is not None:
+        blank.content_type = 'application/json'
+        blank.body = json.dumps(subrequest['body'])
+
+    response = blank.get_response(router)
+    body = response.body
+    if response.content_type == 'application/json' and body:
+        body = json.loads(body)
+    headers = dict((name, value) for name, value in response.headerlist
+                   if name not in ['Content-Length', 'Content-Type'])
+    return dict(status=response.status_int,
+                headers=headers,
+                body=body)
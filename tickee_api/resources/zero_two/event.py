@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
-from celery.execute import send_task
 from pyramid.view import view_config
 from pyramid_oauth2.decorator import oauth2
 from tickee_api import oauth_scopes
-from tickee_api.core import return_fields, validate_schema
+from tickee_api.core import cached, deadline, paginated, return_fields, validate_schema
+from tickee_api.core import jobs
+from tickee_api.core import paging
+from tickee_api.core import rollups
+from tickee_api.core.dispatch import call, call_many, current_deadline, spawn
+from tickee_api.resources import invalidation
 from tickee_api.resources.zero_two import schema
 
 ###############################################################################
@@ -13,6 +17,9 @@ from tickee_api.resources.zero_two import schema
 @view_config(route_name='02-event-list', 
              request_method='GET', renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.INTERNAL, oauth_scopes.ACCOUNT_MGMT])
+@paginated()
+@cached(30, params=['include_inactive', 'include_private', 'include_past',
+                    'limit', 'cursor'])
 def event_list(request, oauth2_context):
     
     """ Returns a list of upcoming (public) events. """
@@ -20,12 +27,13 @@ def event_list(request, oauth2_context):
     include_private = request.params.get('include_private') in ['true', 't', '1']
     include_past = request.params.get('include_past') in ['true', 't', '1']
     
-    result = send_task("tickee.events.entrypoints.event_list", 
-                       kwargs=dict(client_id=None,
-                                   account_shortname=None,
-                                   active_only=not include_inactive,
-                                   public_only=not include_private,
-                                   past=include_past)).get()
+    result = call("tickee.events.entrypoints.event_list", 
+                  kwargs=dict(client_id=None,
+                              account_shortname=None,
+                              active_only=not include_inactive,
+                              public_only=not include_private,
+                              past=include_past,
+                              **paging.bounds(request)))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -43,6 +51,8 @@ def event_list(request, oauth2_context):
 @oauth2(allowed_scopes=[oauth_scopes.INTERNAL,
                         oauth_scopes.ACCOUNT_MGMT],
         optional=True)
+@cached(30, params=['include_inactive', 'include_private', 'include_past',
+                    'include_description'])
 def account_events_list(request, oauth2_context):
     """ Returns a list of the events of the account.
     
@@ -67,12 +77,12 @@ def account_events_list(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
         
-    result = send_task("tickee.events.entrypoints.event_list", 
-                       kwargs=dict(client_id=client_id,
-                                   account_shortname=account_shortname,
-                                   active_only=not include_inactive,
-                                   public_only=not include_private,
-                                   past=include_past)).get()
+    result = call("tickee.events.entrypoints.event_list", 
+                  kwargs=dict(client_id=client_id,
+                              account_shortname=account_shortname,
+                              active_only=not include_inactive,
+                              public_only=not include_private,
+                              past=include_past))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -105,11 +115,11 @@ def event_create(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
         
-    result = send_task("tickee.events.entrypoints.event_create", 
-                       kwargs=dict(client_id=client_id, 
-                                   account_short=account_shortname,
-                                   event_info=event_info,
-                                   eventparts=eventparts or [])).get()
+    result = call("tickee.events.entrypoints.event_create", 
+                  kwargs=dict(client_id=client_id, 
+                              account_short=account_shortname,
+                              event_info=event_info,
+                              eventparts=eventparts or []))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 403
@@ -127,7 +137,8 @@ def event_create(request, oauth2_context):
              renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.INTERNAL])
 def event_delete(request, oauth2_context):
-    """Retrieves detailed information about an organizer."""
+    """Deletes the event. With the async parameter the deletion runs as a job 
+    and a 202 Accepted with the job is returned right away."""
 
     event_id = request.matchdict.get('event_id')
     
@@ -136,9 +147,19 @@ def event_delete(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
     
-    result = send_task("events.delete", 
-                       kwargs=dict(client_id=client_id, 
-                                   event_id=event_id)).get()
+    if jobs.requested(request):
+        matchdict = dict(request.matchdict)
+        job = jobs.submit("events.delete", 
+                          dict(client_id=client_id, 
+                               event_id=event_id),
+                          client_id,
+                          on_done=lambda result: invalidation.invalidate(
+                              '02-event-resource', 'DELETE', matchdict))
+        return jobs.accepted(request, job)
+    
+    result = call("events.delete", 
+                  kwargs=dict(client_id=client_id, 
+                              event_id=event_id))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -154,6 +175,8 @@ def event_delete(request, oauth2_context):
 @oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
                         oauth_scopes.SCANNING,
                         oauth_scopes.INTERNAL])
+@deadline(5)
+@cached(10, params=['include_visitors', 'include_eventparts'])
 def event_details(request, oauth2_context):
     """Retrieves detailed information about an organizer."""
 
@@ -167,11 +190,11 @@ def event_details(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
     
-    result = send_task("tickee.events.entrypoints.event_details", 
-                       kwargs=dict(client_id=client_id, 
-                                   event_id=event_id,
-                                   include_visitors=include_visitors,
-                                   include_eventparts=include_eventparts)).get()
+    result = call("tickee.events.entrypoints.event_details", 
+                  kwargs=dict(client_id=client_id, 
+                              event_id=event_id,
+                              include_visitors=include_visitors,
+                              include_eventparts=include_eventparts))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -199,10 +222,10 @@ def event_update(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
     
-    result = send_task("events.update", 
-                       kwargs=dict(client_id=client_id, 
-                                   event_id=event_id,
-                                   event_info=event_info)).get()
+    result = call("events.update", 
+                  kwargs=dict(client_id=client_id, 
+                              event_id=event_id,
+                              event_info=event_info))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -211,6 +234,101 @@ def event_update(request, oauth2_context):
     
     return result
 
+###############################################################################
+# /events/:id/page
+###############################################################################
+
+@view_config(route_name='02-event-page', request_method='GET', 
+             renderer='json')
+@oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
+                        oauth_scopes.INTERNAL])
+@deadline(5)
+@cached(10, params=['include_private'])
+def event_page(request, oauth2_context):
+    """Retrieves everything needed to show the page of an event at once: the 
+    event, its tickettypes, eventparts and locations and the account 
+    organising it. The entrypoints are called concurrently.
+    
+    The page is cached on its own, next to the caches of the routes of its
+    parts and with its own TTL. It stays fresh because the writes of the 
+    event, its eventparts and tickettypes, the locations and the account 
+    invalidate 02-event-page (see invalidation.DEPENDENCIES); changes made 
+    outside the api show up within 10 seconds.
+    
+    Request::
+    
+        GET /events/{id}/page
+    
+    Parameters:
+        include_private (optional)
+            Private tickettypes will be included
+    
+    Returns::
+    
+        {
+            "event": {...},
+            "tickettypes": [...],
+            "eventparts": [...],
+            "locations": [...],
+            "account": {...}
+        }
+    
+    """
+    event_id = request.matchdict.get('event_id')
+    include_private = request.params.get('include_private') in ['true', 't', '1']
+    
+    if oauth_scopes.INTERNAL in oauth2_context.scopes:
+        client_id = None
+    else:
+        client_id = oauth2_context.client_id
+    
+    deadline = current_deadline()
+    
+    def event_and_account():
+        # the account is only known once the event is
+        event = call("tickee.events.entrypoints.event_details", 
+                     kwargs=dict(client_id=client_id, 
+                                 event_id=event_id,
+                                 include_visitors=False,
+                                 include_eventparts=False),
+                     deadline=deadline)
+        if type(event) is not dict or "error" in event:
+            return event, None
+        account = event.get('account')
+        account_id = account.get('id') if isinstance(account, dict) \
+                     else event.get('account_id')
+        try:
+            account_id = int(account_id)
+        except (TypeError, ValueError):
+            # no account, or not one accounts.details can look up
+            return event, None
+        return event, call("accounts.details", 
+                           kwargs=dict(oauth_client_id=None,
+                                       account_id=account_id),
+                           deadline=deadline)
+    
+    chain = spawn(event_and_account)
+    tickettypes, eventparts, locations = call_many([
+        ("tickettypes.from_event", dict(client_id=client_id,
+                                        event_id=event_id,
+                                        include_private=include_private)),
+        ("eventparts.from_event", dict(client_id=client_id, 
+                                       event_id=event_id)),
+        ("venues.from_event", dict(client_id=None,
+                                   event_id=event_id))])
+    event, account = chain.get()
+    
+    if type(event) is dict and "error" in event:
+        request.response.status_int = 404
+        return event
+    
+    request.response.status_int = 200
+    return dict(event=event,
+                tickettypes=tickettypes,
+                eventparts=eventparts,
+                locations=locations,
+                account=account)
+
 ###############################################################################
 # /events/:id/statistics
 ###############################################################################
@@ -218,19 +336,30 @@ def event_update(request, oauth2_context):
 @view_config(route_name='02-event-statistics', 
              request_method='GET', renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.INTERNAL])
+@deadline(5)
 def event_statistics(request, oauth2_context):
-    """Retrieves detailed information about an organizer."""
-    event_id = request.matchdict.get('event_id')
-    result = send_task("tickee.statistics.entrypoints.event_statistics", 
-                       kwargs=dict(client_id=None, 
-                                   event_id=event_id))
+    """Returns the statistics of the event. The statistics are precomputed 
+    and refreshed in the background after orders and scans (see 
+    :mod:`tickee_api.core.rollups`), polling them does not reach the workers.
     
-    if type(result) is dict and "error" in result:
-        request.response.status_int = 404
-    else:
-        request.response.status_int = 200
+    Request::
+    
+        GET /events/{id}/statistics
     
-    return result.get()
+    Returns::
+    
+        The statistics of the event, when they were computed is told by the 
+        Last-Modified header. A poll with the ETag or Last-Modified of the 
+        statistics the client has is answered with 304 Not Modified while 
+        they are current. An unknown event is answered with 404, statistics 
+        that could not be computed in time with 503 or 504.
+        
+    """
+    event_id = request.matchdict.get('event_id')
+    rollup = rollups.get('event', 
+                         dict(client_id=None, 
+                              event_id=event_id))
+    return rollups.respond(request, rollup)
 
 ###############################################################################
 # /events/:id/eventparts
@@ -248,9 +377,9 @@ def eventpart_lists(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
     
-    result = send_task("eventparts.from_event", 
-                       kwargs=dict(client_id=client_id, 
-                                   event_id=event_id)).get()
+    result = call("eventparts.from_event", 
+                  kwargs=dict(client_id=client_id, 
+                              event_id=event_id))
     
     if type(result) is dict and "error" in result:
             request.response.status_int = 404
@@ -269,10 +398,10 @@ def eventpart_create(request, oauth2_context):
     event_id = request.matchdict.get('event_id')
     eventpart_info = request.deserialized_body
     
-    result = send_task("eventparts.create", 
-                       kwargs=dict(client_id=None, 
-                                   event_id=event_id,
-                                   eventpart_info=eventpart_info)).get()
+    result = call("eventparts.create", 
+                  kwargs=dict(client_id=None, 
+                              event_id=event_id,
+                              eventpart_info=eventpart_info))
     
     if type(result) is dict and "error" in result:
             request.response.status_int = 404
@@ -297,9 +426,9 @@ def eventpart_delete(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
     
-    result = send_task("eventparts.delete",
-                       kwargs=dict(client_id=client_id,
-                                   eventpart_id=eventpart_id)).get()
+    result = call("eventparts.delete",
+                  kwargs=dict(client_id=client_id,
+                              eventpart_id=eventpart_id))
     
     if type(result) is dict and "error" in result:
             request.response.status_int = 404
@@ -322,9 +451,9 @@ def eventpart_details(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
     
-    result = send_task("eventparts.details",
-                       kwargs=dict(client_id=client_id,
-                                   eventpart_id=eventpart_id)).get()
+    result = call("eventparts.details",
+                  kwargs=dict(client_id=client_id,
+                              eventpart_id=eventpart_id))
     
     if type(result) is dict and "error" in result:
             request.response.status_int = 404
@@ -348,10 +477,10 @@ def eventpart_update(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
     
-    result = send_task("eventparts.update",
-                       kwargs=dict(client_id=client_id,
-                                   eventpart_id=eventpart_id,
-                                   eventpart_info=eventpart_info)).get()
+    result = call("eventparts.update",
+                  kwargs=dict(client_id=client_id,
+                              eventpart_id=eventpart_id,
+                              eventpart_info=eventpart_info))
     
     if type(result) is dict and "error" in result:
             request.response.status_int = 404
@@ -0,0 +1,65 @@
+from pyramid.httpexceptions import HTTPBadRequest
+from pyramid.view import view_config
+from pyramid_oauth2.decorator import oauth2
+from tickee_api import oauth_scopes
+from tickee_api.core import jobs
+import gevent
+
+###############################################################################
+# /jobs/:id
+###############################################################################
+
+@view_config(route_name='02-job-resource', request_method='GET',
+             renderer='json')
+@oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
+                        oauth_scopes.SCANNING,
+                        oauth_scopes.INTERNAL])
+def job_details(request, oauth2_context):
+    """Returns the status of a job submitted by the client.
+
+    Request::
+
+        GET /jobs/{id}
+
+    Parameters:
+        wait (optional)
+            Seconds (at most 30) to wait for the job to finish before
+            answering
+
+    Returns::
+
+        {
+            "id": "6f1ed002-ab5d-42d0-a9c1-e4b0f3fc2f2a",
+            "task": "scanning.reset",
+            "status": "done",
+            "progress": null,
+            "result": {"deleted": 9},
+            "created_at": 1325376000,
+            "finished_at": 1325376004
+        }
+
+    The status is either pending, done or failed.
+    """
+    job_id = request.matchdict.get('job_id')
+
+    try:
+        wait = min(float(request.params.get('wait', 0)), 30)
+    except ValueError:
+        raise HTTPBadRequest
+
+    if oauth_scopes.INTERNAL in oauth2_context.scopes:
+        client_id = None
+    else:
+        client_id = oauth2_context.client_id
+
+    job = jobs.get(job_id, client_id)
+    while job is not None and job['status'] == 'pending' and wait > 0:
+        gevent.sleep(min(wait, 0.5))
+        wait -= 0.5
+        job = jobs.get(job_id, client_id)
+
+    if job is None:
+        request.response.status_int = 404
+        return dict(error='job not found')
+
+    return job
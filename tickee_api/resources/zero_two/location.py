@@ -1,8 +1,8 @@
-from celery.execute import send_task
 from pyramid.view import view_config
 from pyramid_oauth2.decorator import oauth2
 from tickee_api import oauth_scopes
 from tickee_api.core import validate_schema
+from tickee_api.core.dispatch import call
 from tickee_api.resources.zero_two import schema
 
 ###############################################################################
@@ -18,8 +18,8 @@ def location_list(request, oauth2_context):
     name = request.params.get('name') 
     
     if name is not None:
-        venue = send_task("venues.search", 
-                         kwargs=dict(name_filter=name)).get()
+        venue = call("venues.search", 
+                    kwargs=dict(name_filter=name))
         return venue
         
     return []
@@ -35,9 +35,9 @@ def event_locations(request, oauth2_context):
     """Retrieves all locations connected to an event"""
     event_id = request.matchdict.get('event_id')
     
-    result = send_task("venues.from_event",
-                       kwargs=dict(client_id=None,
-                                   event_id=event_id)).get()
+    result = call("venues.from_event",
+                  kwargs=dict(client_id=None,
+                              event_id=event_id))
     
     if isinstance(result, dict) and "error" in result:
         request.response.status_int = 404 
@@ -57,9 +57,9 @@ def account_locations(request, oauth2_context):
     """Retrieves detailed information about an organizer."""
     account_name = request.matchdict.get('account_id')
     
-    result = send_task("venues.from_account",
-                       kwargs=dict(client_id=None,
-                                   account_name=account_name)).get()
+    result = call("venues.from_account",
+                  kwargs=dict(client_id=None,
+                              account_name=account_name))
     
     if isinstance(result, dict) and "error" in result:
         request.response.status_int = 403 # forbidden
@@ -78,11 +78,11 @@ def location_create(request, oauth2_context):
     address_info = location_info.get('address')
     account_name = request.matchdict.get('account_id')
     
-    result = send_task("venues.create",
-                       kwargs=dict(client_id=None,
-                                   location_info=location_info,
-                                   address_info=address_info,
-                                   account_name=account_name)).get()
+    result = call("venues.create",
+                  kwargs=dict(client_id=None,
+                              location_info=location_info,
+                              address_info=address_info,
+                              account_name=account_name))
     
     if isinstance(result, dict) and "error" in result:
         request.response.status_int = 403 # forbidden
@@ -103,8 +103,8 @@ def location_delete(request, oauth2_context):
     # URL Parameters
     location_id = int(request.matchdict.get('location_id'))
 
-    result = send_task("venues.delete", 
-                       kwargs=dict(location_id=location_id)).get()
+    result = call("venues.delete", 
+                  kwargs=dict(location_id=location_id))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -123,9 +123,9 @@ def location_details(request, oauth2_context):
     # URL Parameters
     location_id = int(request.matchdict.get('location_id'))
 
-    result = send_task("venues.details", 
-                       kwargs=dict(location_id=location_id,
-                                   include_address=True)).get()
+    result = call("venues.details", 
+                  kwargs=dict(location_id=location_id,
+                              include_address=True))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -145,11 +145,11 @@ def location_update(request, oauth2_context):
     location_info = request.deserialized_body
     address_info = location_info.get('address')
     
-    result = send_task("venues.update", 
-                       kwargs=dict(client_id=None,
-                                   location_id=location_id,
-                                   location_info=location_info,
-                                   address_info=address_info)).get()
+    result = call("venues.update", 
+                  kwargs=dict(client_id=None,
+                              location_id=location_id,
+                              location_info=location_info,
+                              address_info=address_info))
                                    
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -1,8 +1,10 @@
-from celery.execute import send_task
 from pyramid.view import view_config
 from pyramid_oauth2.decorator import oauth2
 from tickee_api import oauth_scopes
-from tickee_api.core import validate_schema
+from tickee_api.core import deadline, paginated, streamed, validate_schema, validated
+from tickee_api.core import jobs
+from tickee_api.core import paging
+from tickee_api.core.dispatch import call
 from tickee_api.resources.zero_two import schema
 
 ###############################################################################
@@ -12,6 +14,9 @@ from tickee_api.resources.zero_two import schema
 @view_config(route_name='02-event-orders', request_method='GET', 
              renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.INTERNAL])
+@validated()
+@streamed
+@paginated()
 def event_orders(request, oauth2_context):
     """ Returns orders associated with an event  """
     event_id = request.matchdict.get('event_id')
@@ -23,9 +28,10 @@ def event_orders(request, oauth2_context):
         client_id = oauth2_context.client_id 
     
     # call entrypoint
-    result = send_task("orders.from_event", 
-                       kwargs=dict(client_id=client_id,
-                                   event_id=event_id)).get()
+    result = call("orders.from_event", 
+                  kwargs=dict(client_id=client_id,
+                              event_id=event_id,
+                              **paging.bounds(request)))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -39,6 +45,9 @@ def event_orders(request, oauth2_context):
 @view_config(route_name='02-account-orders-collection', request_method='GET', 
              renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.INTERNAL])
+@validated()
+@streamed
+@paginated()
 def account_orders(request, oauth2_context):
     """ Returns orders associated with an event  """
     account_id = request.matchdict.get('account_id')
@@ -50,9 +59,10 @@ def account_orders(request, oauth2_context):
         client_id = oauth2_context.client_id 
     
     # call entrypoint
-    result = send_task("orders.from_account", 
-                       kwargs=dict(client_id=client_id,
-                                   account_id=account_id)).get()
+    result = call("orders.from_account", 
+                  kwargs=dict(client_id=client_id,
+                              account_id=account_id,
+                              **paging.bounds(request)))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -101,10 +111,10 @@ def user_orders(request, oauth2_context):
         client_id = oauth2_context.client_id 
     
     # call entrypoint
-    result = send_task("orders.from_user", 
-                       kwargs=dict(client_id=client_id,
-                                   user_id=user_id,
-                                   include_failed=include_private)).get()
+    result = call("orders.from_user", 
+                  kwargs=dict(client_id=client_id,
+                              user_id=user_id,
+                              include_failed=include_private))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -121,6 +131,7 @@ def user_orders(request, oauth2_context):
              request_method='POST', renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
                         oauth_scopes.INTERNAL])
+@deadline(8)
 @validate_schema(schema.TicketOrder, required_nodes=["tickettype", "amount"])
 def order_new(request, oauth2_context):
     """ Starts a new order that can be purchased using the client's paymentprovider.
@@ -137,14 +148,14 @@ def order_new(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
     
-    result = send_task("tickee.orders.entrypoints.order_new", 
-                       kwargs=dict(client_id=client_id, 
-                                   account_short=account_short,
-                                   user_id=ticketorder_info.get('user'),
-                                   tickettype_id=ticketorder_info.get('tickettype'),
-                                   amount=ticketorder_info.get('amount'),
-                                   as_guest=as_guest,
-                                   as_paper=as_paper)).get()
+    result = call("tickee.orders.entrypoints.order_new", 
+                  kwargs=dict(client_id=client_id, 
+                              account_short=account_short,
+                              user_id=ticketorder_info.get('user'),
+                              tickettype_id=ticketorder_info.get('tickettype'),
+                              amount=ticketorder_info.get('amount'),
+                              as_guest=as_guest,
+                              as_paper=as_paper))
                                    
     if type(result) is dict and "error" in result:
         request.response.status_int = 403
@@ -172,9 +183,9 @@ def orders_list(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
     
-    result = send_task("orders.list",
-                       kwargs=dict(client_id=client_id,
-                                   order_id=order_id)).get()
+    result = call("orders.list",
+                  kwargs=dict(client_id=client_id,
+                              order_id=order_id))
             
     return result
 
@@ -191,9 +202,9 @@ def order_delete(request, oauth2_context):
     
     order_key = request.matchdict.get('order_key')
     
-    result = send_task("orders.delete", 
-                       kwargs=dict(client_id=oauth2_context.client_id, 
-                                   order_key=order_key)).get()
+    result = call("orders.delete", 
+                  kwargs=dict(client_id=oauth2_context.client_id, 
+                              order_key=order_key))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -206,14 +217,15 @@ def order_delete(request, oauth2_context):
              request_method='GET', renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
                         oauth_scopes.INTERNAL])
+@deadline(5)
 def order_details(request, oauth2_context):
     """ Returns all information about an order. """
     
     order_key = request.matchdict.get('order_key')
     
-    result = send_task("tickee.orders.entrypoints.order_details", 
-                       kwargs=dict(client_id=oauth2_context.client_id, 
-                                   order_key=order_key)).get()
+    result = call("tickee.orders.entrypoints.order_details", 
+                  kwargs=dict(client_id=oauth2_context.client_id, 
+                              order_key=order_key))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -225,23 +237,24 @@ def order_details(request, oauth2_context):
              request_method='PUT', renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
                         oauth_scopes.INTERNAL])
+@deadline(8)
 @validate_schema(schema.TicketOrder, required_nodes=["tickettype", "amount"])
 def order_add(request, oauth2_context):
     
     order_key = request.matchdict.get('order_key')
-    ticketorder_info = request.json_body
+    ticketorder_info = request.deserialized_body
     
     if oauth_scopes.INTERNAL in oauth2_context.scopes:
         client_id = None
     else:
         client_id = oauth2_context.client_id
         
-    result = send_task("tickee.orders.entrypoints.order_add", 
-                       kwargs=dict(client_id=client_id,
-                                   order_key=order_key,
-                                   tickettype_id=ticketorder_info.get('tickettype'),
-                                   amount=ticketorder_info.get('amount'),
-                                   meta=ticketorder_info)).get()
+    result = call("tickee.orders.entrypoints.order_add", 
+                  kwargs=dict(client_id=client_id,
+                              order_key=order_key,
+                              tickettype_id=ticketorder_info.get('tickettype'),
+                              amount=ticketorder_info.get('amount'),
+                              meta=ticketorder_info))
                                    
     if type(result) is dict and "error" in result:
         request.response.status_int = 403
@@ -254,12 +267,13 @@ def order_add(request, oauth2_context):
              request_method='POST', renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
                         oauth_scopes.INTERNAL])
+@deadline(15)
 @validate_schema(schema.OrderAction)
 def order_action(request, oauth2_context):
     """ Returns all information about an order. """
     
     order_key = request.matchdict.get('order_key')
-    actions = request.json_body
+    actions = request.deserialized_body
 
     if oauth_scopes.INTERNAL in oauth2_context.scopes:
         client_id = None
@@ -269,15 +283,18 @@ def order_action(request, oauth2_context):
     if actions.get('checkout'):
         user_id = actions.get('user')
         redirect_url = actions.get('redirect_url')
-        result = send_task("orders.checkout", 
-                           kwargs=dict(client_id=client_id,
-                                       order_key=order_key,
-                                       user_id=user_id,
-                                       redirect_url=redirect_url)).get() 
+        result = call("orders.checkout", 
+                      kwargs=dict(client_id=client_id,
+                                  order_key=order_key,
+                                  user_id=user_id,
+                                  redirect_url=redirect_url)) 
     elif actions.get('mail'):
-        result = send_task("orders.resend", 
-                           kwargs=dict(client_id=client_id,
-                                       order_key=order_key)).get()
+        # the mail is sent by a job, answered with 202 Accepted
+        job = jobs.submit("orders.resend", 
+                          dict(client_id=client_id,
+                               order_key=order_key),
+                          client_id)
+        result = jobs.accepted(request, job)
                                        
     else:
         request.response.status_int = 400
@@ -296,14 +313,15 @@ def order_action(request, oauth2_context):
              request_method='GET', renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
                         oauth_scopes.INTERNAL])
+@deadline(5)
 def order_started_details(request, oauth2_context):
     """ Returns all information about an order. """
     
     order_key = request.matchdict.get('order_key')
     
-    result = send_task("orders.started.details", 
-                       kwargs=dict(client_id=oauth2_context.client_id, 
-                                   order_key=order_key)).get()
+    result = call("orders.started.details", 
+                  kwargs=dict(client_id=oauth2_context.client_id, 
+                              order_key=order_key))
     
     if "error" in result:
         request.response.status_int = 404
@@ -1,8 +1,9 @@
-from celery.execute import send_task
 from pyramid.view import view_config
 from pyramid_oauth2.decorator import oauth2
 from tickee_api import oauth_scopes
 from tickee_api.core import validate_schema
+from tickee_api.core.dispatch import call
+from tickee_api.resources import psp
 from tickee_api.resources.zero_two import schema
 
 ###############################################################################
@@ -21,9 +22,9 @@ def psp_details(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
         
-    result = send_task("psp.details", 
-                       kwargs=dict(client_id=client_id,
-                                   account_shortname=account_shortname)).get()
+    result = call("psp.details", 
+                  kwargs=dict(client_id=client_id,
+                              account_shortname=account_shortname))
                                    
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -51,11 +52,11 @@ def psp_update(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
         
-    result = send_task("psp.update", 
-                       kwargs=dict(client_id=client_id,
-                                   account_shortname=account_shortname,
-                                   psp_name=psp_name,
-                                   psp_data=psp_data)).get()
+    result = call("psp.update", 
+                  kwargs=dict(client_id=client_id,
+                              account_shortname=account_shortname,
+                              psp_name=psp_name,
+                              psp_data=psp_data))
                                    
     if type(result) is dict and "error" in result:
         request.response.status_int = 403
@@ -85,16 +86,11 @@ def psp_notify(request):
     Returns:
         Each payment service provider requires a different response.
         The creation of the response information is handled by the provider class 
-        of the payment service provider. 
+        of the payment service provider. Notifications are journaled first, 
+        see tickee_api.resources.psp.
         
     """
     # URL Parameters
     psp_id = int(request.matchdict.get('psp_id'))
     
-    context = dict(message = request.body,
-                   params = request.params.dict_of_lists())
-    
-    result = send_task("tickee.paymentproviders.entrypoints.notification", 
-                       kwargs=dict(psp_id=psp_id,
-                                   context=context))
-    return result.get()
\ No newline at end of file
+    return psp.ingest(request, psp_id)
\ No newline at end of file
@@ -32,9 +32,13 @@ def v_0_2_routing(config):
     # Event
     config.add_route('02-event-list',                   '/0.2/events')
     config.add_route('02-event-resource',               '/0.2/events/{event_id:\d+}')
+    config.add_route('02-event-page',                   '/0.2/events/{event_id:\d+}/page')
     config.add_route('02-event-tickettypes',            '/0.2/events/{event_id:\d+}/tickettypes')
     config.add_route('02-event-parts',                  '/0.2/events/{event_id:\d+}/eventparts')
     config.add_route('02-event-tickets',                '/0.2/events/{event_id:\d+}/tickets')
+    config.add_route('02-event-tickets-sync',           '/0.2/events/{event_id:\d+}/tickets/sync')
+    config.add_route('02-event-tickets-bundle',         '/0.2/events/{event_id:\d+}/tickets/bundle')
+    config.add_route('02-event-scans-stream',           '/0.2/events/{event_id:\d+}/scans/stream')
     config.add_route('02-event-orders',                 '/0.2/events/{event_id:\d+}/orders')
     config.add_route('02-event-statistics',             '/0.2/events/{event_id:\d+}/statistics')
     config.add_route('02-event-visitors',               '/0.2/events/{event_id:\d+}/visitors')
@@ -52,4 +56,9 @@ def v_0_2_routing(config):
     config.add_route('02-ticket-scans',                 '/0.2/tickets/{ticket_code:[0-9A-Fa-f]+}/scans')
     config.add_route('02-ticket-mail',                  '/0.2/tickets/{ticket_code:[0-9A-Fa-f]+}/mail')
     config.add_route('02-ticket-reset-scans',           '/0.2/tickets/resetscans')
+    config.add_route('02-ticket-batch-scans',           '/0.2/tickets/scans')
+    # Batch
+    config.add_route('02-batch',                        '/0.2/batch')
+    # Jobs
+    config.add_route('02-job-resource',                 '/0.2/jobs/{job_id}')
     return config
\ No newline at end of file
@@ -55,6 +55,18 @@ class PaymentProvider(colander.MappingSchema):
 
 class TicketScan(colander.MappingSchema):
     timestamp = colander.SchemaNode(colander.Integer())
+
+class BatchedScan(colander.MappingSchema):
+    ticket_code = colander.SchemaNode(colander.String(),
+                                      validator=colander.Regex('^[0-9A-Fa-f]+$'))
+    timestamp = colander.SchemaNode(colander.Integer(),
+                                    missing=None)
+
+class BatchedScans(colander.SequenceSchema):
+    scan = BatchedScan()
+
+class TicketScanBatch(colander.MappingSchema):
+    scans = BatchedScans(validator=colander.Length(1, 1000))
     
 
 # -- Ticket schema ------------------------------------------------------------
@@ -211,4 +223,28 @@ class Address(colander.MappingSchema):
 class Location(colander.MappingSchema):
     name = colander.SchemaNode(colander.String(),
                                missing=deferred_missing)
-    address = Address(missing=deferred_missing)
\ No newline at end of file
+    address = Address(missing=deferred_missing)
+
+# -- Batch schema -------------------------------------------------------------
+
+def validate_batch_path(node, value):
+    """ Checks if the path is an api resource that can be batched """
+    if re.search('^/0\.[12]/', value) is None:
+        raise colander.Invalid(node, 'only api resources can be batched', value)
+    if re.search('^/0\.2/batch|/stream(\?|$)', value) is not None:
+        raise colander.Invalid(node, 'resource can not be batched', value)
+
+class SubRequest(colander.MappingSchema):
+    method = colander.SchemaNode(colander.String(),
+                                 validator=colander.OneOf(['GET', 'POST', 'PUT', 'DELETE']),
+                                 missing='GET')
+    path = colander.SchemaNode(colander.String(),
+                               validator=validate_batch_path)
+    body = colander.SchemaNode(colander.Mapping(unknown='preserve'),
+                               missing=None)
+
+class SubRequests(colander.SequenceSchema):
+    subrequest = SubRequest()
+
+class Batch(colander.MappingSchema):
+    requests = SubRequests(validator=colander.Length(1, 30))
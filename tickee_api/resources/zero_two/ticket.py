@@ -1,10 +1,19 @@
-from celery.execute import send_task
-from pyramid.httpexceptions import HTTPBadRequest, HTTPAccepted
+from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.view import view_config
 from pyramid_oauth2.decorator import oauth2
 from tickee_api import oauth_scopes
-from tickee_api.core import return_fields, validate_schema
+from tickee_api.core import deadline, filter_dict, paginated, projection, requested_fields, return_fields, streamed, validate_schema, validated
+from tickee_api.core import bundles
+from tickee_api.core import cache
+from tickee_api.core import jobs
+from tickee_api.core import ledger
+from tickee_api.core import paging
+from tickee_api.core import push
+from tickee_api.core import rollups
+from tickee_api.core import sync
+from tickee_api.core.dispatch import DeadlineExceeded, call, call_many
 from tickee_api.resources.zero_two import schema
+import logging
 
 
 ###############################################################################
@@ -16,6 +25,9 @@ from tickee_api.resources.zero_two import schema
 @oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
                         oauth_scopes.SCANNING,
                         oauth_scopes.INTERNAL])
+@validated(30)
+@deadline(5)
+@streamed
 @return_fields(default_fields=["user", "created_at", "checked_in"], 
                mandatory_fields=["id"])
 def event_tickets(request, oauth2_context):
@@ -61,18 +73,250 @@ def event_tickets(request, oauth2_context):
     else:
         client_id = oauth2_context.client_id
     
-    result = send_task("tickets.from_event", 
-                       kwargs=dict(client_id=client_id, 
-                                   event_id=event_id,
-                                   since=since,
-                                   ttype=ttype)).get()
+    result = call("tickets.from_event", 
+                  kwargs=dict(client_id=client_id, 
+                              event_id=event_id,
+                              since=since,
+                              ttype=ttype,
+                              **projection(request)))
     
     if isinstance(result, dict) and "error" in result:
         request.response.status_int = 404                     
     
     return result
 
+
+###############################################################################
+# /events/:id/tickets/sync
+###############################################################################
+
+@view_config(route_name='02-event-tickets-sync', 
+             request_method='GET', renderer='json')
+@oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
+                        oauth_scopes.SCANNING,
+                        oauth_scopes.INTERNAL])
+@deadline(5)
+def event_tickets_sync(request, oauth2_context):
+    """Incrementally synchronises the tickets of an event. Only the tickets
+    that were added, changed or removed since the state the cursor refers to
+    are returned, together with the cursor of the current state.
+    
+    Request::
+    
+        GET /events/{id}/tickets/sync
+    
+    Parameters:
+        cursor (optional)
+            Cursor received from the previous synchronisation
+        ttype (optional)
+            Restricts the output to only tickets for a tickettype
+        fields (optional)
+            Fields of the tickets to include, as for /events/{id}/tickets
+    
+    Returns::
+    
+        {
+            "cursor": "2c1743a391305fbf367df8e4f069f9f9",
+            "full": false,
+            "added": [...],
+            "changed": [...],
+            "removed": ["000000003", ...]
+        }
+    
+    When the cursor is unknown or too old, full is true and all tickets are 
+    listed as added.
+    """
+    event_id = request.matchdict.get('event_id')
+    cursor = request.params.get('cursor')
+    
+    ttype = request.params.get('ttype')
+    try:
+        if ttype is not None: 
+            ttype = int(ttype)
+    except:
+        raise HTTPBadRequest
+    
+    if oauth_scopes.INTERNAL in oauth2_context.scopes:
+        client_id = None
+    else:
+        client_id = oauth2_context.client_id
+    
+    fields = requested_fields(request, 
+                              default_fields=["user", "created_at", "checked_in"], 
+                              mandatory_fields=["id"])
+    
+    def fetch():
+        result = call("tickets.from_event", 
+                      kwargs=dict(client_id=client_id, 
+                                  event_id=event_id,
+                                  since=None,
+                                  ttype=ttype,
+                                  **projection(request, fields)))
+        if isinstance(result, dict) and "error" in result:
+            return result
+        return map(lambda d: filter_dict(d, fields), result)
+    
+    scope = repr((event_id, client_id, ttype, sorted(fields)))
+    # the tickets change with the writes invalidating the ticket list
+    scopes = cache.resource_scopes('02-event-tickets', dict(event_id=event_id))
+    result = sync.changes(scope, cursor, fetch, scopes)
+    if "error" in result:
+        request.response.status_int = 404
+    return result
+
    
+###############################################################################
+# /events/:id/tickets/bundle
+###############################################################################
+
+@view_config(route_name='02-event-tickets-bundle', 
+             request_method='GET', renderer='json')
+@oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
+                        oauth_scopes.SCANNING,
+                        oauth_scopes.INTERNAL])
+@deadline(10)
+def event_tickets_bundle(request, oauth2_context):
+    """Exports a signed bundle of the hashed codes of all tickets of the event,
+    allowing scanners to validate tickets while offline. See 
+    tickee_api.core.bundles for the format and how to verify it.
+    
+    Request::
+    
+        GET /events/{id}/tickets/bundle
+    
+    Parameters:
+        version (optional)
+            Version of the bundle the scanner has, only the changes since are 
+            returned
+        ttype (optional)
+            Restricts the bundle to only tickets for a tickettype
+    
+    Returns::
+    
+        {
+            "event_id": 1,
+            "version": "2c1743a391305fbf367df8e4f069f9f9",
+            "base": null,
+            "salt": "5f3a0bd1",
+            "added": ["00a3f1c29b4e7d10", ...],
+            "removed": [],
+            "signature": "..."
+        }
+    
+    When base is null the bundle is complete, otherwise it holds the changes 
+    to the bundle with that version.
+    """
+    event_id = request.matchdict.get('event_id')
+    version = request.params.get('version')
+    
+    if bundles.key is None:
+        request.response.status_int = 404
+        return dict(error='scan bundles are not enabled')
+    
+    ttype = request.params.get('ttype')
+    try:
+        if ttype is not None: 
+            ttype = int(ttype)
+    except:
+        raise HTTPBadRequest
+    
+    if oauth_scopes.INTERNAL in oauth2_context.scopes:
+        client_id = None
+    else:
+        client_id = oauth2_context.client_id
+    
+    salt = bundles.salt(event_id)
+    
+    def fetch():
+        result = call("tickets.from_event", 
+                      kwargs=dict(client_id=client_id, 
+                                  event_id=event_id,
+                                  since=None,
+                                  ttype=ttype))
+        if isinstance(result, dict) and "error" in result:
+            return result
+        return [dict(id=bundles.hash_code(salt, ticket['id'])) for ticket in result]
+    
+    scope = repr(('bundle', event_id, client_id, ttype))
+    # only orders and deleted tickets change the valid codes, not the scans
+    scopes = cache.resource_scopes('02-event-tickets-bundle', dict(event_id=event_id))
+    changes = sync.changes(scope, version, fetch, scopes)
+    if "error" in changes:
+        request.response.status_int = 404
+        return changes
+    
+    header = dict(event_id=int(event_id),
+                  version=changes['cursor'],
+                  base=None if changes['full'] else version,
+                  salt=salt)
+    response = request.response
+    response.content_type = 'application/json'
+    response.app_iter = bundles.stream(header,
+                                       sorted(h['id'] for h in changes['added']),
+                                       sorted(changes['removed']))
+    response.content_length = None
+    return response
+
+
+###############################################################################
+# /events/:id/scans/stream
+###############################################################################
+
+@view_config(route_name='02-event-scans-stream', 
+             request_method='GET', renderer='json')
+@oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
+                        oauth_scopes.SCANNING,
+                        oauth_scopes.INTERNAL])
+def event_scans_stream(request, oauth2_context):
+    """Streams the scans and scan resets of the event as Server-Sent Events,
+    as they happen at any of the gates. Scans are only pushed for scanners 
+    passing the event_id parameter when scanning.
+    
+    Request::
+    
+        GET /events/{id}/scans/stream
+    
+    Parameters:
+        last_event_id (optional)
+            Id of the last message received, the Last-Event-ID header is 
+            used as well. Messages missed since are sent first.
+    
+    Returns::
+    
+        id: 1325376000000000
+        event: scan
+        data: {"ticket_code": "1a2b3c", "scanned_at": 1325376000}
+        
+        id: 1325376060000000
+        event: reset
+        data: {"eventpart_id": null, "tickettype_id": null}
+    
+    A resync message is sent when missed messages are no longer available,
+    the scanner should synchronise its tickets with /events/{id}/tickets/sync.
+    """
+    event_id = request.matchdict.get('event_id')
+    
+    last_id = request.headers.get('Last-Event-ID') \
+              or request.params.get('last_event_id')
+    try:
+        if last_id is not None:
+            last_id = int(last_id)
+    except:
+        raise HTTPBadRequest
+    
+    if push.hub is None:
+        request.response.status_int = 404
+        return dict(error='scan streams are not enabled')
+    
+    response = request.response
+    response.content_type = 'text/event-stream'
+    response.cache_control = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.app_iter = push.stream(event_id, last_id)
+    response.content_length = None
+    return response
+
+
 ###############################################################################
 # /users/:id/tickets
 ###############################################################################
@@ -81,6 +325,7 @@ def event_tickets(request, oauth2_context):
              renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.INTERNAL,
                         oauth_scopes.ACCOUNT_MGMT])
+@paginated()
 def user_tickets(request, oauth2_context):
     """ Lists all tickets of a user.
     
@@ -113,9 +358,10 @@ def user_tickets(request, oauth2_context):
         oauth2_context.client_id = None 
     
     # call entrypoint
-    result = send_task("tickets.from_user", 
-                       kwargs=dict(client_id=oauth2_context.client_id,
-                                   user_id=user_id)).get()
+    result = call("tickets.from_user", 
+                  kwargs=dict(client_id=oauth2_context.client_id,
+                              user_id=user_id,
+                              **paging.bounds(request)))
     
     if isinstance(result, dict) and "error" in result:
         request.response.status_int = 404                                 
@@ -146,18 +392,20 @@ def ticket_mail(request, oauth2_context):
         
     Returns::
         
-        200 OK
+        202 ACCEPTED
         
-        true or false depending on whether the mail was sent correctly.
+        The job sending the mail, its result on /jobs/{id} is true or false 
+        depending on whether the mail was sent correctly.
         
     """
     # URL Parameters
     ticket_code = request.matchdict.get('ticket_code')
     
-    result = send_task("tickets.resend", 
-                       kwargs=dict(client_id=oauth2_context.client_id,
-                                   ticket_code=ticket_code)).get()
-    return result
+    job = jobs.submit("tickets.resend", 
+                      dict(client_id=oauth2_context.client_id,
+                           ticket_code=ticket_code),
+                      oauth2_context.client_id)
+    return jobs.accepted(request, job)
 
 
 
@@ -173,9 +421,9 @@ def ticket_delete(request, oauth2_context):
     else:
         client_id =  oauth2_context.client_id
     
-    result = send_task("tickets.delete", 
-                       kwargs=dict(client_id=client_id,
-                                   ticket_code=ticket_code)).get()
+    result = call("tickets.delete", 
+                  kwargs=dict(client_id=client_id,
+                              ticket_code=ticket_code))
                                    
     if isinstance(result, dict) and "error" in result:
         request.response.status_int = 404
@@ -189,6 +437,7 @@ def ticket_delete(request, oauth2_context):
 @oauth2(allowed_scopes=[oauth_scopes.INTERNAL,
                         oauth_scopes.SCANNING,
                         oauth_scopes.ACCOUNT_MGMT])
+@deadline(2)
 def ticket_details(request, oauth2_context):
     """Returns details of an event."""
     ticket_code = request.matchdict.get('ticket_code')  
@@ -198,9 +447,9 @@ def ticket_details(request, oauth2_context):
     else:
         client_id =  oauth2_context.client_id
     
-    result = send_task("tickee.tickets.entrypoints.ticket_details", 
-                       kwargs=dict(client_id=client_id,
-                                   ticket_code=ticket_code)).get()
+    result = call("tickee.tickets.entrypoints.ticket_details", 
+                  kwargs=dict(client_id=client_id,
+                              ticket_code=ticket_code))
                                    
     if isinstance(result, dict) and "error" in result:
         request.response.status_int = 404
@@ -217,9 +466,9 @@ def ticket_update(request, oauth2_context):
     ticket_code = request.matchdict.get('ticket_code')  
     ticket_info = request.deserialized_body
     
-    result = send_task("tickets.update", 
-                       kwargs=dict(ticket_info=ticket_info,
-                                   ticket_code=ticket_code)).get()
+    result = call("tickets.update", 
+                  kwargs=dict(ticket_info=ticket_info,
+                              ticket_code=ticket_code))
                                    
     if isinstance(result, dict) and "error" in result:
         request.response.status_int = 404
@@ -233,6 +482,7 @@ def ticket_update(request, oauth2_context):
 @oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
                         oauth_scopes.SCANNING,
                         oauth_scopes.INTERNAL])
+@deadline(2)
 @return_fields(default_fields=['scanned_at'])
 def ticket_scans(request, oauth2_context):
     """Returns a list of scans on a ticket. """
@@ -243,9 +493,10 @@ def ticket_scans(request, oauth2_context):
     else:
         client_id =  oauth2_context.client_id
     
-    result = send_task("scanning.from_ticket", 
-                       kwargs=dict(client_id=client_id,
-                                   ticket_code=ticket_code)).get()
+    result = call("scanning.from_ticket", 
+                  kwargs=dict(client_id=client_id,
+                              ticket_code=ticket_code,
+                              **projection(request)))
     
     if isinstance(result, dict) and "error" in result:
         request.response.status_int = 404
@@ -260,6 +511,7 @@ def ticket_scans(request, oauth2_context):
 @oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
                         oauth_scopes.SCANNING,
                         oauth_scopes.INTERNAL])
+@deadline(2)
 def ticket_scan(request, oauth2_context):
     """Scans in a ticket and receives diff updates from the server
     based on the list_* parameters it received."""
@@ -274,20 +526,151 @@ def ticket_scan(request, oauth2_context):
     else:
         client_id =  oauth2_context.client_id
     
-    result = send_task("scanning.scan", 
-                       kwargs=dict(client_id=client_id,
-                                   ticket_code=ticket_code,
-                                   scan_timestamp=timestamp)).get()
-                                   
+    event_id = request.params.get('event_id')
+    
+    # repeated scans are refused without asking the workers
+    claim = ledger.claim(client_id, event_id, ticket_code)
+    if claim is None:
+        request.response.status_int = 403
+        return ledger.duplicate(ticket_code)
+    
+    try:
+        result = call("scanning.scan", 
+                      kwargs=dict(client_id=client_id,
+                                  ticket_code=ticket_code,
+                                  scan_timestamp=timestamp))
+    except Exception:
+        ledger.release(claim)
+        raise
+    ledger.settle(claim, result, client_id, event_id)
+    
+    request.response.status_int = scan_status(result)
+    if request.response.status_int == 201:
+        push.publish(event_id, 'scan',
+                     dict(ticket_code=ticket_code, scanned_at=timestamp))
+    return result
+
+
+def scan_status(result):
+    """Returns the status code of a scan result. Tickets that were already
+    scanned (error 701) are refused with a 403."""
     if isinstance(result, dict) and "error" in result:
         if result.get('error_number') == 701:
-            request.response.status_int = 403
-        else:
-            request.response.status_int = 404
+            return 403
+        return 404
+    return 201
+
+
+def failed_status(exc):
+    """Returns the status code of a scan whose entrypoint call failed, as
+    tickee_api.resources.errors would answer a single scan."""
+    logging.warning("scan failed: %r", exc)
+    if isinstance(exc, DeadlineExceeded) and exc.published:
+        return 504
+    return 503
+
+
+@view_config(route_name='02-ticket-batch-scans', 
+             request_method='POST', renderer='json')
+@oauth2(allowed_scopes=[oauth_scopes.ACCOUNT_MGMT,
+                        oauth_scopes.SCANNING,
+                        oauth_scopes.INTERNAL])
+@deadline(10)
+@validate_schema(schema.TicketScanBatch)
+def ticket_batch_scan(request, oauth2_context):
+    """Scans in a batch of tickets at once, e.g. the scans a gate collected
+    while it was offline. Scans of different tickets are processed
+    concurrently, repeated scans of the same ticket in the order given.
+    
+    Request::
+    
+        POST /tickets/scans
+    
+    Parameters:
+        event_id (optional)
+            Event the scans are made for, they are pushed to its scanners
+        
+        {
+            "scans": [
+                {"ticket_code": "1a2b3c", "timestamp": 1325376000},
+                ...
+            ]
+        }
+    
+    Returns::
+    
+        A list with the outcome of every scan, in the order of the request.
+        The status is that of a single scan: 201 when scanned, 403 when the 
+        ticket was already scanned and 404 when it was not found. Scans the
+        workers did not answer in time have status 504 (503 when they could
+        not be sent), they can be sent again.
+        
+        [
+            {
+                "ticket_code": "1a2b3c",
+                "status": 201,
+                "result": {...}
+            },
+            ...
+        ]
+    
+    """
+    scans = request.deserialized_body['scans']
+    event_id = request.params.get('event_id')
+    
+    if oauth_scopes.INTERNAL in oauth2_context.scopes:
+        client_id = None
     else:
-        request.response.status_int = 201
+        client_id =  oauth2_context.client_id
     
-    return result
+    # every round holds at most one scan per ticket, so a ticket scanned 
+    # twice within the batch is refused the second time
+    rounds = []
+    seen = {}
+    for index, scan in enumerate(scans):
+        code = scan['ticket_code']
+        occurrence = seen[code] = seen.get(code, -1) + 1
+        if occurrence == len(rounds):
+            rounds.append([])
+        rounds[occurrence].append(index)
+    
+    outcomes = [None] * len(scans)
+    for indices in rounds:
+        claimed, claims = [], {}
+        for index in indices:
+            code = scans[index]['ticket_code']
+            claims[index] = ledger.claim(client_id, event_id, code)
+            if claims[index] is not None:
+                claimed.append(index)
+            else:
+                outcomes[index] = dict(ticket_code=code,
+                                       status=403,
+                                       result=ledger.duplicate(code))
+        results = call_many([("scanning.scan", 
+                              dict(client_id=client_id,
+                                   ticket_code=scans[index]['ticket_code'],
+                                   scan_timestamp=scans[index]['timestamp']))
+                             for index in claimed],
+                            return_exceptions=True)
+        for index, result in zip(claimed, results):
+            if isinstance(result, Exception):
+                # only this scan failed, the others went through
+                ledger.release(claims[index])
+                outcomes[index] = dict(ticket_code=scans[index]['ticket_code'],
+                                       status=failed_status(result),
+                                       result=dict(error='service unavailable'))
+                continue
+            ledger.settle(claims[index], result, client_id, event_id)
+            outcomes[index] = dict(ticket_code=scans[index]['ticket_code'],
+                                   status=scan_status(result),
+                                   result=result)
+            if outcomes[index]['status'] == 201:
+                push.publish(event_id, 'scan',
+                             dict(ticket_code=scans[index]['ticket_code'],
+                                  scanned_at=scans[index]['timestamp']))
+    
+    request.response.status_int = 200
+    return outcomes
     
 
 
@@ -310,6 +693,9 @@ def ticket_reset_scans(request, oauth2_context):
             Restricts the reset even further for only a specific eventpart
         tickettype_id (optional)
             Restricts the reset even further for only a specific tickettype
+        async (optional)
+            Runs the reset as a job, a 202 Accepted with the job is returned 
+            and its status can be followed on /jobs/{id}
             
     Returns::
     
@@ -340,14 +726,35 @@ def ticket_reset_scans(request, oauth2_context):
         client_id = None
     else:
         client_id = oauth2_context.client_id
+    
+    def scans_reset(result):
+        # a reset by a job ends after its response invalidated the tickets
+        cache.invalidate('02-event-tickets', dict(event_id=event_id))
+        ledger.reset(event_id)
+        rollups.touch('scans', event_id=event_id)
+        push.publish(event_id, 'reset', 
+                     dict(eventpart_id=eventpart_id,
+                          tickettype_id=tickettype_id))
+    
+    if jobs.requested(request):
+        job = jobs.submit("scanning.reset", 
+                          dict(client_id=client_id,
+                               event_id=event_id, 
+                               eventpart_id=eventpart_id, 
+                               tickettype_id=tickettype_id),
+                          client_id,
+                          on_done=scans_reset)
+        return jobs.accepted(request, job)
         
-    result = send_task("scanning.reset", 
-                       kwargs=dict(client_id=client_id,
-                                   event_id=event_id, 
-                                   eventpart_id=eventpart_id, 
-                                   tickettype_id=tickettype_id)).get()
+    result = call("scanning.reset", 
+                  kwargs=dict(client_id=client_id,
+                              event_id=event_id, 
+                              eventpart_id=eventpart_id, 
+                              tickettype_id=tickettype_id))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
+    else:
+        scans_reset(result)
         
     return result
\ No newline at end of file
@@ -1,9 +1,9 @@
-from celery.execute import send_task
 from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.view import view_config
 from pyramid_oauth2.decorator import oauth2
 from tickee_api import oauth_scopes
-from tickee_api.core import return_fields, validate_schema
+from tickee_api.core import cached, projection, return_fields, validate_schema
+from tickee_api.core.dispatch import call
 from tickee_api.resources.zero_two import schema
 
 ###############################################################################
@@ -13,6 +13,7 @@ from tickee_api.resources.zero_two import schema
 @view_config(route_name='02-parts-tickettypes', request_method='GET', 
              renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.INTERNAL])
+@cached(10, params=['include_private'])
 def eventpart_tickettype_list(request, oauth2_context):
     """Displays a list of tickettypes within an eventpart"""
     eventpart_id = request.matchdict.get('eventpart_id')
@@ -23,10 +24,10 @@ def eventpart_tickettype_list(request, oauth2_context):
     else:
         client_id =  oauth2_context.client_id
     
-    result = send_task("tickettypes.from_eventpart", 
-                       kwargs=dict(client_id=client_id,
-                                   eventpart_id=eventpart_id,
-                                   include_private=include_private)).get()
+    result = call("tickettypes.from_eventpart", 
+                  kwargs=dict(client_id=client_id,
+                              eventpart_id=eventpart_id,
+                              include_private=include_private))
 
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -51,10 +52,10 @@ def eventpart_tickettype_create(request, oauth2_context):
     else:
         client_id =  oauth2_context.client_id
     
-    result = send_task("tickettypes.create", 
-                       kwargs=dict(client_id=client_id, 
-                                   tickettype_info=tickettype_info, 
-                                   eventpart_id=eventpart_id)).get()
+    result = call("tickettypes.create", 
+                  kwargs=dict(client_id=client_id, 
+                              tickettype_info=tickettype_info, 
+                              eventpart_id=eventpart_id))
     
     if type(result) is dict and "error" in result:
         request.response.status_int = 403
@@ -70,6 +71,7 @@ def eventpart_tickettype_create(request, oauth2_context):
              renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.INTERNAL])
 @return_fields(mandatory_fields=['id', 'name', 'price', 'availability', 'active'])
+@cached(10, params=['include_private', 'fields'])
 def event_tickettype_list(request, oauth2_context):
     """Displays a list of tickettypes within an event."""
     event_id = request.matchdict.get('event_id')
@@ -80,10 +82,11 @@ def event_tickettype_list(request, oauth2_context):
     else:
         client_id =  oauth2_context.client_id
     
-    result = send_task("tickettypes.from_event", 
-                       kwargs=dict(client_id=client_id,
-                                   event_id=event_id,
-                                   include_private=include_private)).get()
+    result = call("tickettypes.from_event", 
+                  kwargs=dict(client_id=client_id,
+                              event_id=event_id,
+                              include_private=include_private,
+                              **projection(request)))
 
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -107,10 +110,10 @@ def tickettype_create(request, oauth2_context):
     else:
         client_id =  oauth2_context.client_id
     
-    result = send_task("tickettypes.create", 
-                       kwargs=dict(client_id=client_id, 
-                                   tickettype_info=tickettype_info, 
-                                   event_id=event_id)).get()
+    result = call("tickettypes.create", 
+                  kwargs=dict(client_id=client_id, 
+                              tickettype_info=tickettype_info, 
+                              event_id=event_id))
                                    
     if type(result) is dict and "error" in result:
         request.response.status_int = 403
@@ -134,9 +137,9 @@ def tickettype_delete(request, oauth2_context):
     else:
         client_id =  oauth2_context.client_id
     
-    result = send_task("tickettypes.delete", 
-                       kwargs=dict(client_id=client_id,
-                                   tickettype_id=tickettype_id)).get()
+    result = call("tickettypes.delete", 
+                  kwargs=dict(client_id=client_id,
+                              tickettype_id=tickettype_id))
                        
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -158,8 +161,8 @@ def tickettype_details(request, oauth2_context):
     kwargs['tickettype_id'] = tickettype_id
     kwargs['client_id'] = oauth2_context.client_id
 
-    result = send_task("tickettypes.details", 
-                       kwargs=kwargs).get()
+    result = call("tickettypes.details", 
+                  kwargs=kwargs)
                        
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -186,10 +189,10 @@ def tickettype_update(request, oauth2_context):
     kwargs['tickettype_id'] = tickettype_id
     kwargs['client_id'] = oauth2_context.client_id
 
-    result = send_task("tickettypes.update", 
-                       kwargs=dict(client_id=client_id,
-                                   tickettype_id=tickettype_id,
-                                   tickettype_info=tickettype_info)).get()
+    result = call("tickettypes.update", 
+                  kwargs=dict(client_id=client_id,
+                              tickettype_id=tickettype_id,
+                              tickettype_info=tickettype_info))
                                    
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -1,8 +1,10 @@
-from celery.execute import send_task
 from pyramid.view import view_config
 from pyramid_oauth2.decorator import oauth2
 from tickee_api import oauth_scopes
-from tickee_api.core import validate_schema
+from tickee_api.core import paginated, streamed, validate_schema, validated
+from tickee_api.core import jobs
+from tickee_api.core import paging
+from tickee_api.core.dispatch import call
 import schema
 
 
@@ -10,12 +12,16 @@ import schema
 @view_config(route_name='02-account-visitors', request_method='GET', 
              renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.INTERNAL])
+@validated()
+@streamed
+@paginated()
 def account_visitors(request, oauth2_context):
     """ Returns a list of users who have attended your events """
     account_name = request.matchdict.get('account_id')
     
-    result = send_task("tickets.visitors_of_account", 
-                       kwargs=dict(account_short=account_name)).get()
+    result = call("tickets.visitors_of_account", 
+                  kwargs=dict(account_short=account_name,
+                              **paging.bounds(request)))
         
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -32,8 +38,8 @@ def event_visitors(request, oauth2_context):
     """ Returns a list of users who have attended the event """
     event_id = request.matchdict.get('event_id')
     
-    result = send_task("tickets.visitors_of_event", 
-                       kwargs=dict(event_id=event_id)).get()
+    result = call("tickets.visitors_of_event", 
+                  kwargs=dict(event_id=event_id))
         
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -65,8 +71,8 @@ def user_collection(request, oauth2_context):
     email = request.params.get('email') 
     
     if email is not None:
-        user = send_task("tickee.users.entrypoints.user_exists", 
-                         kwargs=dict(email=email)).get()
+        user = call("tickee.users.entrypoints.user_exists", 
+                    kwargs=dict(email=email))
         if user is not False:
             return [user]
         
@@ -92,14 +98,14 @@ def user_create(request, oauth2_context):
             Specifies the password of the newly created user.
         
     """
-    user_info = request.json_body
-    result = send_task("tickee.users.entrypoints.user_create", 
-                       kwargs=dict(client_id=oauth2_context.client_id,
-                                   email=user_info.get('email'),
-                                   password=user_info.get('password'),
-                                   last_name=user_info.get('last_name'),
-                                   first_name=user_info.get('first_name'),
-                                   user_info=user_info)).get()
+    user_info = request.deserialized_body
+    result = call("tickee.users.entrypoints.user_create", 
+                  kwargs=dict(client_id=oauth2_context.client_id,
+                              email=user_info.get('email'),
+                              password=user_info.get('password'),
+                              last_name=user_info.get('last_name'),
+                              first_name=user_info.get('first_name'),
+                              user_info=user_info))
                                    
     if isinstance(result, dict) and "error" in result:
         request.response.status_int = 403
@@ -121,8 +127,8 @@ def user_delete(request, oauth2_context):
     # URL parameters
     user_id = request.matchdict.get('user_id')
     
-    result = send_task("users.deactivate", 
-                       kwargs=dict(user_id=user_id)).get()
+    result = call("users.deactivate", 
+                  kwargs=dict(user_id=user_id))
                                        
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -143,9 +149,9 @@ def user_details(request, oauth2_context):
     activation_token = request.params.get('token')
     # Parameters
     
-    result = send_task("tickee.users.entrypoints.user_details", 
-                       kwargs=dict(user_id=user_id,
-                                   activation_token=activation_token)).get()
+    result = call("tickee.users.entrypoints.user_details", 
+                  kwargs=dict(user_id=user_id,
+                              activation_token=activation_token))
                                        
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -162,10 +168,10 @@ def user_details(request, oauth2_context):
 def user_update(request, oauth2_context):
     """Updates user information"""
     user_id = int(request.matchdict.get('user_id'))
-    user_info = request.json_body
-    result = send_task("users.update", 
-                       kwargs=dict(user_id=user_id,
-                                   user_info=user_info)).get()
+    user_info = request.deserialized_body
+    result = call("users.update", 
+                  kwargs=dict(user_id=user_id,
+                              user_info=user_info))
                                    
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
@@ -184,9 +190,9 @@ def user_update(request, oauth2_context):
 def user_mail_activation(request, oauth2_context):
     """Sends a mail to activate the user"""
     user_id = int(request.matchdict.get('user_id'))
-    result = send_task("users.update", 
-                       kwargs=dict(user_id=user_id,
-                                   user_info=dict(active=False))).get()
+    result = call("users.update", 
+                  kwargs=dict(user_id=user_id,
+                              user_info=dict(active=False)))
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
     else:
@@ -202,17 +208,14 @@ def user_mail_activation(request, oauth2_context):
              renderer='json')
 @oauth2(allowed_scopes=[oauth_scopes.INTERNAL])
 def user_mail_recovery(request, oauth2_context):
-    """Sends a mail to change password"""
+    """Sends a mail to change password. Returns the job sending the mail with
+    202 Accepted, its status is available on /jobs/{id}."""
     user_id = int(request.matchdict.get('user_id'))
     
-    result = send_task("users.recover_password", 
-                       kwargs=dict(user_id=user_id)).get()
-    
-    if type(result) is dict and "error" in result:
-        request.response.status_int = 404
-    else:
-        request.response.status_int = 200
-    return result
+    job = jobs.submit("users.recover_password", 
+                      dict(user_id=user_id),
+                      oauth2_context.client_id)
+    return jobs.accepted(request, job)
 
 
 ###############################################################################
@@ -228,9 +231,9 @@ def user_validate_password(request, oauth2_context):
     user_id = int(request.matchdict.get('user_id'))
     password = request.matchdict.get('password')
     
-    result = send_task("users.validate_password", 
-                       kwargs=dict(user_id=user_id,
-                                   password=password)).get()
+    result = call("users.validate_password", 
+                  kwargs=dict(user_id=user_id,
+                              password=password))
         
     if type(result) is dict and "error" in result:
         request.response.status_int = 404
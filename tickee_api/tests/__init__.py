@@ -0,0 +1,48 @@
+"""Unit tests of the api. They run without memcached, a broker or workers:
+:class:`TestCase` gives every test a local cache of its own and answers its
+entrypoint calls with :meth:`TestCase.fake_call`."""
+from tickee_api.core import cache, dispatch, journal
+import gevent
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.replace(cache, 'default', cache.TieredCache(cache.LocalCache()))
+        self.replace(dispatch, '_call', self.fake_call)
+        self.addCleanup(dispatch.inflight.clear)
+
+    def replace(self, owner, name, value):
+        """Sets the attribute of the module or object until the test ends."""
+        original = getattr(owner, name)
+        setattr(owner, name, value)
+        self.addCleanup(setattr, owner, name, original)
+
+    def fake_call(self, task_name, kwargs, deadline, **options):
+        """Answers the entrypoint calls made during the test."""
+        return None
+
+    def journal_path(self):
+        """Returns the path of a journal in a directory that is removed once
+        the test ends."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        return os.path.join(directory, 'notifications.db')
+
+    def open_journal(self, path):
+        """Opens the journal at the path. The deliveries it starts are awaited
+        before the test ends, they do not outlive the journal."""
+        notifications = journal.Journal(path)
+        deliveries = []
+        deliver_later = notifications.deliver_later
+        def deliver(row):
+            deliveries.append(deliver_later(row))
+            return deliveries[-1]
+        notifications.deliver_later = deliver
+        self.addCleanup(notifications.db.close)
+        self.addCleanup(gevent.joinall, deliveries)
+        return notifications
@@ -0,0 +1,36 @@
+from tickee_api.core import bundles, cache, sync
+from tickee_api.resources import invalidation
+from tickee_api.tests import TestCase
+
+
+class BundleTests(TestCase):
+
+    def setUp(self):
+        TestCase.setUp(self)
+        self.replace(sync, 'MIN_INTERVAL', 0)
+        self.codes = ['%06x' % i for i in range(50)]
+        self.fetches = 0
+
+    def fetch(self):
+        self.fetches += 1
+        salt = bundles.salt(1)
+        return [dict(id=bundles.hash_code(salt, code)) for code in self.codes]
+
+    def export(self, version=None):
+        scopes = cache.resource_scopes('02-event-tickets-bundle', dict(event_id='1'))
+        return sync.changes('bundle-1', version, self.fetch, scopes)
+
+    def test_scans_do_not_refetch_the_tickets(self):
+        version = self.export()['cursor']
+        invalidation.invalidate('02-ticket-scans', 'POST', dict(ticket_code='000001'))
+        self.assertEqual(self.export(version)['added'], [])
+        self.assertEqual(self.fetches, 1)
+
+    def test_orders_add_their_tickets(self):
+        version = self.export()['cursor']
+        self.codes.append('0000ff')
+        invalidation.invalidate('02-orders-detail', 'PUT', dict(order_key='abc'))
+        changes = self.export(version)
+        self.assertFalse(changes['full'])
+        self.assertEqual(changes['added'],
+                         [dict(id=bundles.hash_code(bundles.salt(1), '0000ff'))])
@@ -0,0 +1,209 @@
+from pyramid.registry import Registry
+from pyramid.request import Request
+from pyramid.threadlocal import manager
+from tickee_api.core import cache, cached, dispatch, validated
+from tickee_api.resources import invalidation
+from tickee_api.tests import TestCase
+import gevent
+import time
+import unittest
+
+
+class Route(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class ReadAfterWriteTests(TestCase):
+    """A read that starts after a write returns the written data, even while a
+    read of the old data is still in flight."""
+
+    def setUp(self):
+        TestCase.setUp(self)
+        self.backend = dict(name='Festival')
+        self.calls = 0
+
+    def fake_call(self, task_name, kwargs, deadline, **options):
+        # the worker reads the event when the call arrives
+        self.calls += 1
+        event = dict(self.backend)
+        gevent.sleep(0.05)
+        return event
+
+    def request(self, route_name='02-event-resource', **matchdict):
+        request = Request.blank('/0.2/events/1')
+        request.matched_route = Route(route_name)
+        request.matchdict = matchdict or dict(event_id='1')
+        request.registry = Registry()
+        return request
+
+    def view(self, cache_responses=True):
+        def event_details(context, request):
+            return dispatch.call("tickee.events.entrypoints.event_details",
+                                 dict(event_id=request.matchdict['event_id']),
+                                 deadline=time.time() + 5)
+        if cache_responses:
+            event_details = cached(60)(event_details)
+        def handle(context, request):
+            manager.push(dict(request=request, registry=request.registry))
+            try:
+                return event_details(context, request)
+            finally:
+                manager.pop()
+        return handle
+
+    def write(self, name, event_id='1'):
+        self.backend['name'] = name
+        invalidation.invalidate('02-event-resource', 'PUT', dict(event_id=event_id))
+
+    def test_read_after_write_does_not_join_an_older_call(self):
+        view = self.view()
+        before = gevent.spawn(view, None, self.request())
+        gevent.sleep(0.01)
+        self.write('Renamed')
+        self.assertEqual(view(None, self.request())['name'], 'Renamed')
+        before.join()
+        self.assertEqual(before.value['name'], 'Festival')
+        self.assertEqual(self.calls, 2)
+
+    def test_older_call_does_not_fill_the_new_generation(self):
+        view = self.view()
+        before = gevent.spawn(view, None, self.request())
+        gevent.sleep(0.01)
+        self.write('Renamed')
+        before.join()
+        self.assertEqual(view(None, self.request())['name'], 'Renamed')
+
+    def test_reads_between_writes_are_still_coalesced(self):
+        view = self.view()
+        greenlets = [gevent.spawn(view, None, self.request()) for _ in range(5)]
+        gevent.joinall(greenlets)
+        self.assertEqual(self.calls, 1)
+
+    def test_writes_to_other_resources_do_not_split_coalescing(self):
+        view = self.view(cache_responses=False)
+        before = gevent.spawn(view, None, self.request())
+        gevent.sleep(0.01)
+        self.write('Other', event_id='2')
+        view(None, self.request())
+        before.join()
+        self.assertEqual(self.calls, 1)
+
+    def test_read_after_write_without_cached_responses(self):
+        view = self.view(cache_responses=False)
+        before = gevent.spawn(view, None, self.request())
+        gevent.sleep(0.01)
+        self.write('Renamed')
+        self.assertEqual(view(None, self.request())['name'], 'Renamed')
+        before.join()
+        self.assertEqual(self.calls, 2)
+
+    def test_write_invalidates_the_dependent_routes(self):
+        key = lambda route_name: cache.response_key(self.request(route_name), None, [])
+        keys = [key('02-event-resource'), key('02-event-page'), key('02-event-list')]
+        self.write('Renamed')
+        self.assertNotEqual(keys[0], key('02-event-resource'))
+        self.assertNotEqual(keys[1], key('02-event-page'))
+        self.assertNotEqual(keys[2], key('02-event-list'))
+
+
+class ValidatedTests(TestCase):
+    """Conditional requests of views that are not cached are answered before
+    the view calls its entrypoints."""
+
+    def setUp(self):
+        TestCase.setUp(self)
+        self.calls = 0
+        self.result = [dict(id=1)]
+
+    def view(self):
+        @validated()
+        def event_tickets(request, oauth2_context):
+            self.calls += 1
+            return list(self.result)
+        return event_tickets
+
+    def request(self, etag=None):
+        request = Request.blank('/0.2/events/1/tickets')
+        if etag is not None:
+            request.headers['If-None-Match'] = '"%s"' % etag
+        request.matched_route = Route('02-event-tickets')
+        request.matchdict = dict(event_id='1')
+        request.registry = Registry()
+        return request
+
+    def test_matching_etag_is_answered_without_the_view(self):
+        view = self.view()
+        request = self.request()
+        view(request=request, oauth2_context=None)
+        response = view(request=self.request(request.response.etag),
+                        oauth2_context=None)
+        self.assertEqual(response.status_int, 304)
+        self.assertEqual(self.calls, 1)
+
+    def test_write_validates_the_result_again(self):
+        view = self.view()
+        request = self.request()
+        view(request=request, oauth2_context=None)
+        invalidation.invalidate('02-ticket-scans', 'POST', dict(ticket_code='ab'))
+        again = self.request(request.response.etag)
+        self.assertEqual(view(request=again, oauth2_context=None), [dict(id=1)])
+        self.assertEqual(again.response.etag, request.response.etag)
+        self.assertEqual(self.calls, 2)
+
+    def test_changed_result_gets_another_etag(self):
+        view = self.view()
+        request = self.request()
+        view(request=request, oauth2_context=None)
+        self.result = [dict(id=1), dict(id=2)]
+        cache.default = cache.TieredCache(cache.LocalCache())
+        again = self.request(request.response.etag)
+        view(request=again, oauth2_context=None)
+        self.assertNotEqual(again.response.etag, request.response.etag)
+
+    def test_scan_at_another_event_keeps_the_etag(self):
+        view = self.view()
+        request = self.request()
+        view(request=request, oauth2_context=None)
+        invalidation.invalidate('02-ticket-scans', 'POST', dict(ticket_code='ab'),
+                                dict(event_id='2'))
+        response = view(request=self.request(request.response.etag),
+                        oauth2_context=None)
+        self.assertEqual(response.status_int, 304)
+        invalidation.invalidate('01-ticket-scan', 'POST', dict(ticket_code='ab'),
+                                dict(list_event_id='1'))
+        again = self.request(request.response.etag)
+        self.assertEqual(view(request=again, oauth2_context=None), [dict(id=1)])
+
+
+class LocalCacheTests(unittest.TestCase):
+
+    def test_bounded_by_bytes(self):
+        local = cache.LocalCache(size=1000, max_bytes=10000)
+        for i in range(10):
+            local.set('key%d' % i, ('x' * 2000, time.time() + 60))
+        self.assertTrue(local.bytes <= 10000)
+        self.assertEqual(local.get('key0'), None)
+        self.assertNotEqual(local.get('key9'), None)
+
+    def test_entries_over_the_bound_are_not_stored(self):
+        local = cache.LocalCache(size=1000, max_bytes=1000)
+        local.set('key', ('x' * 2000, time.time() + 60))
+        self.assertEqual(local.get('key'), None)
+        self.assertEqual(local.bytes, 0)
+
+
+class ConfigureTests(TestCase):
+
+    def test_local_tier_without_memcached(self):
+        configured = cache.configure({})
+        self.assertEqual(configured.shared, None)
+        self.assertTrue(configured.authority is configured.local)
+
+    def test_invalidation_reaches_every_process(self):
+        shared = cache.LocalCache()
+        processes = [cache.TieredCache(cache.LocalCache(), shared) for _ in range(2)]
+        before = processes[1].generations(['02-event-resource'])
+        processes[0].invalidate('02-event-resource')
+        self.assertNotEqual(before, processes[1].generations(['02-event-resource']))
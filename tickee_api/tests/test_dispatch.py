@@ -0,0 +1,88 @@
+from tickee_api.core import dispatch
+from tickee_api.tests import TestCase
+import gevent
+import time
+
+
+class CoalescingTests(TestCase):
+
+    def setUp(self):
+        TestCase.setUp(self)
+        self.calls = []
+
+    def fake_call(self, task_name, kwargs, deadline, **options):
+        self.calls.append((task_name, kwargs))
+        gevent.sleep(0.05)
+        if kwargs.get('fail'):
+            raise ValueError('entrypoint failed')
+        return dict(name='Festival', tickettypes=[dict(id=1)])
+
+    def call_concurrently(self, count, task_name, kwargs):
+        deadline = time.time() + 5
+        greenlets = [gevent.spawn(dispatch.call, task_name, kwargs, deadline)
+                     for _ in range(count)]
+        gevent.joinall(greenlets)
+        return greenlets
+
+    def test_identical_calls_share_one_round_trip(self):
+        greenlets = self.call_concurrently(10, "accounts.details", dict(account_id=1))
+        self.assertEqual(len(self.calls), 1)
+        self.assertTrue(all(g.successful() for g in greenlets))
+        self.assertTrue(all(g.value == greenlets[0].value for g in greenlets))
+
+    def test_every_caller_gets_a_result_of_its_own(self):
+        greenlets = self.call_concurrently(5, "accounts.details", dict(account_id=1))
+        results = [g.value for g in greenlets]
+        self.assertEqual(len(set(map(id, results))), 5)
+        results[0]['tickettypes'].append(dict(id=2))
+        self.assertEqual(results[1]['tickettypes'], [dict(id=1)])
+
+    def test_different_kwargs_are_not_coalesced(self):
+        deadline = time.time() + 5
+        greenlets = [gevent.spawn(dispatch.call, "accounts.details",
+                                  dict(account_id=i), deadline)
+                     for i in range(3)]
+        gevent.joinall(greenlets)
+        self.assertEqual(len(self.calls), 3)
+
+    def test_tasks_not_listed_are_not_coalesced(self):
+        self.call_concurrently(3, "scanning.scan", dict(ticket_code='1'))
+        self.assertEqual(len(self.calls), 3)
+
+    def test_failure_reaches_every_caller(self):
+        greenlets = self.call_concurrently(3, "accounts.details", dict(fail=True))
+        self.assertEqual(len(self.calls), 1)
+        self.assertTrue(all(isinstance(g.exception, ValueError) for g in greenlets))
+
+    def test_calls_after_completion_are_performed_again(self):
+        self.call_concurrently(2, "accounts.details", dict(account_id=1))
+        self.call_concurrently(2, "accounts.details", dict(account_id=1))
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(dispatch.inflight, {})
+
+
+class CallManyTests(TestCase):
+
+    def fake_call(self, task_name, kwargs, deadline, **options):
+        gevent.sleep(0.01)
+        if kwargs['ticket_code'] == 'bad':
+            raise dispatch.DeadlineExceeded(task_name, published=True)
+        return dict(ticket_code=kwargs['ticket_code'])
+
+    def calls(self, *codes):
+        return [("scanning.scan", dict(ticket_code=code)) for code in codes]
+
+    def test_results_in_order(self):
+        self.assertEqual(dispatch.call_many(self.calls('a', 'b')),
+                         [dict(ticket_code='a'), dict(ticket_code='b')])
+
+    def test_failed_call_is_raised(self):
+        self.assertRaises(dispatch.DeadlineExceeded, dispatch.call_many,
+                          self.calls('a', 'bad'))
+
+    def test_failed_call_is_returned_in_place(self):
+        results = dispatch.call_many(self.calls('a', 'bad', 'c'),
+                                     return_exceptions=True)
+        self.assertEqual(results[0], dict(ticket_code='a'))
+        self.assertTrue(isinstance(results[1], dispatch.DeadlineExceeded))
+        self.assertEqual(results[2], dict(ticket_code='c'))
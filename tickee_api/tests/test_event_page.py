@@ -0,0 +1,54 @@
+from pyramid.registry import Registry
+from pyramid.request import Request
+from pyramid.threadlocal import manager
+from tickee_api import oauth_scopes
+from tickee_api.resources.zero_two import event
+from tickee_api.tests import TestCase
+
+
+class Route(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Context(object):
+    client_id = None
+    scopes = [oauth_scopes.INTERNAL]
+
+
+class EventPageTests(TestCase):
+
+    def setUp(self):
+        TestCase.setUp(self)
+        self.calls = []
+        self.account_id = 1
+
+    def fake_call(self, task_name, kwargs, deadline, **options):
+        self.calls.append(task_name)
+        if task_name == "tickee.events.entrypoints.event_details":
+            return dict(id=1, account=dict(id=self.account_id))
+        if task_name == "accounts.details":
+            return dict(id=kwargs['account_id'])
+        return []
+
+    def page(self):
+        request = Request.blank('/events/1/page')
+        request.matched_route = Route('02-event-page')
+        request.matchdict = dict(event_id='1')
+        request.registry = Registry()
+        manager.push(dict(request=request, registry=request.registry))
+        try:
+            return event.event_page(request=request, oauth2_context=Context())
+        finally:
+            manager.pop()
+
+    def test_page_includes_the_account(self):
+        self.assertEqual(self.page()['account'], dict(id=1))
+
+    def test_unusable_account_id_leaves_the_account_out(self):
+        self.account_id = 'abc'
+        page = self.page()
+        self.assertEqual(page['event'], dict(id=1, account=dict(id='abc')))
+        self.assertEqual(page['account'], None)
+        self.assertFalse("accounts.details" in self.calls)
@@ -0,0 +1,72 @@
+from tickee_api.core import cache, jobs
+from tickee_api.tests import TestCase
+import time
+
+
+class Backend(object):
+
+    def __init__(self, meta):
+        self.meta = meta
+
+    def get_task_meta(self, task_id):
+        return self.meta
+
+
+class AsyncResult(object):
+    """Pending result of celery's result backend, without a progress of its
+    own."""
+
+    def __init__(self, meta):
+        self.task_id = 'abc'
+        self.backend = Backend(meta)
+
+
+class JobTests(TestCase):
+
+    def setUp(self):
+        TestCase.setUp(self)
+        self.shared = cache.LocalCache()
+        self.processes = [cache.TieredCache(cache.LocalCache(), self.shared)
+                          for _ in range(2)]
+
+    def job(self, **fields):
+        return dict(dict(id='abc', status='pending', progress=None, result=None,
+                         created_at=int(time.time()), finished_at=None), **fields)
+
+    def test_updates_reach_every_process(self):
+        job = self.job()
+        cache.default = self.processes[0]
+        jobs.store(job, 1)
+        cache.default = self.processes[1]
+        self.assertEqual(jobs.get('abc', 1)['status'], 'pending')
+        cache.default = self.processes[0]
+        jobs.store(dict(job, status='done'), 1)
+        cache.default = self.processes[1]
+        self.assertEqual(jobs.get('abc', 1)['status'], 'done')
+
+    def test_jobs_of_other_clients_are_hidden(self):
+        cache.default = self.processes[0]
+        jobs.store(self.job(), 1)
+        self.assertEqual(jobs.get('abc', 2), None)
+        self.assertNotEqual(jobs.get('abc'), None)
+
+    def test_abandoned_job_is_failed_when_polled(self):
+        cache.default = self.processes[0]
+        jobs.store(self.job(), 1)
+        entry = self.shared.get(jobs._key('abc'))
+        job, owner, stored_at = entry[0]
+        self.shared.set(jobs._key('abc'),
+                        ((job, owner, stored_at - jobs.ABANDONED_AFTER - 1), entry[1]))
+        self.assertEqual(jobs.get('abc', 1)['status'], 'failed')
+        self.assertEqual(jobs.get('abc', 1)['status'], 'failed')
+
+    def test_timed_out_job_is_failed_when_polled(self):
+        cache.default = self.processes[0]
+        jobs.store(self.job(created_at=int(time.time()) - jobs.JOB_TIMEOUT - 1), 1)
+        self.assertEqual(jobs.get('abc', 1)['result'], dict(error='job timed out'))
+
+    def test_progress_is_read_from_the_result_backend(self):
+        pending = AsyncResult(dict(status='PROGRESS', result=dict(done=5)))
+        self.assertEqual(jobs._progress(pending, None), dict(done=5))
+        pending = AsyncResult(dict(status='SUCCESS', result=dict(deleted=9)))
+        self.assertEqual(jobs._progress(pending, dict(done=5)), dict(done=5))
@@ -0,0 +1,52 @@
+from tickee_api.core import journal
+from tickee_api.tests import TestCase
+import time
+
+
+class JournalTests(TestCase):
+
+    def setUp(self):
+        TestCase.setUp(self)
+        self.path = self.journal_path()
+        self.journal = self.open_journal(self.path)
+        self.result = dict(status='ok')
+
+    def fake_call(self, task_name, kwargs, deadline, **options):
+        return self.result
+
+    def test_repeated_notification_is_a_duplicate(self):
+        row, new = self.journal.append('psp:1', 'n1', 'task', dict(a=1))
+        self.assertTrue(new)
+        again, new = self.journal.append('psp:1', 'n1', 'task', dict(a=1))
+        self.assertFalse(new)
+        self.assertEqual(again['id'], row['id'])
+
+    def test_processes_sharing_the_journal_journal_once(self):
+        other = self.open_journal(self.path)
+        self.assertTrue(self.journal.append('psp:1', 'n1', 'task', {})[1])
+        self.assertFalse(other.append('psp:1', 'n1', 'task', {})[1])
+
+    def test_delivered_notification_is_a_duplicate(self):
+        row, _ = self.journal.append('psp:1', 'n1', 'task', {})
+        self.journal.claim(row['id'])
+        self.journal.deliver(row)
+        row, new = self.journal.append('psp:1', 'n1', 'task', {})
+        self.assertFalse(new)
+        self.assertNotEqual(row['delivered_at'], None)
+
+    def test_unserializable_result_still_marks_the_delivery(self):
+        self.result = object()
+        row, _ = self.journal.append('psp:1', 'n1', 'task', {})
+        self.journal.claim(row['id'])
+        self.journal.deliver(row)
+        row = self.journal.get(row['id'])
+        self.assertNotEqual(row['delivered_at'], None)
+        self.assertEqual(journal.result(row), None)
+        self.assertEqual(self.journal.due(), [])
+
+    def test_one_process_prunes_per_interval(self):
+        other = self.open_journal(self.path)
+        self.assertFalse(self.journal.prune())
+        self.journal.pruned_at = other.pruned_at = time.time() - journal.PRUNE_INTERVAL
+        self.assertTrue(self.journal.prune())
+        self.assertFalse(other.prune())
@@ -0,0 +1,73 @@
+from tickee_api.core import cache, ledger
+from tickee_api.tests import TestCase
+import gevent
+import time
+
+
+class LedgerTests(TestCase):
+
+    def setUp(self):
+        TestCase.setUp(self)
+        self.parts = []
+        self.lookups = 0
+
+    def fake_call(self, task_name, kwargs, deadline, **options):
+        self.lookups += 1
+        return self.parts
+
+    def expires_at(self, claim):
+        return cache.default.authority.get(claim)[1]
+
+    def test_repeated_scan_is_refused(self):
+        self.assertNotEqual(ledger.claim(1, '5', 'ab12'), None)
+        self.assertEqual(ledger.claim(1, '5', 'AB12'), None)
+
+    def test_claims_are_kept_per_client(self):
+        ledger.claim(1, '5', 'ab12')
+        self.assertNotEqual(ledger.claim(2, '5', 'ab12'), None)
+
+    def test_refused_scan_releases_its_claim(self):
+        claim = ledger.claim(1, '5', 'ab12')
+        ledger.settle(claim, dict(error='ticket not found'), 1, '5')
+        self.assertNotEqual(ledger.claim(1, '5', 'ab12'), None)
+
+    def test_reset_only_forgets_the_event(self):
+        ledger.claim(1, '5', 'ab12')
+        ledger.claim(1, '6', 'cd34')
+        ledger.reset('5')
+        self.assertNotEqual(ledger.claim(1, '5', 'ab12'), None)
+        self.assertEqual(ledger.claim(1, '6', 'cd34'), None)
+
+    def test_accepted_scan_is_kept_until_the_part_ends(self):
+        now = int(time.time())
+        self.parts = [dict(starts_on=now - 3600, minutes=120),
+                      dict(starts_on=now + 86400, minutes=120)]
+        ledger.lookup(1, '5').join()
+        claim = ledger.claim(1, '5', 'ab12')
+        ledger.settle(claim, dict(scanned=True), 1, '5')
+        self.assertAlmostEqual(self.expires_at(claim), now + 3600, delta=5)
+
+    def test_unknown_parts_keep_the_default_ttl(self):
+        claim = ledger.claim(1, None, 'ab12')
+        ledger.settle(claim, dict(scanned=True), 1, None)
+        self.assertAlmostEqual(self.expires_at(claim),
+                               time.time() + ledger.DEFAULT_TTL, delta=5)
+
+    def test_parts_are_looked_up_once_per_event(self):
+        now = int(time.time())
+        self.parts = [dict(starts_on=now - 3600, minutes=120)]
+        claims = [ledger.claim(1, '5', code) for code in ('ab12', 'cd34')]
+        for claim in claims:
+            ledger.settle(claim, dict(scanned=True), 1, '5')
+            self.assertAlmostEqual(self.expires_at(claim),
+                                   time.time() + ledger.DEFAULT_TTL, delta=5)
+        gevent.sleep(0)
+        self.assertEqual(self.lookups, 1)
+        claim = ledger.claim(1, '5', 'ef56')
+        ledger.settle(claim, dict(scanned=True), 1, '5')
+        self.assertAlmostEqual(self.expires_at(claim), now + 3600, delta=5)
+
+    def test_windows_of_iso_dates(self):
+        windows = ledger._windows([dict(starts_on='2012-06-01T20:00:00', minutes=60),
+                                   dict(name='no start')])
+        self.assertEqual(windows, [(1338580800, 1338584400)])
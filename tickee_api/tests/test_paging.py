@@ -0,0 +1,88 @@
+from pyramid.registry import Registry
+from pyramid.request import Request
+from tickee_api.core import capabilities, paginated, paging, streamed
+import json
+import unittest
+
+
+class PagingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.original_enabled = capabilities.enabled
+        capabilities.enabled = set()
+
+    def tearDown(self):
+        capabilities.enabled = self.original_enabled
+
+    def request(self, query):
+        request = Request.blank('/0.2/events/1/orders?' + query)
+        request.registry = Registry()
+        request.page = paging.parse(request)
+        return request
+
+    def test_bounds_are_not_passed_on_without_the_capability(self):
+        self.assertEqual(paging.bounds(self.request('limit=10')), {})
+
+    def test_bounds_are_passed_on_with_the_capability(self):
+        capabilities.configure({'backend.capabilities': 'paging'})
+        cursor = paging.encode_cursor(5)
+        self.assertEqual(paging.bounds(self.request('limit=10&cursor=' + cursor)),
+                         dict(limit=11, after=5))
+
+    def test_page_is_cut_out_of_the_full_collection(self):
+        request = self.request('limit=2&cursor=' + paging.encode_cursor(1))
+        items = paging.apply(request, [dict(id=i) for i in range(5, 0, -1)])
+        self.assertEqual(items, [dict(id=2), dict(id=3)])
+        self.assertEqual(request.response.headers['X-Next-Cursor'],
+                         paging.encode_cursor(3))
+
+    def test_last_page_has_no_next_cursor(self):
+        request = self.request('limit=10')
+        items = paging.apply(request, [dict(id=i) for i in range(3)])
+        self.assertEqual(len(items), 3)
+        self.assertFalse('X-Next-Cursor' in request.response.headers)
+
+
+class StreamedPagesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.original_enabled = capabilities.enabled
+        capabilities.enabled = set([capabilities.PAGING])
+        self.collection = [dict(id=i) for i in range(1, 2501)]
+        self.fetched = []
+
+    def tearDown(self):
+        capabilities.enabled = self.original_enabled
+
+    def view(self):
+        @streamed
+        @paginated()
+        def event_orders(request, oauth2_context):
+            bounds = paging.bounds(request)
+            items = [item for item in self.collection
+                     if bounds['after'] is None or item['id'] > bounds['after']]
+            self.fetched.append(len(items[:bounds['limit']]))
+            return items[:bounds['limit']]
+        return event_orders
+
+    def request(self, query=''):
+        request = Request.blank('/0.2/events/1/orders?' + query)
+        request.registry = Registry()
+        return request
+
+    def test_collection_is_fetched_a_page_at_a_time(self):
+        response = self.view()(request=self.request(), oauth2_context=None)
+        self.assertEqual(self.fetched, [1001])
+        body = ''.join(response.app_iter)
+        self.assertEqual(json.loads(body), self.collection)
+        self.assertEqual(self.fetched, [1001, 1001, 500])
+
+    def test_small_collection_is_rendered(self):
+        self.collection = self.collection[:10]
+        result = self.view()(request=self.request(), oauth2_context=None)
+        self.assertEqual(result, self.collection)
+
+    def test_requested_page_is_not_streamed_in_pages(self):
+        result = self.view()(request=self.request('limit=10'), oauth2_context=None)
+        self.assertEqual(len(result), 10)
+        self.assertEqual(self.fetched, [11])
@@ -0,0 +1,30 @@
+from pyramid.request import Request
+from tickee_api.core import capabilities, projection, requested_fields
+import unittest
+
+
+class ProjectionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.original_enabled = capabilities.enabled
+        capabilities.enabled = set()
+
+    def tearDown(self):
+        capabilities.enabled = self.original_enabled
+
+    def request(self, query=''):
+        request = Request.blank('/0.2/events/1/tickets?' + query)
+        request.fields = requested_fields(request, ["user"], ["id"])
+        return request
+
+    def test_fields_are_not_passed_on_without_the_capability(self):
+        self.assertEqual(projection(self.request('fields=id')), {})
+
+    def test_fields_are_passed_on_with_the_capability(self):
+        capabilities.configure({'backend.capabilities': 'projection paging'})
+        self.assertEqual(projection(self.request('fields=id,user')),
+                         dict(fields=['id', 'user']))
+
+    def test_default_fields_are_not_passed_on(self):
+        capabilities.configure({'backend.capabilities': 'projection'})
+        self.assertEqual(projection(self.request()), {})
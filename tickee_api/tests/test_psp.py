@@ -0,0 +1,21 @@
+from pyramid.request import Request
+from tickee_api.resources import psp
+import unittest
+
+
+class NotificationKeyTests(unittest.TestCase):
+
+    def key(self, query):
+        return psp.notification_key(Request.blank('/0.2/psp/1/notify?' + query))
+
+    def test_retry_gets_the_key_of_the_notification(self):
+        self.assertEqual(self.key('transactionid=12&status=completed'),
+                         self.key('transactionid=12&status=completed'))
+        self.assertEqual(self.key('transactionid=12&timestamp=1'),
+                         self.key('transactionid=12&timestamp=1'))
+
+    def test_status_change_gets_a_key_of_its_own(self):
+        self.assertNotEqual(self.key('transactionid=12&status=initialized'),
+                            self.key('transactionid=12&status=completed'))
+        self.assertNotEqual(self.key('transactionid=12&timestamp=1'),
+                            self.key('transactionid=12&timestamp=2'))
@@ -0,0 +1,45 @@
+from tickee_api.core import rollups
+from tickee_api.resources import invalidation
+from tickee_api.tests import TestCase
+import time
+
+
+class RollupTests(TestCase):
+
+    def setUp(self):
+        TestCase.setUp(self)
+        self.rollups = dict((event_id, self.computed(event_id)) for event_id in ['5', '6'])
+
+    def fake_call(self, task_name, kwargs, deadline, **options):
+        return dict(tickets=1)
+
+    def computed(self, event_id):
+        rollup = rollups.compute('event', dict(client_id=None, event_id=event_id)).get()
+        # old enough to be recomputed once its data changed
+        rollup['computed_at'] = time.time() - rollups.MIN_INTERVAL
+        return rollup
+
+    def stale(self, event_id):
+        return rollups.stale('event', dict(client_id=None, event_id=event_id),
+                             self.rollups[event_id])
+
+    def test_rollups_are_current_until_their_data_changes(self):
+        self.assertFalse(self.stale('5'))
+
+    def test_scan_only_outdates_the_rollup_of_its_event(self):
+        invalidation.invalidate('02-ticket-scans', 'POST', dict(ticket_code='ab'),
+                                dict(event_id='5'))
+        self.assertTrue(self.stale('5'))
+        self.assertFalse(self.stale('6'))
+
+    def test_scan_of_the_0_1_api_names_its_event_differently(self):
+        invalidation.invalidate('01-ticket-scan', 'POST', dict(ticket_code='ab'),
+                                dict(list_event_id='6'))
+        self.assertFalse(self.stale('5'))
+        self.assertTrue(self.stale('6'))
+
+    def test_write_without_the_id_outdates_all_rollups(self):
+        invalidation.invalidate('02-ticket-scans', 'POST', dict(ticket_code='ab'))
+        invalidation.invalidate('02-orders-detail', 'PUT', dict(order_key='abc'))
+        self.assertTrue(self.stale('5'))
+        self.assertTrue(self.stale('6'))
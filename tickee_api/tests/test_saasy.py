@@ -0,0 +1,32 @@
+from pyramid.registry import Registry
+from pyramid.request import Request
+from tickee_api.core import journal
+from tickee_api.resources.internal import saasy
+from tickee_api.tests import TestCase
+import hashlib
+
+PRIVATE_KEY = "591bfff6c852de664c78be0f267d52a9"
+
+
+class SaasyTests(TestCase):
+
+    def setUp(self):
+        TestCase.setUp(self)
+        self.replace(journal, 'journal', self.open_journal(self.journal_path()))
+
+    def notify(self, security_data):
+        request = Request.blank('/internal/saasy/subscriptions', POST=dict(
+            SubscriptionReference='SUB1',
+            security_data=security_data,
+            security_hash=hashlib.md5(security_data + PRIVATE_KEY).hexdigest()))
+        request.registry = Registry()
+        saasy.saasy_sub_activated(request)
+        return journal.journal.fetchone("SELECT COUNT(*) FROM notifications")[0]
+
+    def test_later_notifications_of_a_subscription_are_journaled(self):
+        self.assertEqual(self.notify('1340000000'), 1)
+        self.assertEqual(self.notify('1340000600'), 2)
+
+    def test_retried_notification_is_journaled_once(self):
+        self.notify('1340000000')
+        self.assertEqual(self.notify('1340000000'), 1)
@@ -0,0 +1,85 @@
+from tickee_api.core import cache, sync
+from tickee_api.tests import TestCase
+
+
+class SyncTests(TestCase):
+
+    def setUp(self):
+        TestCase.setUp(self)
+        self.replace(sync, 'MIN_INTERVAL', 0)
+        self.tickets = dict((str(i), dict(id=str(i), checked_in=False))
+                            for i in range(100))
+        self.fetches = 0
+
+    def fetch(self):
+        self.fetches += 1
+        return [dict(ticket) for ticket in self.tickets.values()]
+
+    def changes(self, cursor=None):
+        return sync.changes('event-1', cursor, self.fetch, ['tickets'])
+
+    def write(self):
+        cache.default.invalidate('tickets')
+
+    def test_first_sync_is_full(self):
+        result = self.changes()
+        self.assertTrue(result['full'])
+        self.assertEqual(len(result['added']), 100)
+
+    def test_unchanged_collection_is_not_fetched_again(self):
+        cursor = self.changes()['cursor']
+        result = self.changes(cursor)
+        self.assertEqual((result['added'], result['changed'], result['removed']),
+                         ([], [], []))
+        self.assertEqual(self.fetches, 1)
+
+    def test_changes_since_the_cursor(self):
+        cursor = self.changes()['cursor']
+        self.tickets['1']['checked_in'] = True
+        self.tickets['100'] = dict(id='100', checked_in=False)
+        del self.tickets['2']
+        self.write()
+        result = self.changes(cursor)
+        self.assertFalse(result['full'])
+        self.assertEqual(result['added'], [dict(id='100', checked_in=False)])
+        self.assertEqual(result['changed'], [dict(id='1', checked_in=True)])
+        self.assertEqual(result['removed'], ['2'])
+
+    def test_deltas_are_combined(self):
+        cursor = self.changes()['cursor']
+        self.tickets['100'] = dict(id='100', checked_in=False)
+        del self.tickets['2']
+        self.write()
+        self.changes(cursor)
+        self.tickets['100']['checked_in'] = True
+        self.tickets['2'] = dict(id='2', checked_in=True)
+        del self.tickets['3']
+        self.write()
+        result = self.changes(cursor)
+        self.assertEqual(result['added'], [dict(id='100', checked_in=True)])
+        self.assertEqual(result['changed'], [dict(id='2', checked_in=True)])
+        self.assertEqual(result['removed'], ['3'])
+
+    def test_missing_delta_falls_back_to_full(self):
+        cursor = self.changes()['cursor']
+        self.tickets['1']['checked_in'] = True
+        self.write()
+        self.changes(cursor)
+        cache.default.authority.delete(sync._delta_key('event-1', cursor))
+        result = self.changes(cursor)
+        self.assertTrue(result['full'])
+        self.assertEqual(len(result['added']), 100)
+
+    def test_big_states_are_chunked(self):
+        self.replace(sync, 'CHUNK_SIZE', 256)
+        cursor = self.changes()['cursor']
+        head = sync._get(sync._head_key('event-1'))
+        self.assertTrue(head['chunks'] > 1)
+        self.tickets['1']['checked_in'] = True
+        self.write()
+        self.assertEqual(self.changes(cursor)['changed'],
+                         [dict(id='1', checked_in=True)])
+
+    def test_errors_are_returned(self):
+        result = sync.changes('event-2', None, lambda: dict(error='unknown event'))
+        self.assertEqual(result, dict(error='unknown event'))